@@ -0,0 +1,21 @@
+"""
+python -m app               # the full app
+python -m app --headless    # no windows; see app.headless for its options
+"""
+import sys
+
+
+def main():
+    args = sys.argv[1:]
+    if "--headless" in args:
+        from app.headless import main as headless_main
+
+        headless_main([a for a in args if a != "--headless"])
+    else:
+        from app.main import SmartStudyApp
+
+        SmartStudyApp().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import itertools
+from concurrent.futures import CancelledError, Future
+from typing import Callable, Dict, List, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from app.ai.llm_service import error_result
+from app.ai.loop import EventLoopThread
+
+
+class LLMBridge(QObject):
+    """
+    Qt front end for the asyncio LLMService. Requests run as coroutines on a
+    single long-lived event loop thread; results come back as signals, which
+    Qt delivers on the receiver's (GUI) thread.
+
+    Every request gets an id, returned by the call and passed back with its
+    result, so callers can match results to what they asked for.
+    """
+    text_processed = Signal(int, dict)  # request id, note result
+    text_partial = Signal(int, dict)  # request id, note so far (streamed requests only)
+    flashcards_generated = Signal(int, list)  # request id, flashcards
+    pending_changed = Signal(int)  # requests submitted but not finished
+    api_state_changed = Signal(str, str)  # app.ai.resilience STATE_*, detail text
+    # Internal hop from the loop thread back to the thread this bridge lives in
+    _finished = Signal(int, object)  # request id, concurrent Future
+
+    def __init__(self, llm_service, loop: Optional[EventLoopThread] = None, parent=None):
+        super().__init__(parent)
+        self.llm_service = llm_service
+        self.loop = loop or EventLoopThread(name="LLMService")
+        self._ids = itertools.count(1)
+        self._futures: Dict[int, Future] = {}
+        self._signals: Dict[int, tuple] = {}  # request id -> (signal for its result, result on failure)
+        self._finished.connect(self._on_finished)
+        # Called on the loop thread; the signal carries it over to the GUI thread
+        self.llm_service.guard.on_state_change = self.api_state_changed.emit
+
+    @property
+    def pending(self) -> int:
+        return len(self._futures)
+
+    def process_text(self, text: str, current_subject: Optional[str] = None,
+                     existing_subjects: Optional[List[str]] = None, stream: bool = False, kind: str = "text") -> int:
+        """With `stream`, text_partial is emitted as the note's fields arrive."""
+        request_id = next(self._ids)
+        on_partial = (lambda partial: self.text_partial.emit(request_id, partial)) if stream else None
+        coro = self.llm_service.process_text(text, current_subject, existing_subjects, on_partial=on_partial, kind=kind)
+        return self._submit(request_id, coro, self.text_processed,
+                            lambda e: error_result(f"Failed to process: {e}"))
+
+    def generate_more_flashcards(self, summary: str, key_points: List[str], count: int = 4) -> int:
+        coro = self.llm_service.generate_more_flashcards(summary, key_points, count)
+        return self._submit(next(self._ids), coro, self.flashcards_generated, lambda e: [])
+
+    def cancel(self, request_id: int) -> bool:
+        """Cancels a request that hasn't finished; its signal is then never emitted."""
+        future = self._futures.pop(request_id, None)
+        self._signals.pop(request_id, None)
+        if future is None:
+            return False
+        future.cancel()
+        self.pending_changed.emit(self.pending)
+        return True
+
+    def close(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._signals.clear()
+        self.loop.close()
+
+    def _submit(self, request_id: int, coro, signal, on_error: Callable[[Exception], object]) -> int:
+        """`on_error(exception)` builds the result emitted if the request raises."""
+        future = self.loop.submit(coro)
+        self._futures[request_id] = future
+        self._signals[request_id] = (signal, on_error)
+        self.pending_changed.emit(self.pending)
+        # Runs on the loop thread; emitting from there queues delivery to the GUI thread
+        future.add_done_callback(lambda f: self._finished.emit(request_id, f))
+        return request_id
+
+    def _on_finished(self, request_id: int, future: Future):
+        signal, on_error = self._signals.pop(request_id, (None, None))
+        if self._futures.pop(request_id, None) is None:
+            return  # Cancelled
+        self.pending_changed.emit(self.pending)
+        try:
+            result = future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            # LLMService reports failures in its results; this is a bug guard. Still
+            # answer, so callers waiting on the request (e.g. the scheduler) move on.
+            print(f"Error in LLM request {request_id}: {e}")
+            result = on_error(e)
+        signal.emit(request_id, result)
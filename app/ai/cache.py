@@ -0,0 +1,168 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+DISK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of copied text: NFC, trimmed, whitespace runs collapsed."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str, prompt_version: str, model_name: str) -> str:
+    """Content address of a response: what was sent, with which prompt, to which model."""
+    h = hashlib.sha256()
+    for part in (prompt_version, model_name, normalize_text(text)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-level cache of LLM responses: an in-memory LRU of parsed results in
+    front of a SQLite file that survives restarts.
+
+    Entries expire `ttl` seconds after they were stored. The disk store is
+    kept under `max_disk_bytes` by evicting the least recently used entries.
+    Values are copied in and out, so callers may modify what they get back.
+    """
+
+    def __init__(self, path: str = os.path.join("cache", "llm_responses.sqlite3"), max_entries: int = 256,
+                 max_disk_bytes: int = 64 * 1024 * 1024, ttl: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Opens the disk store on first use; None if it can't be opened (memory-only then)."""
+        if self._conn is None and self.path:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(DISK_SCHEMA)
+                conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+                conn.commit()
+                self._disk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                self._conn = conn
+            except sqlite3.Error as e:
+                print(f"Error opening response cache {self.path}: {e}")
+                self.path = None
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self._memory.pop(key, None)
+
+            value = None
+            conn = self._db()
+            if conn is not None:
+                try:
+                    row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                    if row is not None and now - row[1] < self.ttl:
+                        value = json.loads(row[0])
+                        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                        conn.commit()
+                        self._remember(key, row[1], value)
+                    elif row is not None:
+                        self._delete(conn, key)
+                except (sqlite3.Error, ValueError) as e:
+                    print(f"Error reading response cache: {e}")
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(value)
+
+    def put(self, key: str, value: Dict):
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, now, copy.deepcopy(value))
+            conn = self._db()
+            if conn is None or len(data) > self.max_disk_bytes:
+                return
+            try:
+                self._delete(conn, key)
+                conn.execute(
+                    "INSERT INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, data, len(data), now, now),
+                )
+                self._disk_bytes += len(data)
+                self._evict(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing response cache: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+                self._disk_bytes = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: str, created: float, value: Dict):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _delete(self, conn: sqlite3.Connection, key: str):
+        row = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._disk_bytes -= row[0]
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drops least recently used entries until the store fits in max_disk_bytes."""
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                return
+            for key, size in rows:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
@@ -0,0 +1,59 @@
+import re
+from typing import List
+
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+# Whitespace after a sentence end: ., ! or ?, optionally followed by a closing quote or
+# bracket. Both are lookbehinds, so the quote or bracket stays with its sentence.
+SENTENCE_RE = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"'\u201d\u2019)\]]))\s+")
+
+
+def word_count(text: str) -> int:
+    return len(text.split())
+
+
+def _split_long(piece: str, max_words: int) -> List[str]:
+    """Breaks one oversized paragraph into sentences, and oversized sentences into word runs."""
+    parts = []
+    for sentence in SENTENCE_RE.split(piece):
+        words = sentence.split()
+        if len(words) <= max_words:
+            if words:
+                parts.append(sentence.strip())
+            continue
+        for i in range(0, len(words), max_words):
+            parts.append(" ".join(words[i:i + max_words]))
+    return parts
+
+
+def split_text(text: str, max_words: int = 1200) -> List[str]:
+    """
+    Splits text into chunks of at most `max_words` words, breaking on
+    paragraph boundaries where possible, then on sentence boundaries.
+    Paragraphs are packed greedily, so chunks stay close to the limit.
+    """
+    pieces = []  # (separator before it within a chunk, text)
+    for paragraph in PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if word_count(paragraph) <= max_words:
+            pieces.append(("\n\n", paragraph))
+        else:
+            # Sentences of one paragraph are rejoined with a space, as they were
+            parts = _split_long(paragraph, max_words)
+            pieces.append(("\n\n", parts[0]))
+            pieces.extend((" ", part) for part in parts[1:])
+
+    chunks = []
+    current = ""
+    current_words = 0
+    for separator, piece in pieces:
+        words = word_count(piece)
+        if current and current_words + words > max_words:
+            chunks.append(current)
+            current, current_words = "", 0
+        current = current + separator + piece if current else piece
+        current_words += words
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,146 @@
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # The classifier is an optimization; without NumPy the LLM routes everything
+    np = None
+
+from app.notes.search import note_search_fields, tokenize
+
+# Hashed feature space; collisions are rare enough at this size for routing
+FEATURES = 2 ** 14
+
+# Frequent words that say nothing about the subject (tokens under 3 letters are dropped anyway)
+STOPWORDS = frozenset("""
+the and for are but not you all any can had her was one our out has him his how its may new now
+old see two who did get let put say she too use that with have this will your from they been more
+when were what than them then into some such only also which their there these those would could
+should about after other over just like each most very many much where while being does because
+""".split())
+
+
+def _features(text: str) -> Optional["np.ndarray"]:
+    """L1-normalized, sublinear term-frequency vector of `text` over hashed unigrams."""
+    counts: Dict[int, int] = {}
+    for token, _, _ in tokenize(text):
+        if len(token) < 3 or token in STOPWORDS:
+            continue
+        index = zlib.crc32(token.encode("utf-8")) % FEATURES
+        counts[index] = counts.get(index, 0) + 1
+    if not counts:
+        return None
+    vector = np.zeros(FEATURES, dtype=np.float32)
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    vector[indices] = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    return vector / vector.sum()
+
+
+class SubjectClassifier:
+    """
+    Nearest-centroid TF-IDF classifier over the notes already filed under
+    each subject. Each subject keeps a running sum of its notes' term
+    vectors, so filing a note updates it in O(features); IDF weights and the
+    normalized centroid matrix are rebuilt lazily on the next prediction.
+
+    Used to skip the routing call when a clip clearly belongs to the open
+    subject, and otherwise to narrow the subjects offered to the model.
+    """
+
+    def __init__(self, min_notes: int = 3):
+        # Subjects with fewer notes aren't trusted for a confident "keep"
+        self.min_notes = min_notes
+        self._sums: Dict[str, "np.ndarray"] = {}
+        self._counts: Dict[str, int] = {}
+        self._df = np.zeros(FEATURES, dtype=np.float32) if np is not None else None
+        self._docs = 0
+        self._matrix = None  # _centroids() result, rebuilt after changes
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.available and bool(self._sums)
+
+    def add_note(self, note: Dict):
+        if not self.available:
+            return
+        vector = _features(" ".join(note_search_fields(note).values()))
+        if vector is None:
+            return
+        subject = note.get("subject", "Other")
+        with self._lock:
+            if subject in self._sums:
+                self._sums[subject] += vector
+            else:
+                self._sums[subject] = vector.copy()
+            self._counts[subject] = self._counts.get(subject, 0) + 1
+            self._df += vector > 0
+            self._docs += 1
+            self._matrix = None
+
+    def fit(self, storage):
+        """(Re)trains from every stored note, a page at a time."""
+        if not self.available:
+            return
+        self.clear()
+        for subject in storage.get_subjects():
+            for notes in storage.iter_notes(subject):
+                for note in notes:
+                    self.add_note(note)
+
+    def clear(self):
+        with self._lock:
+            self._sums.clear()
+            self._counts.clear()
+            if self._df is not None:
+                self._df[:] = 0
+            self._docs = 0
+            self._matrix = None
+
+    def _centroids(self) -> Tuple[List[str], "np.ndarray", "np.ndarray"]:
+        """Subject names, their normalized TF-IDF centroids (one row each), and the IDF weights."""
+        with self._lock:
+            if self._matrix is None:
+                subjects = list(self._sums)
+                idf = np.log((self._docs + 1) / (self._df + 1)) + 1.0
+                matrix = np.stack([self._sums[s] for s in subjects]) * idf
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                self._matrix = (subjects, (matrix / norms).astype(np.float32), idf.astype(np.float32))
+            return self._matrix
+
+    def rank(self, text: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Subjects ordered by cosine similarity to `text`, best first."""
+        if not self.ready:
+            return []
+        vector = _features(text)
+        if vector is None:
+            return []
+        subjects, matrix, idf = self._centroids()
+        vector = vector * idf
+        norm = float(np.linalg.norm(vector))
+        if norm == 0:
+            return []
+        scores = matrix @ (vector / norm)
+        order = np.argsort(-scores)
+        if limit is not None:
+            order = order[:limit]
+        return [(subjects[i], float(scores[i])) for i in order]
+
+    def confident_keep(self, ranked: List[Tuple[str, float]], current_subject: Optional[str],
+                       threshold: float = 0.35, margin: float = 0.08) -> bool:
+        """
+        True if the best match is the open subject, with a high enough
+        similarity, clearly ahead of the runner-up and backed by enough notes.
+        """
+        if not ranked or not current_subject or ranked[0][0] != current_subject:
+            return False
+        if self._counts.get(current_subject, 0) < self.min_notes:
+            return False
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        return ranked[0][1] >= threshold and ranked[0][1] - runner_up >= margin
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.notes.ids import new_note_id
+
+# Entry states. A clip is queued when copied, processing while a request for
+# it is in flight, and done once its note is saved (or a newer copy superseded
+# it). Failed entries are retried until they run out of attempts.
+QUEUED = "queued"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+
+class IngestionJournal:
+    """
+    Append-only log of copied clips and what became of them, so a clip
+    survives the app quitting, a missing API key or a network outage.
+
+    Each line is a JSON record: the first for an entry holds the clip
+    ("queued", with text and kind); later ones only change its state. On
+    open the log is replayed, entries left "processing" by a crash go back
+    to "queued", and the file is rewritten without finished entries. Queued
+    records are fsynced; state changes are only flushed, since losing one
+    at worst processes a clip twice (the response cache answers the repeat).
+
+    Keep the log out of the notes directory, which clearing all notes
+    deletes; `legacy_path` is a journal to move here on first open.
+
+    Entries that failed `max_attempts` times are kept for reference, but
+    only the newest `keep_failed` of them, and none older than
+    `failed_ttl_days`; the rest are pruned on open.
+    """
+
+    def __init__(self, path: str = os.path.join("cache", "ingest_journal.jsonl"), max_attempts: int = 5,
+                 keep_failed: int = 100, failed_ttl_days: float = 30, legacy_path: Optional[str] = None):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.keep_failed = keep_failed
+        self.failed_ttl_days = failed_ttl_days
+        self._entries: Dict[str, Dict] = {}  # Unfinished entries by id, oldest first
+        self._finished_lines = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Journals used to live in the notes directory, which clearing the notes deletes
+        if legacy_path and os.path.exists(legacy_path) and not os.path.exists(path):
+            os.replace(legacy_path, path)
+        self._replay()
+        self._prune()
+        self._compact()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                entry_id = record.get("id")
+                if "text" in record:
+                    # A clip's first record, or its compacted copy (which may be failed)
+                    self._entries[entry_id] = record
+                elif entry_id in self._entries:
+                    if record.get("state") == DONE:
+                        del self._entries[entry_id]
+                    else:
+                        self._entries[entry_id].update(record)
+        for entry in self._entries.values():
+            if entry["state"] == PROCESSING:
+                entry["state"] = QUEUED
+
+    def _exhausted(self, entry: Dict) -> bool:
+        return entry["state"] == FAILED and entry.get("attempts", 0) >= self.max_attempts
+
+    def _prune(self):
+        """Drops the oldest exhausted failures, beyond keep_failed or failed_ttl_days."""
+        cutoff = (datetime.now() - timedelta(days=self.failed_ttl_days)).isoformat(timespec="seconds")
+        exhausted = [e for e in self._entries.values() if self._exhausted(e)]
+        exhausted.sort(key=lambda e: e.get("failed_at") or e.get("copied", ""), reverse=True)
+        for index, entry in enumerate(exhausted):
+            if index >= self.keep_failed or (entry.get("failed_at") or entry.get("copied", "")) < cutoff:
+                del self._entries[entry["id"]]
+
+    def _compact(self):
+        """Rewrites the log with one record per unfinished entry."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._finished_lines = 0
+
+    def _append(self, record: Dict, sync: bool = False):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def add(self, text: str, kind: str = "text") -> str:
+        """Journals a new clip and returns its entry id."""
+        entry = {"id": new_note_id(), "state": QUEUED, "text": text, "kind": kind, "attempts": 0,
+                 "copied": datetime.now().isoformat(timespec="seconds")}
+        with self._lock:
+            self._entries[entry["id"]] = entry
+            self._append(entry, sync=True)
+        return entry["id"]
+
+    def mark(self, entry_id: str, state: str, **fields):
+        """Records a state change; extra fields (e.g. error, note_id) are kept with it."""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return
+            record = {"id": entry_id, "state": state, **fields}
+            if state == FAILED:
+                record["attempts"] = entry.get("attempts", 0) + 1
+                record["failed_at"] = datetime.now().isoformat(timespec="seconds")
+            self._append(record)
+            if state == DONE:
+                del self._entries[entry_id]
+                self._finished_lines += 1
+            else:
+                entry.update(record)
+
+    def get(self, entry_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            return dict(entry) if entry is not None else None
+
+    def can_retry(self, entry_id: str) -> bool:
+        entry = self.get(entry_id)
+        return entry is not None and entry.get("attempts", 0) < self.max_attempts
+
+    def pending(self) -> List[Dict]:
+        """Entries still to process, oldest first: queued ones, and failed ones with attempts left."""
+        with self._lock:
+            return [dict(e) for e in self._entries.values() if not self._exhausted(e)]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, PROCESSING: 0, FAILED: 0}
+        with self._lock:
+            for entry in self._entries.values():
+                counts[entry["state"]] += 1
+        return counts
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+            if self._finished_lines:
+                self._compact()
@@ -1,22 +1,200 @@
-import json
+import asyncio
 import os
-from typing import Dict, List, Optional
-import google.generativeai as genai
+from typing import Callable, Dict, List, Optional
+
+from app.ai.cache import ResponseCache, cache_key
+from app.ai.chunking import split_text, word_count
+from app.ai.classifier import SubjectClassifier
+from app.ai.providers import GeminiProvider, LLMProvider
+from app.ai.resilience import ApiGuard
+from app.ai.streaming import IncrementalJSONParser
+from app.ai.structured import (
+    CONTENT_SCHEMA, FLASHCARDS_SCHEMA, ROUTE_SCHEMA, SECTION_SCHEMA, StructuredOutputError,
+    conform, describe, extract_json, missing_fields, subschema,
+)
+from app.utils.dedupe import source_signature
+
+# Bump whenever the process_text prompts change so cached responses aren't reused
+PROMPT_VERSION = "3"
+# Routing only needs the gist of the text
+ROUTING_EXCERPT_WORDS = 300
+# With a trained classifier, only this many likely subjects are offered to the routing model
+ROUTING_CANDIDATES = 5
+# Texts longer than this (in words) are summarized chunk by chunk, then merged
+CHUNK_THRESHOLD_WORDS = 1500
+CHUNK_WORDS = 1200
+# Per-attempt timeouts in seconds (a streamed note must finish within its attempt)
+ATTEMPT_TIMEOUT = 90
+ROUTING_TIMEOUT = 20
+
+def error_result(summary: str) -> Dict:
+    """The note-shaped result a failed request produces (action "error")."""
+    return {"subject": "Error", "summary": summary, "keyPoints": [], "flashcards": [], "action": "error"}
+
 
 class LLMService:
-    def __init__(self, api_key: Optional[str] = None):
+    """
+    Note generation on top of an LLMProvider (Gemini unless another is
+    given; see app.ai.providers). The request methods are coroutines and are
+    meant to run on one long-lived event loop (see app.ai.loop / app.ai.bridge);
+    at most `max_concurrency` API calls are in flight at a time, the rest wait.
+    Every call goes through `guard` (rate limit, retries, circuit breaker).
+    """
+
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[ResponseCache] = None,
+                 max_concurrency: int = 4, chunk_threshold: int = CHUNK_THRESHOLD_WORDS,
+                 chunk_words: int = CHUNK_WORDS, classifier: Optional[SubjectClassifier] = None,
+                 guard: Optional[ApiGuard] = None, provider: Optional[LLMProvider] = None):
         self.api_key = api_key
-        self.model = None
+        # Where prompts go: Gemini unless config.json names another backend
+        self.provider = provider or GeminiProvider()
+        # Responses for text seen before are served from here without an API call
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Routing calls get their own slots so they never queue behind long generations
+        self._routing_semaphore = asyncio.Semaphore(max_concurrency)
+        self.guard = guard or ApiGuard()
+        self.chunk_threshold = chunk_threshold
+        self.chunk_words = chunk_words
+        # Local subject model: skips or narrows the routing call when it can
+        self.classifier = classifier
+        self.local_routes = 0
+        # Follow-up calls made because a reply lacked required fields
+        self.reasks = 0
         if api_key:
             self.configure_api(api_key)
 
+    @property
+    def model_name(self) -> str:
+        return self.provider.model_name
+
+    @property
+    def configured(self) -> bool:
+        """True once requests can be made (for Gemini, once an API key is set)."""
+        return self.provider.configured
+
     def set_api_key(self, api_key: str):
         self.api_key = api_key
         self.configure_api(api_key)
 
     def configure_api(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.provider.configure(api_key)
+
+    async def _generate(self, prompt: str, on_text: Optional[Callable[[str], None]] = None,
+                        routing: bool = False, schema: Optional[Dict] = None) -> str:
+        """
+        Sends one prompt to the model (or the routing model), waiting for a
+        free slot first; transient failures are retried through the guard.
+        With `on_text`, the reply is streamed and passed on piece by piece.
+        With `schema`, the model is constrained to JSON of that shape
+        (structured output).
+        """
+        streamed = False
+
+        async def attempt() -> str:
+            nonlocal streamed
+            self.in_flight += 1
+            try:
+                if on_text is None:
+                    return await self.provider.generate(prompt, schema, routing)
+                parts = []
+                async for piece in self.provider.stream(prompt, schema, routing):
+                    parts.append(piece)
+                    streamed = True
+                    on_text(piece)
+                return "".join(parts)
+            finally:
+                self.in_flight -= 1
+
+        return await self.guard.call(
+            attempt,
+            ROUTING_TIMEOUT if routing else ATTEMPT_TIMEOUT,
+            # Text already passed to on_text can't be taken back, so a broken stream isn't retried
+            can_retry=lambda: not streamed,
+            slot=self._routing_semaphore if routing else self._semaphore,
+        )
+
+    @staticmethod
+    def parse_json(result_text: str, schema: Optional[Dict] = None):
+        """
+        Parses the first JSON value in a model reply (see app.ai.structured),
+        cleaned up against `schema` if given.
+        """
+        expect = "[" if schema is not None and schema.get("type") == "ARRAY" else "{"
+        value = extract_json(result_text, expect)
+        return conform(value, schema) if schema is not None else value
+
+    async def _ask_json(self, prompt: str, schema: Dict, on_text: Optional[Callable[[str], None]] = None,
+                        routing: bool = False, needed: Optional[List[str]] = None):
+        """
+        Asks for JSON matching `schema` and parses it. If required fields are
+        missing or malformed (by default all of the schema's required fields;
+        `needed` narrows that), asks once more for just those fields and merges
+        them in, instead of discarding the whole reply.
+        """
+        reply = await self._generate(prompt, on_text, routing, schema)
+        try:
+            value = self.parse_json(reply, schema)
+        except StructuredOutputError as e:
+            print(f"Unusable reply, asking again: {e}")
+            value = None
+        if schema.get("type") != "OBJECT":
+            if value:
+                return value
+            # Nothing usable in an array reply: one plain retry
+            self.reasks += 1
+            return self.parse_json(await self._generate(prompt, routing=routing, schema=schema), schema)
+
+        value = value if isinstance(value, dict) else {}
+        missing = [f for f in missing_fields(value, schema) if needed is None or f in needed]
+        if not missing:
+            return value
+        self.reasks += 1
+        partial = subschema(schema, missing)
+        reask = f"""{prompt}
+
+Return JSON with ONLY these fields: {describe(partial)}."""
+        extra = self.parse_json(await self._generate(reask, routing=routing, schema=partial), partial)
+        value.update({f: extra[f] for f in missing if f in extra})
+        if not value:
+            raise StructuredOutputError("Reply had none of the required fields")
+        return value
+
+    async def summarize_chunks(self, text: str) -> str:
+        """
+        Map step for long texts: summarizes each chunk concurrently and returns
+        the partial summaries and key points, in document order, as one text.
+        """
+        chunks = split_text(text, self.chunk_words)
+        prompts = [
+            f"""Summarize section {i} of {len(chunks)} of a longer document.
+Keep every fact, definition and example that would matter for studying.
+
+Section:
+{chunk}
+
+Return JSON:
+{{
+  "summary": "summary of this section",
+  "keyPoints": ["point1", ...]
+}}
+"""
+            for i, chunk in enumerate(chunks, 1)
+        ]
+        replies = await asyncio.gather(*(self._ask_json(p, SECTION_SCHEMA) for p in prompts), return_exceptions=True)
+
+        sections = []
+        for i, partial in enumerate(replies, 1):
+            if isinstance(partial, BaseException):
+                print(f"Error summarizing section {i}/{len(chunks)}: {partial}")
+                continue
+            points = "\n".join(f"- {p}" for p in partial.get("keyPoints", []))
+            sections.append(f"Section {i} summary: {partial.get('summary', '')}\nSection {i} key points:\n{points}")
+        if not sections:
+            raise replies[0] if isinstance(replies[0], BaseException) else ValueError("No section could be summarized")
+        return "\n\n".join(sections)
 
     def calculate_flashcard_count(self, text: str) -> int:
         """
@@ -37,11 +215,11 @@ class LLMService:
         else:
             return 8
 
-    def generate_more_flashcards(self, summary: str, key_points: List[str], count: int = 4) -> List[Dict]:
+    async def generate_more_flashcards(self, summary: str, key_points: List[str], count: int = 4) -> List[Dict]:
         """
         Generate additional flashcards based on existing summary and key points.
         """
-        if not self.model:
+        if not self.configured:
             return []
         
         try:
@@ -61,81 +239,204 @@ Return ONLY a JSON array of flashcards in this exact format:
   {{"q": "question here", "a": "answer here"}}
 ]"""
 
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Clean up markdown code blocks if present
-            if result_text.startswith("```json"):
-                result_text = result_text[7:]
-            if result_text.startswith("```"):
-                result_text = result_text[3:]
-            if result_text.endswith("```"):
-                result_text = result_text[:-3]
-            
-            result_text = result_text.strip()
-            flashcards = json.loads(result_text)
+            flashcards = await self._ask_json(prompt, FLASHCARDS_SCHEMA)
             
             return flashcards
         except Exception as e:
             print(f"Error generating more flashcards: {e}")
             return []
 
-    def process_text(self, text: str, current_subject: Optional[str] = None, existing_subjects: List[str] = None) -> Dict:
-        if not self.model:
-            return {"subject": "Error", "summary": "API key not configured.", "action": "error"}
+    def route_cached(self, result: Dict, current_subject: Optional[str], existing_subjects: Optional[List[str]]) -> Dict:
+        """
+        Re-derives action/reason for a cached result, since the current and
+        existing subjects may have changed since it was generated.
+        """
+        subject = result.get("subject", "Other")
+        if current_subject and subject.lower() == current_subject.lower():
+            action = "keep"
+        elif subject.lower() in {s.lower() for s in existing_subjects or []}:
+            action = "move"
+        else:
+            action = "create"
+        if action != result.get("action"):
+            result["reason"] = {
+                "keep": "Matches current topic",
+                "move": f"Better fits {subject}",
+                "create": "New topic detected",
+            }[action]
+        result["action"] = action
+        return result
 
-        try:
-            # Calculate dynamic flashcard count
-            flashcard_count = self.calculate_flashcard_count(text)
-            
-            existing_subjects_str = ", ".join(existing_subjects) if existing_subjects else "None"
-            current_subject_str = current_subject if current_subject else "None"
+    async def route_text(self, text: str, current_subject: Optional[str] = None,
+                         existing_subjects: List[str] = None) -> Dict:
+        """
+        Phase one: decides only where the text belongs, with the fast model
+        and an excerpt of the text. Returns {"action", "subject", "reason"}.
+
+        With a trained classifier, a clear match for the current subject is
+        kept without calling the model, and otherwise only the top candidate
+        subjects (plus the current one) go into the prompt.
+        """
+        all_subjects = existing_subjects or []
+        if self.classifier is not None and self.classifier.ready and existing_subjects:
+            ranked = await asyncio.to_thread(self.classifier.rank, text)
+            if self.classifier.confident_keep(ranked, current_subject):
+                self.local_routes += 1
+                return {"action": "keep", "subject": current_subject, "reason": "Matches current topic"}
+            existing = set(existing_subjects)
+            candidates = [s for s, _ in ranked if s in existing][:ROUTING_CANDIDATES]
+            if current_subject and current_subject in existing and current_subject not in candidates:
+                candidates.append(current_subject)
+            if candidates:
+                existing_subjects = candidates
+
+        words = text.split()
+        excerpt = " ".join(words[:ROUTING_EXCERPT_WORDS])
+        if len(words) > ROUTING_EXCERPT_WORDS:
+            excerpt += " ..."
+        existing_subjects_str = ", ".join(existing_subjects) if existing_subjects else "None"
+        current_subject_str = current_subject if current_subject else "None"
 
-            prompt = f"""Analyze the following text.
+        prompt = f"""Decide which study subject the following text belongs to.
 Current Subject Context: "{current_subject_str}"
 Existing Subjects: {existing_subjects_str}
 
-Tasks:
 1. Determine if the text belongs to the Current Subject.
 2. If NOT, determine if it belongs to one of the Existing Subjects.
 3. If NOT, suggest a new concise Subject Name.
-4. Provide a concise summary.
-5. Extract key points.
-6. Generate {flashcard_count} flashcards.
 
 Text:
-{text}
+{excerpt}
 
 Return JSON:
 {{
   "action": "keep" (if matches current) OR "move" (if matches existing) OR "create" (if new),
   "subject": "The determined subject name",
-  "reason": "Short reason for the action (e.g. 'Matches current topic', 'Better fits History', 'New topic detected')",
+  "reason": "Short reason for the action (e.g. 'Matches current topic', 'Better fits History', 'New topic detected')"
+}}
+"""
+        # A missing reason isn't worth another call
+        route = await self._ask_json(prompt, ROUTE_SCHEMA, routing=True, needed=["action", "subject"])
+        action, subject = route.get("action", "keep"), route.get("subject") or "Other"
+        if action == "create":
+            # A "new" subject may be one that wasn't among the candidates offered
+            for existing in all_subjects:
+                if existing.lower() == subject.lower():
+                    action, subject = ("keep" if existing == current_subject else "move"), existing
+                    break
+        return {"action": action, "subject": subject, "reason": route.get("reason", "")}
+
+    async def generate_note_content(self, text: str, on_partial: Optional[Callable[[Dict], None]] = None,
+                                    kind: str = "text") -> Dict:
+        """
+        Phase two: the summary, key points and flashcards for `text`
+        (source code, if `kind` is "code").
+        With `on_partial`, the reply is streamed and on_partial receives the
+        fields completed so far each time one (or a key point / flashcard) completes.
+        """
+        # Calculate dynamic flashcard count (from the whole document, even when chunked)
+        flashcard_count = self.calculate_flashcard_count(text)
+
+        intro = "Analyze the following text."
+        if kind == "code":
+            intro = ("Analyze the following source code as study material. Summarize what it does, extract the "
+                     "concepts and techniques it demonstrates as key points, and ask about those in the flashcards.")
+        content = text
+        if word_count(text) > self.chunk_threshold:
+            # Reduce step: write the note from the per-section summaries
+            content = await self.summarize_chunks(text)
+            intro = ("Analyze the following document. It was too long to send whole, so it is given as "
+                     "summaries and key points of its consecutive sections; write one note for the entire document.")
+
+        prompt = f"""{intro}
+
+Tasks:
+1. Provide a concise summary.
+2. Extract key points.
+3. Generate {flashcard_count} flashcards.
+
+Text:
+{content}
+
+Return JSON:
+{{
   "summary": "summary here",
   "keyPoints": ["point1", ...],
   "flashcards": [{{"q": "...", "a": "..."}}, ...]
 }}
 """
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Sometimes the model wraps JSON in markdown code blocks
-            if result_text.startswith("```json"):
-                result_text = result_text[7:]
-            if result_text.startswith("```"):
-                result_text = result_text[3:]
-            if result_text.endswith("```"):
-                result_text = result_text[:-3]
-            
-            result_text = result_text.strip()
-            result = json.loads(result_text)
+        on_text = None
+        if on_partial is not None:
+            parser = IncrementalJSONParser()
+
+            def on_text(piece: str):
+                if parser.feed(piece):
+                    on_partial({k: list(v) if isinstance(v, list) else v for k, v in parser.fields.items()})
+
+        return await self._ask_json(prompt, CONTENT_SCHEMA, on_text)
+
+    async def process_text(self, text: str, current_subject: Optional[str] = None, existing_subjects: List[str] = None,
+                           on_partial: Optional[Callable[[Dict], None]] = None, kind: str = "text") -> Dict:
+        """
+        Generates a note for `text` and decides where it belongs. `kind` is
+        "code" for clips the content filter recognized as source code.
+
+        Routing (route_text) and content generation (generate_note_content)
+        run concurrently, so the subject decision is usually known long
+        before the note is written. With `on_partial`, it receives the note
+        as built so far: first action/subject/reason, then content fields as
+        they stream in.
+
+        The result carries `source_minhash`, the clip's near-duplicate
+        signature (app.utils.dedupe), so the note can be recognized when the
+        same text is copied again.
+        """
+        result = await self._process_text(text, current_subject, existing_subjects, on_partial, kind)
+        signature = await asyncio.to_thread(source_signature, text)
+        if signature is not None:
+            result["source_minhash"] = signature
+        return result
+
+    async def _process_text(self, text: str, current_subject: Optional[str], existing_subjects: Optional[List[str]],
+                            on_partial: Optional[Callable[[Dict], None]], kind: str) -> Dict:
+        key = None
+        if self.cache is not None:
+            version = PROMPT_VERSION if kind == "text" else f"{PROMPT_VERSION}-{kind}"
+            key = cache_key(text, version, self.model_name)
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return self.route_cached(cached, current_subject, existing_subjects)
+
+        if not self.configured:
+            return {"subject": "Error", "summary": "API key not configured.", "action": "error"}
+
+        note: Dict = {}
+
+        def publish(fields: Dict):
+            note.update(fields)
+            if on_partial is not None:
+                on_partial(dict(note))
+
+        async def route():
+            try:
+                routed = await self.route_text(text, current_subject, existing_subjects)
+            except Exception as e:
+                # The note is still worth keeping; file it under the open subject
+                print(f"Error routing text: {e}")
+                routed = {"action": "keep", "subject": current_subject or "Other", "reason": "Routing unavailable"}
+            publish(routed)
+
+        route_task = asyncio.create_task(route())
+        try:
+            content = await self.generate_note_content(text, publish if on_partial is not None else None, kind)
+            await route_task
+            result = {**note, **content}
+            if key is not None and isinstance(result, dict) and result.get("action") != "error":
+                await asyncio.to_thread(self.cache.put, key, result)
             return result
         except Exception as e:
             print(f"Error processing text: {e}")
-            return {
-                "subject": "Error",
-                "summary": f"Failed to process: {str(e)}",
-                "keyPoints": [],
-                "flashcards": [],
-                "action": "error"
-            }
+            return error_result(f"Failed to process: {str(e)}")
+        finally:
+            if not route_task.done():
+                route_task.cancel()
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Coroutine, Optional
+
+
+class EventLoopThread:
+    """
+    One asyncio event loop running on a daemon thread for the lifetime of
+    the app. Synchronous code (Qt slots, scripts) hands coroutines to it with
+    submit() and gets a concurrent.futures.Future back.
+    """
+
+    def __init__(self, name: str = "asyncio-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        # Give cancelled tasks a chance to run their cleanup before closing
+        pending = asyncio.all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    def submit(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None):
+        """Runs a coroutine on the loop and blocks until it finishes. Not for use on the loop thread."""
+        return self.submit(coro).result(timeout)
+
+    def close(self):
+        if self.loop.is_closed() or not self._thread.is_alive():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,145 @@
+"""
+Local OpenAI-compatible server backed by MockProvider, for running the app
+or benchmarks with no network.
+
+    python -m app.ai.mock_server --port 8765 --latency 0.3 --failure-rate 0.05
+
+Point the app at it with config.json:
+
+    {"provider": "openai", "base_url": "http://127.0.0.1:8765/v1"}
+
+Serves POST /v1/chat/completions (plain and streamed) and GET /v1/models.
+Injected failures come back as HTTP 503, or 429 with a Retry-After header.
+"""
+import argparse
+import asyncio
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from app.ai.providers import MockAPIError, MockProvider
+
+
+def _schema_from(body: dict) -> Optional[dict]:
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return (response_format.get("json_schema") or {}).get("schema")
+    return None
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    provider: MockProvider = None  # Set on the handler class by make_server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # One line per request would swamp a load test
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            models = [self.provider.model_name, self.provider.routing_model_name]
+            self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in models]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            prompt = body["messages"][-1]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            self._send_json(400, {"error": {"message": f"Bad request: {e}"}})
+            return
+        model = body.get("model") or self.provider.model_name
+        routing = model == self.provider.routing_model_name
+        schema = _schema_from(body)
+        try:
+            if body.get("stream"):
+                self._stream(prompt, schema, routing, model)
+            else:
+                content = asyncio.run(self.provider.generate(prompt, schema, routing))
+                self._send_json(200, {
+                    "id": f"mock-{time.monotonic_ns()}",
+                    "object": "chat.completion",
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                })
+        except MockAPIError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+            self._send_json(e.code, {"error": {"message": str(e), "code": e.code}}, headers)
+
+    def _stream(self, prompt: str, schema: Optional[dict], routing: bool, model: str):
+        async def send():
+            # Pieces are written as the provider yields them, so the first one arrives after `latency`
+            stream = self.provider.stream(prompt, schema, routing)
+            first = await stream.__anext__()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self._event(model, first)
+            async for piece in stream:
+                self._event(model, piece)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        self.close_connection = True
+        asyncio.run(send())
+
+    def _event(self, model: str, piece: str):
+        chunk = {"object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def make_server(provider: MockProvider, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """A server for `provider`; call serve_forever() (port 0 picks a free port, see server_address)."""
+    handler = type("BoundMockHandler", (MockHandler,), {"provider": provider})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve MockProvider over an OpenAI-compatible HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before each reply")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--chars-per-second", type=float, default=0, help="streaming speed (0 = instant)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of calls answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    provider = MockProvider(latency=args.latency, jitter=args.jitter, chars_per_second=args.chars_per_second,
+                            failure_rate=args.failure_rate, rate_limit_rate=args.rate_limit_rate,
+                            retry_after=args.retry_after, seed=args.seed)
+    server = make_server(provider, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Mock LLM server on http://{host}:{port}/v1 (models: {provider.model_name}, {provider.routing_model_name})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
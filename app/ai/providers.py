@@ -0,0 +1,365 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import urllib.request
+from typing import AsyncIterator, Dict, Optional
+
+try:
+    import google.generativeai as genai
+except ImportError:  # Only needed for the Gemini provider
+    genai = None
+
+from app.ai.structured import CONTENT_SCHEMA, FLASHCARDS_SCHEMA, ROUTE_SCHEMA, SECTION_SCHEMA, to_json_schema
+
+GEMINI_MODEL = 'gemini-2.5-flash'
+GEMINI_ROUTING_MODEL = 'gemini-2.5-flash-lite'
+
+
+class LLMProvider:
+    """
+    A text-generation backend for LLMService. generate() returns the whole
+    reply; stream() yields it in pieces. `schema` (see app.ai.structured)
+    asks for JSON of that shape; `routing` selects the provider's small,
+    fast model where it has one.
+
+    Errors should carry an HTTP-like `code` (and `retry_after` where known)
+    so app.ai.resilience can tell transient failures from permanent ones.
+    """
+    name = "base"
+
+    def __init__(self, model_name: str, routing_model_name: Optional[str] = None):
+        self.model_name = model_name
+        self.routing_model_name = routing_model_name or model_name
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @property
+    def needs_api_key(self) -> bool:
+        return False
+
+    def configure(self, api_key: str):
+        pass
+
+    async def generate(self, prompt: str, schema: Optional[Dict] = None, routing: bool = False) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, schema: Optional[Dict] = None, routing: bool = False) -> AsyncIterator[str]:
+        yield await self.generate(prompt, schema, routing)
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL, routing_model_name: str = GEMINI_ROUTING_MODEL):
+        super().__init__(model_name, routing_model_name)
+        self.model = None
+        self.routing_model = None
+
+    @property
+    def configured(self) -> bool:
+        return self.model is not None
+
+    @property
+    def needs_api_key(self) -> bool:
+        return True
+
+    def configure(self, api_key: str):
+        if genai is None:
+            raise RuntimeError("google-generativeai is not installed")
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(self.model_name)
+        self.routing_model = genai.GenerativeModel(self.routing_model_name)
+
+    @staticmethod
+    def _config(schema: Optional[Dict]) -> Optional[Dict]:
+        if schema is None:
+            return None
+        return {"response_mime_type": "application/json", "response_schema": schema}
+
+    async def generate(self, prompt: str, schema: Optional[Dict] = None, routing: bool = False) -> str:
+        model = self.routing_model if routing else self.model
+        response = await model.generate_content_async(prompt, generation_config=self._config(schema))
+        return response.text
+
+    async def stream(self, prompt: str, schema: Optional[Dict] = None, routing: bool = False) -> AsyncIterator[str]:
+        model = self.routing_model if routing else self.model
+        response = await model.generate_content_async(prompt, generation_config=self._config(schema), stream=True)
+        async for chunk in response:
+            text = self._chunk_text(chunk)
+            if text:
+                yield text
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """A streamed chunk's text; "" for chunks without text parts (safety-blocked, or the final one)."""
+        try:
+            return chunk.text
+        except ValueError:
+            # .text raises when the chunk has no text parts
+            return ""
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Any server speaking the OpenAI chat completions API: llama.cpp, Ollama,
+    vLLM, LM Studio, app.ai.mock_server, or OpenAI itself. Uses urllib on
+    worker threads, so it needs no extra packages.
+    """
+    name = "openai"
+
+    def __init__(self, base_url: str = "http://localhost:8765/v1", model_name: str = "local-model",
+                 routing_model_name: Optional[str] = None, api_key: Optional[str] = None, timeout: float = 120):
+        super().__init__(model_name, routing_model_name)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.base_url)
+
+    def configure(self, api_key: str):
+        self.api_key = api_key or None
+
+    def _request(self, prompt: str, schema: Optional[Dict], routing: bool, stream: bool) -> urllib.request.Request:
+        body = {
+            "model": self.routing_model_name if routing else self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": stream,
+        }
+        if schema is not None:
+            body["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "reply", "strict": True, "schema": to_json_schema(schema)},
+            }
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return urllib.request.Request(f"{self.base_url}/chat/completions", data=json.dumps(body).encode("utf-8"),
+                                      headers=headers, method="POST")
+
+    def _post(self, request: urllib.request.Request) -> str:
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            reply = json.load(response)
+        return reply["choices"][0]["message"]["content"] or ""
+
+    async def generate(self, prompt: str, schema: Optional[Dict] = None, routing: bool = False) -> str:
+        return await asyncio.to_thread(self._post, self._request(prompt, schema, routing, stream=False))
+
+    async def stream(self, prompt: str, schema: Optional[Dict] = None, routing: bool = False) -> AsyncIterator[str]:
+        # A worker thread reads the server-sent events and hands pieces to the loop
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        request = self._request(prompt, schema, routing, stream=True)
+
+        def read():
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    for line in response:
+                        if stop.is_set():
+                            break
+                        line = line.decode("utf-8").strip()
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                        if delta:
+                            loop.call_soon_threadsafe(queue.put_nowait, delta)
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        threading.Thread(target=read, name="OpenAIStream", daemon=True).start()
+        try:
+            while True:
+                piece = await queue.get()
+                if piece is None:
+                    return
+                if isinstance(piece, Exception):
+                    raise piece
+                yield piece
+        finally:
+            stop.set()
+
+
+class MockAPIError(Exception):
+    """Injected failure; `code` and `retry_after` mimic an HTTP error."""
+
+    def __init__(self, code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.code = code
+        self.retry_after = retry_after
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_TEXT_RE = re.compile(r"\n(?:Text|Section):\n(.*?)(?:\n\nReturn |\Z)", re.DOTALL)
+_CURRENT_RE = re.compile(r'Current Subject Context: "([^"]*)"')
+_EXISTING_RE = re.compile(r"Existing Subjects: (.*)")
+_COUNT_RE = re.compile(r"[Gg]enerate (\d+)")
+
+
+class MockProvider(LLMProvider):
+    """
+    Offline stand-in for a real model, for benchmarks and load tests.
+
+    Replies are built from the prompt itself (sentences of the text become
+    the summary, key points and flashcards), shaped by the requested schema.
+    The same prompt, seed and attempt number always give the same reply and
+    the same injected failures, however calls interleave.
+
+    latency / jitter: seconds before the reply (or first streamed piece)
+    chars_per_second: streaming speed after that (0 streams instantly)
+    failure_rate: share of calls failing with a 503
+    rate_limit_rate: share of calls failing with a 429 and a retry-after
+    """
+    name = "mock"
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, chars_per_second: float = 0,
+                 failure_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0,
+                 seed: int = 0, chunk_chars: int = 32, model_name: str = "mock",
+                 routing_model_name: str = "mock-routing"):
+        super().__init__(model_name, routing_model_name)
+        self.latency = latency
+        self.jitter = jitter
+        self.chars_per_second = chars_per_second
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self.failures = 0
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()  # The mock server calls in from several threads
+
+    def _rng(self, prompt: str, routing: bool) -> random.Random:
+        digest = hashlib.sha256(f"{routing}:{prompt}".encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+            self.calls += 1
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def _check_failure(self, rng: random.Random):
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.failures += 1
+            raise MockAPIError(429, f"Rate limited. Please retry in {self.retry_after}s.", self.retry_after)
+        if roll < self.rate_limit_rate + self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            raise MockAPIError(503, "The model is overloaded")
+
+    async def _wait(self, rng: random.Random):
+        await asyncio.sleep(max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter)))
+
+    async def generate(self, prompt: str, schema: Optional[Dict] = None, routing: bool = False) -> str:
+        rng = self._rng(prompt, routing)
+        await self._wait(rng)
+        self._check_failure(rng)
+        return self.reply(prompt, schema, rng)
+
+    async def stream(self, prompt: str, schema: Optional[Dict] = None, routing: bool = False) -> AsyncIterator[str]:
+        rng = self._rng(prompt, routing)
+        await self._wait(rng)
+        self._check_failure(rng)
+        text = self.reply(prompt, schema, rng)
+        for i in range(0, len(text), self.chunk_chars):
+            piece = text[i:i + self.chunk_chars]
+            if self.chars_per_second:
+                await asyncio.sleep(len(piece) / self.chars_per_second)
+            yield piece
+
+    @staticmethod
+    def guess_schema(prompt: str) -> Dict:
+        """The app's schema a prompt asks for, when the caller didn't send one."""
+        if '"action"' in prompt:
+            return ROUTE_SCHEMA
+        if "JSON array of flashcards" in prompt:
+            return FLASHCARDS_SCHEMA
+        if '"flashcards"' in prompt:
+            return CONTENT_SCHEMA
+        return SECTION_SCHEMA
+
+    def reply(self, prompt: str, schema: Optional[Dict], rng: random.Random) -> str:
+        schema = schema or self.guess_schema(prompt)
+        match = _TEXT_RE.search(prompt)
+        text = (match.group(1) if match else prompt).strip()
+        sentences = [s for s in _SENTENCE_RE.split(text) if s.strip()] or [text]
+        count = _COUNT_RE.search(prompt)
+        context = {
+            "prompt": prompt,
+            "text": text,
+            "sentences": sentences,
+            "count": int(count.group(1)) if count else 3,
+        }
+        return json.dumps(self._value(schema, "", context, rng))
+
+    def _value(self, schema: Dict, name: str, context: Dict, rng: random.Random):
+        kind = schema.get("type", "").upper()
+        properties = schema.get("properties", {})
+        if kind == "OBJECT":
+            if "action" in properties:
+                return self._route(context, rng)
+            return {key: self._value(field, key, context, rng) for key, field in properties.items()}
+        if kind == "ARRAY":
+            count = context["count"] if name in ("flashcards", "") else min(5, len(context["sentences"]))
+            return [self._value(schema.get("items", {}), name, context, rng) for _ in range(max(1, count))]
+        sentence = rng.choice(context["sentences"])
+        if name == "summary":
+            return " ".join(context["sentences"][:2])
+        if name == "q":
+            words = [w.strip(".,;:") for w in sentence.split() if len(w) > 4]
+            return f"What does the text say about {rng.choice(words) if words else 'this'}?"
+        return sentence
+
+    def _route(self, context: Dict, rng: random.Random) -> Dict:
+        prompt = context["prompt"]
+        current = _CURRENT_RE.search(prompt)
+        current = current.group(1) if current and current.group(1) != "None" else None
+        existing = _EXISTING_RE.search(prompt)
+        existing = [s.strip() for s in existing.group(1).split(",")] if existing else []
+        existing = [s for s in existing if s and s != "None"]
+        # A stable "topic" for the text: its longest word
+        words = sorted({w.strip(".,;:!?\"'()").lower() for w in context["text"].split()}, key=lambda w: (-len(w), w))
+        topic = words[0].capitalize() if words and words[0] else "General"
+        for subject in existing:
+            if subject.lower() == topic.lower():
+                if subject == current:
+                    return {"action": "keep", "subject": subject, "reason": "Matches current topic"}
+                return {"action": "move", "subject": subject, "reason": f"Better fits {subject}"}
+        if current and rng.random() < 0.5:
+            return {"action": "keep", "subject": current, "reason": "Matches current topic"}
+        return {"action": "create", "subject": topic, "reason": "New topic detected"}
+
+
+_MOCK_OPTIONS = ("latency", "jitter", "chars_per_second", "failure_rate", "rate_limit_rate", "retry_after", "seed")
+
+
+def create_provider(config: Dict) -> LLMProvider:
+    """
+    Builds the provider named by config["provider"] ("gemini", the default;
+    "openai"; or "mock"), passing through the matching config.json keys.
+    """
+    kind = (config.get("provider") or "gemini").lower()
+    if kind == "gemini":
+        return GeminiProvider(config.get("model") or GEMINI_MODEL,
+                              config.get("routing_model") or GEMINI_ROUTING_MODEL)
+    if kind == "openai":
+        return OpenAICompatibleProvider(config.get("base_url") or "http://localhost:8765/v1",
+                                        config.get("model") or "local-model", config.get("routing_model"),
+                                        config.get("api_key"))
+    if kind == "mock":
+        mock = config.get("mock") or {}
+        return MockProvider(**{k: v for k, v in mock.items() if k in _MOCK_OPTIONS})
+    raise ValueError(f"Unknown LLM provider: {kind}")
+
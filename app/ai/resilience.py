@@ -0,0 +1,291 @@
+import asyncio
+import random
+import re
+import time
+from typing import Awaitable, Callable, Optional
+
+# HTTP statuses worth retrying: rate limited, or a server-side hiccup
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# google.api_core exception names for the same conditions (when .code isn't an int)
+TRANSIENT_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "Aborted",
+}
+# Gemini quota errors say "Please retry in 12.5s" and/or "retry_delay { seconds: 12 }"
+_RETRY_IN_RE = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+_RETRY_DELAY_RE = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)")
+
+# States reported to on_state_change
+STATE_OK = "ok"
+STATE_RETRYING = "retrying"  # backing off after a transient failure or rate limit
+STATE_DOWN = "down"  # circuit open (calls held back until the API recovers), or a call ran out of retries
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while it is considered down."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"LLM API unavailable, retrying in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    for attr in ("code", "status_code", "status"):
+        value = getattr(error, attr, None)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_transient(error: BaseException) -> bool:
+    code = status_code(error)
+    if code is not None:
+        return code in TRANSIENT_STATUS
+    # Timeouts, refused connections, DNS failures (urllib's URLError is an OSError too)
+    if isinstance(error, (asyncio.TimeoutError, OSError)):
+        return True
+    return type(error).__name__ in TRANSIENT_NAMES
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Server-requested delay in seconds, from a Retry-After header or the error message."""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("Retry-After") or headers.get("retry-after")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+    message = str(error)
+    match = _RETRY_IN_RE.search(message) or _RETRY_DELAY_RE.search(message)
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt: int, base: float, cap: float, server_delay: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, but never sooner than the server asked for."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    return max(delay, server_delay or 0.0)
+
+
+class TokenBucket:
+    """
+    Request limiter: `rate` tokens per second refill a bucket of `capacity`,
+    and every call takes one, waiting if the bucket is empty. Coroutines
+    only; the bucket belongs to one event loop.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures. While
+    open, callers are held back (queued) until `reset_timeout` has passed,
+    or fail straight away if they can't wait that long. Then a single probe
+    call goes through (half-open): success closes the circuit and releases
+    the queue, failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 on_change: Optional[Callable[[str], None]] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_change = on_change
+        self.state = self.CLOSED
+        self.failures = 0
+        self.queued = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._changed: Optional[asyncio.Event] = None
+
+    @property
+    def retry_in(self) -> float:
+        return max(0.0, self._open_until - time.monotonic())
+
+    def _set(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+        if self.on_change is not None:
+            self.on_change(state)
+
+    async def before_call(self, max_wait: float):
+        """Waits until a call may be made; raises CircuitOpenError if that's more than `max_wait` away."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                remaining = self.retry_in
+                if remaining <= 0:
+                    self._set(self.HALF_OPEN)
+                    self._probing = True
+                    return
+                if time.monotonic() + remaining > deadline:
+                    raise CircuitOpenError(remaining)
+                await self._wait(remaining)
+            elif not self._probing:
+                self._probing = True
+                return
+            else:
+                # Someone else is probing; wait for the verdict
+                if time.monotonic() >= deadline:
+                    raise CircuitOpenError(self.reset_timeout)
+                await self._wait(deadline - time.monotonic())
+
+    async def _wait(self, timeout: float):
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        changed = self._changed
+        self.queued += 1
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.queued -= 1
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._set(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip(self.reset_timeout)
+
+    def release(self):
+        """Ends a probe that failed for a non-transient reason (says nothing about the API's health)."""
+        if self._probing:
+            self._probing = False
+            if self._changed is not None:
+                self._changed.set()
+                self._changed = None
+
+    def trip(self, duration: float):
+        """Opens the circuit for `duration` seconds (e.g. a long server-requested retry delay)."""
+        self._open_until = max(self._open_until, time.monotonic() + duration)
+        self._set(self.OPEN)
+
+
+class ApiGuard:
+    """
+    Wraps each API call with a token-bucket limiter, a circuit breaker, a
+    per-attempt timeout and retries with jittered exponential backoff
+    (honoring any server-requested delay).
+
+    `on_state_change(state, detail)` is called with STATE_OK, STATE_RETRYING
+    or STATE_DOWN whenever the picture changes; it runs on the event loop
+    thread.
+    """
+
+    def __init__(self, requests_per_minute: float = 60, burst: int = 10, max_attempts: int = 4,
+                 backoff_base: float = 1.0, backoff_cap: float = 30.0, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, max_queue_wait: float = 120.0):
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, on_change=self._on_breaker_change)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        # How long a call may sit queued behind an open circuit before it fails
+        self.max_queue_wait = max_queue_wait
+        self.on_state_change: Optional[Callable[[str, str], None]] = None
+        self.retries = 0
+        self._state = STATE_OK
+
+    def _report(self, state: str, detail: str = ""):
+        if state == self._state:
+            return
+        self._state = state
+        if self.on_state_change is not None:
+            self.on_state_change(state, detail)
+
+    def _settle(self):
+        """Ends a "retrying" state once a call stops retrying: down if the circuit opened, else ok."""
+        if self._state == STATE_RETRYING:
+            self._report(STATE_DOWN if self.breaker.state == CircuitBreaker.OPEN else STATE_OK)
+
+    def _on_breaker_change(self, state: str):
+        if state == CircuitBreaker.OPEN:
+            self._report(STATE_DOWN, f"retrying in {self.breaker.retry_in:.0f}s")
+        elif state == CircuitBreaker.CLOSED:
+            self._report(STATE_OK)
+
+    async def call(self, attempt: Callable[[], Awaitable], timeout: float,
+                   can_retry: Optional[Callable[[], bool]] = None, slot=None):
+        """
+        Runs `attempt()` (a coroutine factory) until it succeeds, fails with
+        a non-transient error, or runs out of attempts. `can_retry` may veto
+        a retry, e.g. once a streamed reply has already been passed on.
+        `slot` (e.g. a semaphore) is held only while an attempt runs, not
+        while backing off, and the timeout starts once it is acquired.
+        """
+        for number in range(self.max_attempts):
+            await self.breaker.before_call(self.max_queue_wait)
+            await self.bucket.acquire()
+            try:
+                if slot is None:
+                    result = await asyncio.wait_for(attempt(), timeout)
+                else:
+                    async with slot:
+                        result = await asyncio.wait_for(attempt(), timeout)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                self._settle()
+                raise
+            except Exception as e:
+                if not is_transient(e):
+                    self.breaker.release()
+                    self._settle()
+                    raise
+                self.breaker.record_failure()
+                server_delay = retry_after(e)
+                if number == self.max_attempts - 1:
+                    self._report(STATE_DOWN, f"gave up after {self.max_attempts} attempts ({type(e).__name__})")
+                    raise
+                if can_retry is not None and not can_retry():
+                    self._settle()
+                    raise
+                if server_delay is not None and server_delay > self.backoff_cap:
+                    # Waiting that long per call is what the breaker's queue is for
+                    self.breaker.trip(server_delay)
+                    continue
+                delay = backoff_delay(number, self.backoff_base, self.backoff_cap, server_delay)
+                self.retries += 1
+                print(f"LLM call failed ({type(e).__name__}: {e}); retry {number + 1} in {delay:.1f}s")
+                if self.breaker.state == CircuitBreaker.CLOSED:
+                    self._report(STATE_RETRYING, f"retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self._report(STATE_OK)
+            return result
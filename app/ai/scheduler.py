@@ -0,0 +1,227 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from app.ai.cache import normalize_text
+from app.ai.journal import DONE, FAILED, PROCESSING, QUEUED, IngestionJournal
+from app.ai.resilience import STATE_OK
+
+# A clip waiting to be sent: (normalized, text, kind, journal entry id or None)
+Clip = Tuple[str, str, str, Optional[str]]
+
+
+def overlaps(a: str, b: str) -> bool:
+    """True if one normalized clip contains the other (a growing or shrinking selection)."""
+    return a in b or b in a
+
+
+class IngestionScheduler(QObject):
+    """
+    Sits between ClipboardMonitor.text_copied and the LLM bridge.
+
+    Copies are held for `debounce_ms` after the most recent one. A copy
+    that contains, or is contained in, a clip still waiting replaces it, so
+    only the final selection is processed. If a request for an overlapping
+    clip is already in flight, that request is cancelled. Unrelated clips are
+    each processed, in the order they were copied, at most `max_in_flight`
+    at a time, and only while the LLM backend is configured.
+
+    With a `journal`, every clip is recorded before anything else happens.
+    resume() picks up what an earlier run left unfinished. A failed request
+    is retried later, with backoff, or as soon as the API is reported
+    healthy again; its result is only passed on once it runs out of
+    attempts. Call complete() once a result has been saved. Pausing stops
+    all requests but leaves journaled clips pending for when it resumes.
+    """
+    result_ready = Signal(int, dict)  # request id, note result for a clip that wasn't superseded
+    partial_ready = Signal(int, dict)  # request id, note as generated so far
+    queue_changed = Signal(int)  # clips waiting + requests in flight
+    request_dropped = Signal(int)  # request id cancelled, or failed and deferred for retry, before a result
+    clip_discarded = Signal(str)  # text of a clip given up without a result (superseded or cancelled)
+
+    DEBOUNCE_MS = 600
+    MAX_IN_FLIGHT = 4
+    RETRY_BASE_MS = 30000
+    RETRY_MAX_MS = 15 * 60 * 1000
+
+    def __init__(self, llm_bridge, context: Callable[[], Tuple[Optional[str], List[str]]],
+                 debounce_ms: Optional[int] = None, journal: Optional[IngestionJournal] = None,
+                 max_in_flight: Optional[int] = None, parent=None):
+        super().__init__(parent)
+        self.llm_bridge = llm_bridge
+        # Returns (current subject, existing subjects) at the moment a clip is sent
+        self.context = context
+        self.journal = journal
+        self.max_in_flight = max_in_flight or self.MAX_IN_FLIGHT
+        self.coalesced = 0
+        self.cancelled = 0
+        self.retried = 0
+        self.paused = False
+        self._waiting: List[Clip] = []  # Still debouncing, oldest first
+        self._ready: List[Clip] = []  # Debounced, waiting for a free slot
+        self._in_flight: Dict[int, Clip] = {}  # request id -> clip
+        self._sent: Dict[int, str] = {}  # request id -> journal entry id, until complete()
+        self._deferred: List[Clip] = []  # Failed, waiting for their retry
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.DEBOUNCE_MS if debounce_ms is None else debounce_ms)
+        self._timer.timeout.connect(self._dispatch)
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.timeout.connect(self.retry_now)
+        self.llm_bridge.text_processed.connect(self._on_processed)
+        self.llm_bridge.text_partial.connect(self._on_partial)
+        self.llm_bridge.api_state_changed.connect(self._on_api_state)
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiting) + len(self._ready) + len(self._in_flight) + len(self._deferred)
+
+    def submit(self, text: str, kind: str = "text"):
+        """`kind` is "text", or "code" for source code (see LLMService.process_text)."""
+        normalized = normalize_text(text)
+        if not normalized:
+            return
+        entry_id = self.journal.add(text, kind) if self.journal is not None else None
+        for queue in (self._waiting, self._ready):
+            kept = [clip for clip in queue if not overlaps(clip[0], normalized)]
+            for clip in queue:
+                if clip not in kept:
+                    self._discard(clip, "superseded")
+            self.coalesced += len(queue) - len(kept)
+            queue[:] = kept
+        self._waiting.append((normalized, text, kind, entry_id))
+        self._cancel_overlapping(normalized)
+        self._timer.start()
+        self.queue_changed.emit(self.depth)
+
+    def resume(self):
+        """Queues the journal's unfinished clips (from an earlier run, or deferred) and sends what it can."""
+        if self.paused:
+            return
+        if self.journal is not None:
+            known = {clip[3] for clip in self._waiting + self._ready + self._deferred + list(self._in_flight.values())}
+            for entry in self.journal.pending():
+                if entry["id"] not in known:
+                    self._ready.append((normalize_text(entry["text"]), entry["text"], entry["kind"], entry["id"]))
+        self.retry_now()
+
+    def retry_now(self):
+        """Sends deferred clips without waiting out their backoff."""
+        self._retry_timer.stop()
+        self._ready.extend(self._deferred)
+        self._deferred.clear()
+        self._fill()
+        self.queue_changed.emit(self.depth)
+
+    def complete(self, request_id: int, note_id: Optional[str] = None):
+        """Marks the clip behind `request_id` done, once its note is saved."""
+        entry_id = self._sent.pop(request_id, None)
+        if note_id is not None:
+            self._finish(entry_id, "saved", note_id=note_id)
+        else:
+            self._finish(entry_id, "discarded")
+
+    def set_paused(self, paused: bool):
+        """
+        Pausing (e.g. while monitoring is off) cancels everything in flight
+        and sends nothing more. Journaled clips stay pending and are picked
+        up again on unpausing; without a journal they are dropped.
+        """
+        self.paused = paused
+        if not paused:
+            self.resume()
+            return
+        self._timer.stop()
+        self._retry_timer.stop()
+        for request_id, clip in list(self._in_flight.items()):
+            self.llm_bridge.cancel(request_id)
+            self._sent.pop(request_id, None)
+            if clip[3] is not None:
+                self.journal.mark(clip[3], QUEUED)
+            self.request_dropped.emit(request_id)
+        for clip in self._waiting + self._ready + self._deferred + list(self._in_flight.values()):
+            if clip[3] is None:
+                self._discard(clip, "cancelled")
+        self._waiting.clear()
+        self._ready.clear()
+        self._deferred.clear()
+        self._in_flight.clear()
+        self.queue_changed.emit(0)
+
+    def _finish(self, entry_id: Optional[str], outcome: str, **fields):
+        if self.journal is not None and entry_id is not None:
+            self.journal.mark(entry_id, DONE, outcome=outcome, **fields)
+
+    def _discard(self, clip: Clip, outcome: str):
+        self._finish(clip[3], outcome)
+        self.clip_discarded.emit(clip[1])
+
+    def _cancel_overlapping(self, normalized: str):
+        for request_id, clip in list(self._in_flight.items()):
+            if overlaps(clip[0], normalized):
+                del self._in_flight[request_id]
+                self.llm_bridge.cancel(request_id)
+                self._sent.pop(request_id, None)
+                self._discard(clip, "superseded")
+                self.request_dropped.emit(request_id)
+                self.cancelled += 1
+        for clip in [c for c in self._deferred if overlaps(c[0], normalized)]:
+            self._deferred.remove(clip)
+            self._discard(clip, "superseded")
+
+    def _dispatch(self):
+        self._ready.extend(self._waiting)
+        self._waiting.clear()
+        self._fill()
+
+    def _fill(self):
+        """Sends ready clips while there are free slots."""
+        if (self.paused or not self._ready or len(self._in_flight) >= self.max_in_flight
+                or not self.llm_bridge.llm_service.configured):
+            return
+        current_subject, existing_subjects = self.context()
+        while self._ready and len(self._in_flight) < self.max_in_flight:
+            clip = self._ready.pop(0)
+            normalized, text, kind, entry_id = clip
+            request_id = self.llm_bridge.process_text(text, current_subject, existing_subjects, stream=True, kind=kind)
+            self._in_flight[request_id] = clip
+            if entry_id is not None:
+                self._sent[request_id] = entry_id
+                self.journal.mark(entry_id, PROCESSING)
+        self.queue_changed.emit(self.depth)
+
+    def _on_processed(self, request_id: int, result: dict):
+        clip = self._in_flight.pop(request_id, None)
+        if clip is None:
+            return  # Not ours, or superseded
+        entry_id = clip[3]
+        if result.get("action") == "error" and entry_id is not None:
+            self.journal.mark(entry_id, FAILED, error=result.get("summary", ""))
+            self._sent.pop(request_id, None)
+            if self.journal.can_retry(entry_id):
+                self._defer(clip)
+                self.request_dropped.emit(request_id)
+                self._fill()
+                self.queue_changed.emit(self.depth)
+                return
+            # Out of attempts: stays in the journal as failed, and the error is reported
+        self._fill()
+        self.queue_changed.emit(self.depth)
+        self.result_ready.emit(request_id, result)
+
+    def _defer(self, clip: Clip):
+        self._deferred.append(clip)
+        self.retried += 1
+        if not self._retry_timer.isActive():
+            attempts = self.journal.get(clip[3]).get("attempts", 1)
+            self._retry_timer.start(min(self.RETRY_MAX_MS, self.RETRY_BASE_MS * 2 ** (attempts - 1)))
+
+    def _on_api_state(self, state: str, detail: str):
+        # Connectivity is back: no need to wait out the backoff
+        if state == STATE_OK and self._deferred:
+            self.retry_now()
+
+    def _on_partial(self, request_id: int, partial: dict):
+        if request_id in self._in_flight:
+            self.partial_ready.emit(request_id, partial)
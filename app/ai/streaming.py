@@ -0,0 +1,134 @@
+import json
+from typing import Dict, List, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object as it streams in, reporting each top-level field as
+    soon as its value is complete. Items of top-level array fields are
+    reported one at a time as well, so a list of key points or flashcards
+    fills in progressively.
+
+    feed() returns (key, value) updates in arrival order; for array fields
+    the value is the list of items completed so far. Anything before the
+    first "{" (such as a markdown code fence) is skipped.
+    """
+
+    def __init__(self):
+        self.fields: Dict = {}
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._done = False
+        self._key = None
+        self._expect_key = True
+        self._value_start = None
+        self._item_start = None  # start of the current item inside a top-level array
+
+    @property
+    def done(self) -> bool:
+        """True once the closing brace of the top-level object has been seen."""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        updates = []
+        self._buffer += chunk
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer) and not self._done:
+            c = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key and self._value_start is not None:
+                        self._key = json.loads(buffer[self._value_start:i + 1])
+                        self._value_start = None
+                i += 1
+                continue
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                i += 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._value_start = i
+                elif self._depth == 2 and self._item_start is None and self._is_array_field():
+                    self._item_start = i
+            elif c in "{[":
+                if self._depth == 1 and self._value_start is None:
+                    self._value_start = i
+                elif self._depth == 2 and self._item_start is None and self._is_array_field():
+                    self._item_start = i
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 2 and c == "]" and self._is_array_field():
+                    self._end_item(i, updates)
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end_value(i, updates)
+                    self._done = True
+            elif c == ":" and self._depth == 1:
+                self._expect_key = False
+            elif c == "," and self._depth == 1:
+                self._end_value(i, updates)
+            elif c == "," and self._depth == 2 and self._is_array_field():
+                self._end_item(i, updates)
+            elif not c.isspace():
+                # Start of a number/true/false/null value or array item
+                if self._depth == 1 and self._value_start is None:
+                    self._value_start = i
+                elif self._depth == 2 and self._item_start is None and self._is_array_field():
+                    self._item_start = i
+            i += 1
+        self._pos = i
+        return updates
+
+    def _is_array_field(self) -> bool:
+        return self._value_start is not None and self._buffer[self._value_start] == "["
+
+    def _end_item(self, end: int, updates: List):
+        if self._item_start is None:
+            return
+        text = self._buffer[self._item_start:end].strip()
+        self._item_start = None
+        try:
+            item = json.loads(text)
+        except ValueError:
+            return
+        items = self.fields.setdefault(self._key, [])
+        items.append(item)
+        updates.append((self._key, list(items)))
+
+    def _end_value(self, end: int, updates: List):
+        if self._key is None or self._value_start is None:
+            self._reset_field()
+            return
+        text = self._buffer[self._value_start:end].strip()
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self._reset_field()
+            return
+        # Arrays were already reported item by item; report again only if that missed something
+        if not (isinstance(value, list) and self.fields.get(self._key) == value):
+            self.fields[self._key] = value
+            updates.append((self._key, value))
+        self._reset_field()
+
+    def _reset_field(self):
+        self._key = None
+        self._expect_key = True
+        self._value_start = None
+        self._item_start = None
@@ -0,0 +1,189 @@
+import json
+import re
+from typing import Dict, List, Optional
+
+# Response schemas in the subset of OpenAPI that Gemini's structured output
+# accepts. They are sent with each request and used to validate the reply.
+_STRING = {"type": "STRING"}
+_STRINGS = {"type": "ARRAY", "items": _STRING}
+_FLASHCARDS = {
+    "type": "ARRAY",
+    "items": {"type": "OBJECT", "properties": {"q": _STRING, "a": _STRING}, "required": ["q", "a"]},
+}
+
+ROUTE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "action": {"type": "STRING", "enum": ["keep", "move", "create"]},
+        "subject": _STRING,
+        "reason": _STRING,
+    },
+    "required": ["action", "subject", "reason"],
+}
+
+CONTENT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"summary": _STRING, "keyPoints": _STRINGS, "flashcards": _FLASHCARDS},
+    "required": ["summary", "keyPoints", "flashcards"],
+}
+
+SECTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"summary": _STRING, "keyPoints": _STRINGS},
+    "required": ["summary", "keyPoints"],
+}
+
+FLASHCARDS_SCHEMA = _FLASHCARDS
+
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_DANGLING_KEY_RE = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+def _scan(text: str, start: int):
+    """
+    Walks a JSON value starting at `start`. Returns (end index or None if it
+    never closes, stack of still-open brackets, whether it ends inside a string).
+    """
+    stack = []
+    in_string = escape = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if stack and stack[-1] == c:
+                stack.pop()
+            if not stack:
+                return i + 1, [], False
+    return None, stack, in_string
+
+
+def _repair_truncated(fragment: str, stack: List[str], in_string: bool) -> str:
+    """Closes a reply that was cut off mid-value, dropping a dangling key or comma."""
+    if in_string:
+        fragment += '"'
+    fragment = fragment.rstrip()
+    if stack and stack[-1] == "}":
+        # A key with no value yet can't be completed sensibly; drop it
+        fragment = _DANGLING_KEY_RE.sub(r"\1", fragment)
+    fragment = fragment.rstrip().rstrip(",:")
+    return fragment + "".join(reversed(stack))
+
+
+def extract_json(text: str, expect: str = "{"):
+    """
+    Finds and parses the first JSON object (or array, with expect="[") in a
+    model reply. Tolerates surrounding prose or markdown fences, trailing
+    commas, raw control characters inside strings and replies truncated
+    mid-value. A bracket that doesn't start valid JSON (e.g. "{curly}" in
+    the prose) is skipped for the next one. Raises StructuredOutputError if
+    nothing usable is found.
+    """
+    start = text.find(expect)
+    if start < 0:
+        raise StructuredOutputError(f"No JSON {'object' if expect == '{' else 'array'} in reply")
+    while start >= 0:
+        end, stack, in_string = _scan(text, start)
+        fragment = text[start:end] if end is not None else _repair_truncated(text[start:], stack, in_string)
+        for candidate in (fragment, _TRAILING_COMMA_RE.sub(r"\1", fragment)):
+            try:
+                return json.loads(candidate, strict=False)
+            except ValueError:
+                continue
+        start = text.find(expect, start + 1)
+    raise StructuredOutputError("Reply is not valid JSON")
+
+
+def _matches(value, schema: Dict) -> bool:
+    kind = schema.get("type")
+    if kind == "STRING":
+        return isinstance(value, str) and (not schema.get("enum") or value in schema["enum"])
+    if kind == "ARRAY":
+        return isinstance(value, list)
+    if kind == "OBJECT":
+        return isinstance(value, dict)
+    return True
+
+
+def conform(value, schema: Dict):
+    """
+    Light clean-up of a parsed reply against `schema`: a lone item where a
+    list is expected becomes a one-item list, and list items of the wrong
+    shape (e.g. flashcards without a question or answer) are dropped.
+    """
+    kind = schema.get("type")
+    if kind == "ARRAY":
+        item_schema = schema.get("items", {})
+        if not isinstance(value, list) and _matches(value, item_schema):
+            value = [value]
+        if isinstance(value, list):
+            return [conform(item, item_schema) for item in value if _valid_item(item, item_schema)]
+    elif kind == "OBJECT" and isinstance(value, dict):
+        for name, field in schema.get("properties", {}).items():
+            if name in value:
+                value[name] = conform(value[name], field)
+    return value
+
+
+def _valid_item(item, schema: Dict) -> bool:
+    if not _matches(item, schema):
+        return False
+    return all(item.get(r) for r in schema.get("required", [])) if isinstance(item, dict) else True
+
+
+def missing_fields(value, schema: Dict) -> List[str]:
+    """Required top-level fields that are absent, empty or of the wrong type."""
+    if not isinstance(value, dict):
+        return list(schema.get("required", []))
+    missing = []
+    for name in schema.get("required", []):
+        field = value.get(name)
+        if field in (None, "", []) or not _matches(field, schema["properties"][name]):
+            missing.append(name)
+    return missing
+
+
+def subschema(schema: Dict, fields: List[str]) -> Dict:
+    """The part of an object schema covering only `fields` (for re-asking)."""
+    return {
+        "type": "OBJECT",
+        "properties": {f: schema["properties"][f] for f in fields},
+        "required": list(fields),
+    }
+
+
+def describe(schema: Dict, fields: Optional[List[str]] = None) -> str:
+    """Short human-readable shape of (part of) a schema, for prompts."""
+    names = fields or list(schema.get("properties", {}))
+    shapes = {"STRING": "string", "ARRAY": "list", "OBJECT": "object"}
+    return ", ".join(f'"{n}" ({shapes.get(schema["properties"][n].get("type"), "value")})' for n in names)
+
+
+def to_json_schema(schema: Dict) -> Dict:
+    """The same schema in standard JSON Schema spelling (lower-case types), for OpenAI-style APIs."""
+    converted = {}
+    for key, value in schema.items():
+        if key == "type":
+            converted[key] = value.lower()
+        elif key == "properties":
+            converted[key] = {name: to_json_schema(field) for name, field in value.items()}
+        elif key == "items":
+            converted[key] = to_json_schema(value)
+        else:
+            converted[key] = value
+    if converted.get("type") == "object":
+        converted.setdefault("additionalProperties", False)
+    return converted
@@ -0,0 +1,248 @@
+"""
+Headless FlowNotes: clipboard capture, the LLM pipeline and note storage
+with no windows, overlays or tray icon.
+
+    python -m app --headless                      # watch the clipboard, save notes
+    python -m app --headless --subject Biology    # file notes as if Biology were open
+    python -m app --headless --drain              # process the journal's backlog, then exit
+
+Runs on a QGuiApplication (a QCoreApplication with --drain, which doesn't
+touch the clipboard) and never loads QtWidgets. Routing suggestions are
+accepted as is, since nobody is there to confirm them. Logs are JSON lines
+on stdout (or --log-file); anything else the app prints is logged as a
+"print" event.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, Signal
+
+from app.ai.bridge import LLMBridge
+from app.ai.cache import ResponseCache
+from app.ai.classifier import SubjectClassifier
+from app.ai.journal import IngestionJournal
+from app.ai.llm_service import LLMService
+from app.ai.providers import create_provider
+from app.ai.scheduler import IngestionScheduler
+from app.notes.storage import NoteStorage
+from app.utils.dedupe import NearDuplicateIndex, signature_from_hex
+
+try:
+    import resource  # Peak memory in the stats event; not on Windows
+except ImportError:
+    resource = None
+
+
+def read_config(path: str) -> Dict:
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading config: {e}")
+    return {}
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class JsonLog:
+    """One JSON object per line: {"ts": ..., "event": ..., **fields}. Safe to call from any thread."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, **fields):
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event, **fields}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class PrintCapture:
+    """Stands in for sys.stdout so stray print() output becomes "print" log events."""
+
+    def __init__(self, log: JsonLog):
+        self.log = log
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._buffer += text
+            *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                self.log("print", message=line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class HeadlessApp(QObject):
+    note_committed = Signal(int, str)  # request id, note id; emitted from the note writer thread
+
+    def __init__(self, args, log: JsonLog):
+        super().__init__()
+        started = time.perf_counter()
+        self.args = args
+        self.log = log
+        self.saved = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.depth = 0
+
+        config = read_config(args.config)
+        provider = create_provider(config)
+        self.storage = NoteStorage(args.notes_dir, write_behind=True)
+        self.response_cache = ResponseCache()
+        self.classifier = SubjectClassifier()
+        self.llm_service = LLMService(cache=self.response_cache, classifier=self.classifier, provider=provider)
+        if config.get("api_key"):
+            self.llm_service.set_api_key(config["api_key"])
+        self.llm_bridge = LLMBridge(self.llm_service)
+        self.journal = IngestionJournal(legacy_path=os.path.join(self.storage.base_dir, "ingest_journal.jsonl"))
+        self.scheduler = IngestionScheduler(self.llm_bridge, self.ingestion_context, journal=self.journal)
+        self.dedupe = NearDuplicateIndex()
+
+        self.scheduler.result_ready.connect(self.on_result)
+        self.scheduler.request_dropped.connect(lambda request_id: self.log("dropped", request=request_id))
+        self.scheduler.queue_changed.connect(self.on_queue_changed)
+        self.scheduler.clip_discarded.connect(self.dedupe.forget_text)
+        self.note_committed.connect(self.scheduler.complete)
+        self.llm_bridge.api_state_changed.connect(lambda state, detail: self.log("api_state", state=state,
+                                                                                 detail=detail))
+
+        self.clipboard_monitor = None
+        if not args.drain:
+            # Imported here so --drain never needs QtGui
+            from app.utils.clipboard_monitor import ClipboardMonitor
+
+            self.clipboard_monitor = ClipboardMonitor()
+            self.clipboard_monitor.text_copied.connect(self.on_text_copied)
+            self.clipboard_monitor.code_copied.connect(lambda text: self.on_text_copied(text, "code"))
+
+        threading.Thread(target=self.classifier.fit, args=(self.storage,), name="SubjectClassifier",
+                         daemon=True).start()
+        threading.Thread(target=self.dedupe.load_notes, args=(self.storage,), name="NearDuplicateIndex",
+                         daemon=True).start()
+
+        self.log("started", mode="drain" if args.drain else "watch", provider=type(provider).__name__,
+                 model=self.llm_service.model_name, configured=self.llm_service.configured,
+                 notes_dir=self.storage.base_dir, backlog=len(self.journal.pending()), pid=os.getpid(),
+                 startup_ms=round((time.perf_counter() - started) * 1000, 1), peak_rss_mb=peak_rss_mb())
+        if not self.llm_service.configured:
+            self.log("not_configured", message="No API key set; clips are journaled until one is")
+        self.scheduler.resume()
+        # Nothing to drain, or no way to drain it
+        if args.drain and (not self.scheduler.depth or not self.llm_service.configured):
+            QTimer.singleShot(0, QCoreApplication.quit)
+
+    def ingestion_context(self):
+        return self.args.subject, self.storage.get_subjects()
+
+    def on_text_copied(self, text: str, kind: str = "text"):
+        match = self.dedupe.check_clip(text)
+        if match is not None:
+            score, entry = match
+            self.duplicates += 1
+            self.log("duplicate", length=len(text), similarity=round(score, 3), of=entry["kind"],
+                     note=entry.get("id"), subject=entry.get("subject"))
+            return
+        self.log("clip", length=len(text), kind=kind)
+        self.scheduler.submit(text, kind)
+
+    def on_queue_changed(self, depth: int):
+        if depth != self.depth:
+            self.depth = depth
+            self.log("queue", depth=depth)
+        if self.args.drain and not depth:
+            QCoreApplication.quit()
+
+    def on_result(self, request_id: int, result: Dict):
+        if result.get("action") == "error":
+            self.failed += 1
+            self.dedupe.forget_clip(signature_from_hex(result.get("source_minhash", "")))
+            self.log("failed", request=request_id, error=result.get("summary", ""))
+            return
+        note_id = self.storage.save_note(result, lambda committed: self.note_committed.emit(request_id, committed))
+        self.classifier.add_note(result)
+        self.dedupe.add_note(result)
+        self.saved += 1
+        self.log("note_saved", request=request_id, id=note_id, subject=result.get("subject"),
+                 action=result.get("action"), title=result.get("summary", "")[:80])
+
+    def close(self):
+        if self.clipboard_monitor is not None:
+            self.clipboard_monitor.set_enabled(False)
+        self.llm_bridge.close()
+        self.storage.close()
+        # Deliver the final batch's note_committed before the journal closes
+        QCoreApplication.processEvents()
+        self.response_cache.close()
+        self.journal.close()
+        self.log("stopped", saved=self.saved, failed=self.failed, duplicates=self.duplicates,
+                 left_in_journal=len(self.journal.pending()), retries=self.scheduler.retried,
+                 cache_hits=self.response_cache.hits, peak_rss_mb=peak_rss_mb())
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app --headless",
+                                     description="Turn copied text into notes, with no user interface.")
+    parser.add_argument("--config", default="config.json", help="api_key and provider settings, as for the app")
+    parser.add_argument("--notes-dir", default="notes_data")
+    parser.add_argument("--subject", help="subject treated as open when routing clips")
+    parser.add_argument("--drain", action="store_true", help="process clips left in the journal, then exit")
+    parser.add_argument("--log-file", help="append JSON logs here instead of stdout")
+    args, qt_args = parser.parse_known_args(argv)
+
+    log_stream = open(args.log_file, "a", encoding="utf-8") if args.log_file else sys.stdout
+    log = JsonLog(log_stream)
+    sys.stdout = PrintCapture(log)
+
+    # Remaining arguments (e.g. -platform) are Qt's
+    if args.drain:
+        qt_app = QCoreApplication([sys.argv[0]] + qt_args)
+    else:
+        from PySide6.QtGui import QGuiApplication
+
+        qt_app = QGuiApplication([sys.argv[0]] + qt_args)
+        qt_app.setQuitOnLastWindowClosed(False)
+
+    try:
+        app = HeadlessApp(args, log)
+    except ValueError as e:
+        log("error", message=f"Error in config: {e}")
+        sys.exit(2)
+
+    # Qt's loop doesn't return to Python on its own; a timer lets SIGINT/SIGTERM handlers run
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: qt_app.quit())
+    wake = QTimer()
+    wake.timeout.connect(lambda: None)
+    wake.start(250)
+
+    try:
+        code = qt_app.exec()
+    finally:
+        app.close()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
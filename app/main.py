@@ -1,53 +1,73 @@
 import sys
 import os
 import json
+import threading
 from PySide6.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QInputDialog
 from PySide6.QtGui import QIcon, QAction
-from PySide6.QtCore import QObject, Signal, QThread
+from PySide6.QtCore import QCoreApplication, QObject, Signal
 
 from app.ui.main_window import MainWindow
 from app.ui.overlay import OverlayWindow, PersistentOverlayBar, DecisionOverlay
+from app.ai.bridge import LLMBridge
+from app.ai.cache import ResponseCache
+from app.ai.classifier import SubjectClassifier
+from app.ai.journal import IngestionJournal
 from app.ai.llm_service import LLMService
+from app.ai.providers import create_provider
+from app.ai.scheduler import IngestionScheduler
 from app.notes.storage import NoteStorage
 from app.utils.clipboard_monitor import ClipboardMonitor
-
-class AIWorker(QThread):
-    finished = Signal(dict)
-    
-    def __init__(self, llm_service, text, current_subject=None, existing_subjects=None):
-        super().__init__()
-        self.llm_service = llm_service
-        self.text = text
-        self.current_subject = current_subject
-        self.existing_subjects = existing_subjects
-
-    def run(self):
-        result = self.llm_service.process_text(
-            self.text, 
-            self.current_subject, 
-            self.existing_subjects
-        )
-        self.finished.emit(result)
+from app.utils.dedupe import NearDuplicateIndex, signature_from_hex
 
 class SmartStudyApp(QObject):
+    # Emitted from the note writer thread; Qt delivers it on the GUI thread
+    note_committed = Signal(int, str)  # request id, note id
+
     def __init__(self):
         super().__init__()
         self.app = QApplication(sys.argv)
         self.app.setQuitOnLastWindowClosed(False)
 
         # Services
-        self.storage = NoteStorage()
-        self.llm_service = LLMService()
+        # Notes are persisted by a background writer; flushed on quit below
+        self.storage = NoteStorage(write_behind=True)
+        # Repeated copies are answered from the response cache, with no API call
+        self.response_cache = ResponseCache()
+        # Learns subjects from stored notes so clear cases skip the routing call
+        self.classifier = SubjectClassifier()
+        config = self.read_config()
+        try:
+            provider = create_provider(config)
+        except ValueError as e:
+            print(f"Error in config: {e}; using Gemini")
+            provider = create_provider({})
+        self.llm_service = LLMService(cache=self.response_cache, classifier=self.classifier, provider=provider)
+        # All LLM requests run on one background event loop, a few at a time
+        self.llm_bridge = LLMBridge(self.llm_service)
         self.clipboard_monitor = ClipboardMonitor()
+        # Recognizes copies of text already queued or already in the notes, with no API call
+        self.dedupe = NearDuplicateIndex()
 
         # Load API Key
-        self.load_config()
+        if config.get("api_key"):
+            self.llm_service.set_api_key(config["api_key"])
 
         # UI - Create persistent bar first
         self.persistent_bar = PersistentOverlayBar()
-        self.main_window = MainWindow(self.storage, self.llm_service, self.persistent_bar)
+        self.main_window = MainWindow(self.storage, self.llm_service, self.persistent_bar, self.llm_bridge)
         self.overlay = OverlayWindow()
         self.decision_overlay = DecisionOverlay()
+        # Copies are journaled to disk first, so none is lost to a quit, a crash or an outage
+        self.journal = IngestionJournal(legacy_path=os.path.join(self.storage.base_dir, "ingest_journal.jsonl"))
+        # Debounces and coalesces copies before they reach the LLM
+        self.scheduler = IngestionScheduler(self.llm_bridge, self.ingestion_context, journal=self.journal)
+        self._processing = False
+        # Suggestions awaiting the user's answer, keyed by request id
+        self.decisions = {}
+        self.decision_queue = []
+        self.active_decision = None
+        # Subject the overlay's last message was about; clicking it opens that subject
+        self.overlay_subject = None
         
         # Set window icon
         icon_path = "app/resources/icon.png"
@@ -70,30 +90,60 @@ class SmartStudyApp(QObject):
 
         # Connections
         self.clipboard_monitor.text_copied.connect(self.on_text_copied)
-        self.overlay.clicked.connect(self.main_window.show)
+        self.clipboard_monitor.code_copied.connect(self.on_code_copied)
+        self.scheduler.result_ready.connect(self.on_ai_finished)
+        self.scheduler.partial_ready.connect(self.on_ai_partial)
+        self.scheduler.request_dropped.connect(self.on_request_dropped)
+        # A clip given up without a note (paused, superseded) may be copied again
+        self.scheduler.clip_discarded.connect(self.dedupe.forget_text)
+        self.scheduler.queue_changed.connect(self.on_queue_changed)
+        self.llm_bridge.api_state_changed.connect(self.persistent_bar.set_api_state)
+        self.main_window.monitoring_switch.toggled.connect(self.on_monitoring_toggled)
+        self.main_window.notes_cleared.connect(self.classifier.clear)
+        self.main_window.notes_cleared.connect(self.dedupe.clear_notes)
+        self.main_window.api_key_changed.connect(self.scheduler.resume)
+        # Clips leave the journal only once their note is on disk
+        self.note_committed.connect(self.scheduler.complete)
+        self.overlay.clicked.connect(self.on_overlay_clicked)
         self.persistent_bar.show_main_window.connect(self.main_window.show)
         self.decision_overlay.decision_made.connect(self.on_decision_made)
+        self.app.aboutToQuit.connect(self.close_storage)
+        self.app.aboutToQuit.connect(self.llm_bridge.close)
+        self.app.aboutToQuit.connect(self.response_cache.close)
+        self.app.aboutToQuit.connect(self.journal.close)
+        # The monitor polls by itself where change notifications aren't reliable, and not while paused
+        self.main_window.monitoring_switch.toggled.connect(self.clipboard_monitor.set_enabled)
+        self.clipboard_monitor.set_enabled(self.main_window.monitoring_switch.isChecked())
         
-        # Add polling timer for clipboard (more reliable on macOS)
-        from PySide6.QtCore import QTimer
-        self.clipboard_timer = QTimer()
-        self.clipboard_timer.timeout.connect(self.clipboard_monitor.manual_check)
-        self.clipboard_timer.start(500)  # Check every 500ms
-        
-        print("Clipboard monitoring started with polling...")
+        print("Clipboard monitoring started...")
 
-    def load_config(self):
+        # Train the subject classifier off the UI thread; until then the AI routes everything
+        threading.Thread(target=self.classifier.fit, args=(self.storage,), name="SubjectClassifier",
+                         daemon=True).start()
+        threading.Thread(target=self.dedupe.load_notes, args=(self.storage,), name="NearDuplicateIndex",
+                         daemon=True).start()
+        # Clips an earlier run didn't finish, once monitoring is on
+        self.scheduler.set_paused(not self.main_window.monitoring_switch.isChecked())
+
+    def close_storage(self):
+        self.storage.close()
+        # Deliver the final batch's note_committed before the journal closes
+        QCoreApplication.processEvents()
+
+    def read_config(self):
+        """config.json: api_key, plus optional provider/model/routing_model/base_url/mock (see app.ai.providers)"""
         if os.path.exists("config.json"):
             try:
                 with open("config.json", "r") as f:
-                    config = json.load(f)
-                    api_key = config.get("api_key")
-                    if api_key:
-                        self.llm_service.set_api_key(api_key)
+                    return json.load(f)
             except Exception as e:
                 print(f"Error loading config: {e}")
+        return {}
+
+    def on_code_copied(self, text):
+        self.on_text_copied(text, kind="code")
 
-    def on_text_copied(self, text):
+    def on_text_copied(self, text, kind="text"):
         print(f"Text copied event received! Length: {len(text)}")  # Debug output
         
         # Check if monitoring is enabled via switch
@@ -101,83 +151,160 @@ class SmartStudyApp(QObject):
             print("Monitoring is paused. Skipping.")
             return
         
-        # Only process if we have an API key
-        if not self.llm_service.api_key:
-            print("No API key set. Skipping.")
-            self.persistent_bar.set_status("No API Key")
+        if self.is_duplicate(text):
             return
 
-        print("Starting AI processing...")  # Debug output
-        
-        # Update persistent bar status
-        self.persistent_bar.set_processing()
-        
-        # Show loading animation in main window
-        self.main_window.show_loading()
-        
-        # Show processing overlay notification
-        self.overlay.show_message("Processing...", "Analyzing copied text...")
-        
-        # Run AI in background
-        current_subject = self.main_window.current_subject
-        existing_subjects = self.storage.get_subjects()
-        
-        self.worker = AIWorker(self.llm_service, text, current_subject, existing_subjects)
-        self.worker.finished.connect(self.on_ai_finished)
-        self.worker.start()
+        # Without a usable AI backend (for Gemini: an API key) clips wait in the journal until there is one
+        if not self.llm_service.configured:
+            print("No API key set. Queued for later.")
+
+        # Queue for AI processing; rapid or overlapping copies are merged first
+        self.scheduler.submit(text, kind)
+
+    def is_duplicate(self, text):
+        """True if `text` is a near-duplicate of a stored note's source or of a clip copied moments ago"""
+        match = self.dedupe.check_clip(text)
+        if match is None:
+            return False
+        score, entry = match
+        if entry["kind"] == "note":
+            print(f"Near-duplicate of note {entry['id']} ({score:.0%}). Skipping.")
+            self.overlay_subject = entry["subject"]
+            self.overlay.show_message(f"Already in {entry['subject']}", entry["summary"][:100] + "...")
+        else:
+            print(f"Near-duplicate of a recent copy ({score:.0%}). Skipping.")
+        return True
+
+    def on_overlay_clicked(self):
+        if self.overlay_subject:
+            self.main_window.show_subject(self.overlay_subject)
+        else:
+            self.main_window.show()
+
+    def ingestion_context(self):
+        """Subject context for a clip, read when it is actually sent to the AI"""
+        return self.main_window.current_subject, self.storage.get_subjects()
+
+    def on_queue_changed(self, depth):
+        if not self.llm_service.configured:
+            self.persistent_bar.set_status(f"No API Key · {depth} queued" if depth else "No API Key")
+            return
+        self.persistent_bar.set_queue_depth(depth)
+        if depth and not self._processing:
+            print("Starting AI processing...")  # Debug output
+            self._processing = True
+            # Show loading animation and processing notification once per burst
+            self.main_window.show_loading()
+            self.overlay.show_message("Processing...", "Analyzing copied text...")
+        elif not depth and self._processing:
+            self._processing = False
+            self.main_window.hide_loading()
+
+    def on_monitoring_toggled(self, enabled):
+        # Pausing stops AI requests; clips already copied stay journaled and resume with monitoring
+        self.scheduler.set_paused(not enabled)
+
+    def needs_decision(self, action):
+        """Move/create suggestions are confirmed by the user when a subject is open"""
+        return action in ("move", "create") and bool(self.main_window.current_subject)
 
-    def on_ai_finished(self, result):
-        # Hide loading animation
+    def on_ai_partial(self, request_id, partial):
+        # Show the note while it is being written instead of the loading animation
         self.main_window.hide_loading()
-        
-        # Update persistent bar status
-        self.persistent_bar.set_ready()
-        
+        self.main_window.show_partial_note(request_id, partial)
+
+        pending = self.decisions.get(request_id)
+        if pending is None:
+            # The quick routing call delivers action, subject and reason first,
+            # so the user can decide while the note itself is still being written
+            if {"action", "subject", "reason"} <= partial.keys() and self.needs_decision(partial["action"]):
+                self.request_decision(request_id, partial)
+        else:
+            pending["note"] = partial
+            if self.active_decision == request_id:
+                self.decision_overlay.set_preview(partial)
+
+    def on_ai_finished(self, request_id, result):
+        self.main_window.remove_partial_note(request_id)
+        pending = self.decisions.get(request_id)
+
         if result.get("subject") == "Error":
+            # Let the same text be tried again straight away
+            self.dedupe.forget_clip(signature_from_hex(result.get("source_minhash", "")))
+            self.overlay_subject = None
             self.overlay.show_message("Error", "Failed to process text.")
-            self.persistent_bar.set_ready()
+            self.discard_decision(request_id)
             return
 
-        action = result.get("action", "keep")
-        subject = result.get("subject", "Other")
-        reason = result.get("reason", "")
-        
-        # Store result temporarily for decision
-        self.pending_result = result
-        
-        if action == "keep" or not self.main_window.current_subject:
+        if pending is not None:
+            pending["result"] = result
+            pending["note"] = result
+            if pending["decision"] is not None:
+                self.apply_decision(request_id)
+            elif self.active_decision == request_id:
+                self.decision_overlay.set_preview(result)
+        elif self.needs_decision(result.get("action")):
+            self.request_decision(request_id, result, result)
+        else:
             # Auto-save if it matches current or no subject selected
-            self.save_and_notify(result)
-        elif action == "move":
-            # Hide processing overlay first
-            self.overlay.hide()
+            self.save_and_notify(result, request_id)
+
+    def on_request_dropped(self, request_id):
+        """A newer copy replaced this one before it finished"""
+        self.main_window.remove_partial_note(request_id)
+        self.discard_decision(request_id)
+
+    def request_decision(self, request_id, note, result=None):
+        # One prompt at a time; later suggestions wait their turn
+        self.decisions[request_id] = {"note": note, "result": result, "decision": None, "subject": None}
+        self.decision_queue.append(request_id)
+        if self.active_decision is None:
+            self.show_next_decision()
+
+    def show_next_decision(self):
+        self.active_decision = None
+        while self.decision_queue:
+            request_id = self.decision_queue.pop(0)
+            if request_id in self.decisions:
+                self.active_decision = request_id
+                self.show_decision_for(self.decisions[request_id]["note"])
+                return
+
+    def show_decision_for(self, note):
+        action = note.get("action", "keep")
+        subject = note.get("subject", "Other")
+        reason = note.get("reason", "")
+
+        # Hide processing overlay first
+        self.overlay.hide()
+        if action == "move":
             # Prompt to move
             self.decision_overlay.show_decision(
                 f"Move to '{subject}'?",
                 f"Text doesn't fit '{self.main_window.current_subject}'. {reason}"
             )
-        elif action == "create":
-            # Hide processing overlay first
-            self.overlay.hide()
+        else:
             # Prompt to create
             self.decision_overlay.show_decision(
                 f"Create '{subject}'?",
                 f"New topic detected. {reason}"
             )
-        else:
-            # Fallback
-            self.save_and_notify(result)
+        self.decision_overlay.set_preview(note)
+
+    def discard_decision(self, request_id):
+        if self.decisions.pop(request_id, None) is None:
+            return
+        if self.active_decision == request_id:
+            self.decision_overlay.hide_overlay()
+            self.show_next_decision()
 
     def on_decision_made(self, decision):
-        if not hasattr(self, 'pending_result'):
+        request_id = self.active_decision
+        pending = self.decisions.get(request_id)
+        if pending is None:
             return
-            
-        result = self.pending_result
-        
-        if decision == "yes":
-            # User accepted the suggestion (move or create)
-            self.save_and_notify(result)
-        elif decision == "create":
+
+        if decision == "create":
             # User wants to create a completely new subject manually
             # Ensure the decision overlay is hidden immediately so it doesn't
             # interfere with the input dialog. Also pass the main window as
@@ -187,36 +314,40 @@ class SmartStudyApp(QObject):
             except Exception:
                 pass
             text, ok = QInputDialog.getText(self.main_window, "Create New Subject", "Enter subject name:")
-            if ok and text:
-                result['subject'] = text
-                self.save_and_notify(result)
-            else:
+            if not (ok and text):
                 # Cancelled, re-show the decision overlay
-                action = result.get("action", "keep")
-                subject = result.get("subject", "Other")
-                reason = result.get("reason", "")
-                
-                if action == "move":
-                    self.decision_overlay.show_decision(
-                        f"Move to '{subject}'?",
-                        f"Text doesn't fit '{self.main_window.current_subject}'. {reason}"
-                    )
-                elif action == "create":
-                    self.decision_overlay.show_decision(
-                        f"Create '{subject}'?",
-                        f"New topic detected. {reason}"
-                    )
+                self.show_decision_for(pending["note"])
                 return # Do not save yet
+            pending["subject"] = text
+        elif decision == "no":
+            # User rejected, keep in current subject
+            pending["subject"] = self.main_window.current_subject
+        pending["decision"] = decision
+
+        if pending["result"] is None:
+            # Decided before generation finished; saved in on_ai_finished
+            self.overlay.show_message("Got it", "Your note will be saved as soon as it's ready.")
         else:
-            # User rejected (decision == "no"), keep in current subject
-            if self.main_window.current_subject:
-                result['subject'] = self.main_window.current_subject
-            self.save_and_notify(result)
+            self.apply_decision(request_id)
+        self.show_next_decision()
+
+    def apply_decision(self, request_id):
+        pending = self.decisions.pop(request_id)
+        result = pending["result"]
+        # "yes" accepts the suggested subject (move or create) as is
+        if pending["decision"] in ("create", "no") and pending["subject"]:
+            result['subject'] = pending["subject"]
+        self.save_and_notify(result, request_id)
 
-    def save_and_notify(self, result):
+    def save_and_notify(self, result, request_id=None):
         # Save note
         subject = result.get("subject", "Other")
-        self.storage.save_note(result)
+        on_commit = None
+        if request_id is not None:
+            on_commit = lambda note_id: self.note_committed.emit(request_id, note_id)
+        self.storage.save_note(result, on_commit)
+        self.classifier.add_note(result)
+        self.dedupe.add_note(result)
         
         # Update Main Window - refresh subjects list
         self.main_window.refresh_subjects()
@@ -226,10 +357,11 @@ class SmartStudyApp(QObject):
         
         # Show Overlay
         summary_preview = result.get("summary", "")[:100] + "..."
+        self.overlay_subject = subject
         self.overlay.show_message("Summary Ready", summary_preview)
         
-        # Reset persistent bar
-        self.persistent_bar.set_ready()
+        # Reset persistent bar (other clips may still be in progress)
+        self.persistent_bar.set_queue_depth(self.scheduler.depth)
 
     def run(self):
         self.main_window.show()
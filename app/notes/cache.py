@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+# Rough per-note overhead (dict, lists, small fields) on top of its text
+_NOTE_OVERHEAD = 400
+
+
+def estimate_size(notes: List[Dict]) -> int:
+    """Approximate memory held by parsed notes, in bytes."""
+    size = 0
+    for note in notes:
+        size += _NOTE_OVERHEAD + len(note.get("summary") or "")
+        size += sum(len(str(p)) for p in note.get("keyPoints") or [])
+        for card in note.get("flashcards") or []:
+            if isinstance(card, dict):
+                size += len(card.get("q") or "") + len(card.get("a") or "")
+    return size
+
+
+class NoteCache:
+    """
+    LRU cache of parsed note pages, bounded by approximate memory size.
+
+    Each entry remembers the engine's change token for its subject (file
+    and directory mtimes, database data_version, ...) at the time it was
+    loaded; a lookup with a different token is a miss, so edits made outside
+    this process still show up.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (subject, token, notes, size)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, token) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != token:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, subject: str, token, notes: List[Dict]):
+        size = estimate_size(notes)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (subject, token, notes, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, subject: Optional[str] = None):
+        """Drops cached pages for one subject, or everything."""
+        with self._lock:
+            if subject is None:
+                self._entries.clear()
+                self.size = 0
+                return
+            for key in [k for k, e in self._entries.items() if e[0] == subject]:
+                self._drop(key)
+
+    def _drop(self, key: Hashable):
+        self.size -= self._entries.pop(key)[3]
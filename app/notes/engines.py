@@ -0,0 +1,835 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from app.notes.ids import encode_ulid, new_note_id
+from app.notes.search import InvertedIndex, find_hits, note_search_fields, query_terms
+
+# Note fields that live in their own columns/tables in the SQLite engine.
+# Anything else the LLM returns is kept in the notes.extra JSON column.
+CORE_FIELDS = ("id", "subject", "timestamp", "action", "reason", "summary", "keyPoints", "flashcards")
+
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+    timestamp TEXT NOT NULL,
+    action TEXT,
+    reason TEXT,
+    summary TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notes_subject_timestamp ON notes(subject_id, timestamp, id);
+CREATE TABLE IF NOT EXISTS key_points (
+    note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (note_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS flashcards (
+    note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    question TEXT,
+    answer TEXT,
+    PRIMARY KEY (note_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Version 2: full-text index over summary, key points and flashcards.
+# Rows share their rowid with notes.id.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    summary, key_points, flashcards,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Columns every note query selects; notes.uid is the public (ULID) note id
+NOTE_SELECT = (
+    "SELECT n.id, n.uid, s.name AS subject, n.timestamp, n.action, n.reason, n.summary, n.extra "
+    "FROM notes n JOIN subjects s ON s.id = n.subject_id"
+)
+
+
+class StorageEngine:
+    """Interface every NoteStorage backend implements."""
+
+    def save_note(self, note_data: Dict) -> str:
+        """Saves a note under its "id", replacing any stored note with that id; returns the id."""
+        raise NotImplementedError
+
+    def save_notes(self, notes: List[Dict]) -> List[str]:
+        """Saves a batch of notes; engines override this to commit them together."""
+        return [self.save_note(note) for note in notes]
+
+    def get_subjects(self) -> List[str]:
+        raise NotImplementedError
+
+    def get_notes_for_subject(self, subject: str, limit: Optional[int] = None,
+                              after: Optional[str] = None) -> List[Dict]:
+        raise NotImplementedError
+
+    def get_note(self, note_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def get_notes(self, refs: List[Dict]) -> List[Dict]:
+        raise NotImplementedError
+
+    def update_note(self, note_id: str, patch: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def clear_all_notes(self):
+        raise NotImplementedError
+
+    def search(self, query: str, subject: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        raise NotImplementedError
+
+    def count_notes(self) -> int:
+        return sum(len(self.get_notes_for_subject(s)) for s in self.get_subjects())
+
+    def iter_flashcards(self, subjects: Optional[List[str]] = None) -> Iterator[Dict]:
+        """
+        Yields every flashcard as {"note_id", "position", "subject", "q", "a"},
+        subject by subject, reading notes a page at a time.
+        """
+        for subject in subjects if subjects is not None else self.get_subjects():
+            after = None
+            while True:
+                notes = self.get_notes_for_subject(subject, limit=200, after=after)
+                for note in notes:
+                    for position, card in enumerate(note.get("flashcards") or []):
+                        if isinstance(card, dict):
+                            yield {"note_id": note["id"], "position": position, "subject": subject,
+                                   "q": card.get("q"), "a": card.get("a")}
+                if len(notes) < 200:
+                    break
+                after = notes[-1]["id"]
+
+    def change_token(self, subject: str):
+        """
+        A cheap value that changes whenever the subject's notes may have
+        changed on disk, including by other processes. None disables caching.
+        """
+        return None
+
+    def watch_paths(self, subject: Optional[str] = None) -> List[str]:
+        """Files/directories whose changes signal that notes changed on disk."""
+        return []
+
+    def release_thread(self):
+        """Frees resources held for the calling thread; for worker threads that are about to finish."""
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonEngine(StorageEngine):
+    """One pretty-printed JSON file per note, one directory per subject."""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        # subject -> (directory mtime, [(sort key, note id)] oldest first)
+        self._timestamp_index: Dict[str, tuple] = {}
+        # note id -> subject, for direct lookups by id
+        self._locations: Dict[str, str] = {}
+        self._index_lock = threading.Lock()
+        # Built on first search, then kept current by save_note
+        self._search_index: Optional[InvertedIndex] = None
+
+    @staticmethod
+    def _sort_key(note_id: str) -> str:
+        """
+        Notes are named after their ULID id, which sorts by creation time.
+        Files from before ids existed are named note_<%Y-%m-%d_%H-%M-%S>;
+        map those onto the same ordering.
+        """
+        if not note_id.startswith("note_"):
+            return note_id
+        try:
+            saved = datetime.strptime(note_id[len("note_"):], "%Y-%m-%d_%H-%M-%S")
+        except ValueError:
+            return ""
+        return encode_ulid(int(saved.timestamp() * 1000), 0)
+
+    def _read(self, subject: str, note_id: str) -> Optional[Dict]:
+        filepath = os.path.join(self.base_dir, subject, f"{note_id}.json")
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                note = json.load(f)
+        except Exception as e:
+            print(f"Error loading note {filepath}: {e}")
+            return None
+        note["id"] = note_id
+        return note
+
+    def _write_atomic(self, filepath: str, note_data: Dict):
+        """Writes to a temp file in the same directory, then renames over the target."""
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(note_data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+
+    def _index_added(self, subject: str, note_id: str, note_data: Dict):
+        subject_dir = os.path.join(self.base_dir, subject)
+        with self._index_lock:
+            self._locations[note_id] = subject
+            entry = self._timestamp_index.get(subject)
+            if entry is not None:
+                keys = entry[1]
+                key = (self._sort_key(note_id), note_id)
+                i = bisect_left(keys, key)
+                if i == len(keys) or keys[i] != key:
+                    keys.insert(i, key)
+                self._timestamp_index[subject] = (os.stat(subject_dir).st_mtime_ns, keys)
+
+        if self._search_index is not None:
+            self._search_index.add(f"{subject}/{note_id}", subject, note_search_fields(note_data))
+
+    def _index_removed(self, subject: str, note_id: str):
+        with self._index_lock:
+            self._locations.pop(note_id, None)
+            entry = self._timestamp_index.get(subject)
+            if entry is not None:
+                keys = entry[1]
+                key = (self._sort_key(note_id), note_id)
+                i = bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    del keys[i]
+                self._timestamp_index[subject] = (os.stat(os.path.join(self.base_dir, subject)).st_mtime_ns, keys)
+
+        if self._search_index is not None:
+            self._search_index.remove(f"{subject}/{note_id}")
+
+    def _fsync_dir(self, path: str):
+        """Makes renames inside a directory durable (not supported on Windows)."""
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write_new(self, note_data: Dict) -> str:
+        subject = note_data.get("subject", "Uncategorized")
+        subject_dir = os.path.join(self.base_dir, subject)
+
+        if not os.path.exists(subject_dir):
+            os.makedirs(subject_dir)
+
+        note_id = note_data["id"]
+        # Saving under an existing id replaces that note, even if it moved subject
+        old_subject = self._locate(note_id)
+        self._write_atomic(os.path.join(subject_dir, f"{note_id}.json"), note_data)
+        if old_subject is not None and old_subject != subject:
+            os.remove(os.path.join(self.base_dir, old_subject, f"{note_id}.json"))
+            self._index_removed(old_subject, note_id)
+        self._index_added(subject, note_id, note_data)
+        return subject_dir
+
+    def save_note(self, note_data: Dict) -> str:
+        """
+        Saves a note to <subject>/<id>.json (temp file + rename), replacing
+        any note with the same id. Returns the note id.
+        """
+        self._fsync_dir(self._write_new(note_data))
+        return note_data["id"]
+
+    def save_notes(self, notes: List[Dict]) -> List[str]:
+        """Writes each note atomically, then syncs each touched directory once."""
+        for subject_dir in {self._write_new(note) for note in notes}:
+            self._fsync_dir(subject_dir)
+        return [note["id"] for note in notes]
+
+    def get_subjects(self) -> List[str]:
+        """Returns a list of all subjects (directories)."""
+        if not os.path.exists(self.base_dir):
+            return []
+        return [d for d in os.listdir(self.base_dir) if os.path.isdir(os.path.join(self.base_dir, d))]
+
+    def _note_index(self, subject: str) -> List[tuple]:
+        """
+        Returns the subject's (sort key, note id) pairs oldest first. Note
+        ids embed the save time, so the index is built from a directory
+        listing alone and only rebuilt when the directory changes on disk.
+        """
+        subject_dir = os.path.join(self.base_dir, subject)
+        try:
+            mtime = os.stat(subject_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+
+        with self._index_lock:
+            entry = self._timestamp_index.get(subject)
+            if entry is None or entry[0] != mtime:
+                ids = [f[:-len(".json")] for f in os.listdir(subject_dir) if f.endswith(".json")]
+                entry = (mtime, sorted((self._sort_key(i), i) for i in ids))
+                self._timestamp_index[subject] = entry
+                for note_id in ids:
+                    self._locations[note_id] = subject
+            return entry[1]
+
+    def get_notes_for_subject(self, subject: str, limit: Optional[int] = None,
+                              after: Optional[str] = None) -> List[Dict]:
+        """
+        Returns notes for a subject, newest first. Pass `limit` to get a page
+        and `after` (the id of the last note of the previous page) to continue.
+        """
+        keys = self._note_index(subject)
+        end = len(keys)
+        if after is not None:
+            key = (self._sort_key(after), after)
+            end = bisect_left(keys, key)
+            if end == len(keys) or keys[end] != key:
+                return []
+        start = 0 if limit is None else max(0, end - limit)
+
+        notes = []
+        for _, note_id in reversed(keys[start:end]):
+            note = self._read(subject, note_id)
+            if note is not None:
+                notes.append(note)
+        return notes
+
+    def _locate(self, note_id: str) -> Optional[str]:
+        """Returns the subject holding a note, probing one path per subject on a miss."""
+        subject = self._locations.get(note_id)
+        if subject is not None and os.path.exists(os.path.join(self.base_dir, subject, f"{note_id}.json")):
+            return subject
+        for subject in self.get_subjects():
+            if os.path.exists(os.path.join(self.base_dir, subject, f"{note_id}.json")):
+                with self._index_lock:
+                    self._locations[note_id] = subject
+                return subject
+        return None
+
+    def get_note(self, note_id: str) -> Optional[Dict]:
+        """Returns a single note by id, or None."""
+        subject = self._locate(note_id)
+        return self._read(subject, note_id) if subject is not None else None
+
+    def get_notes(self, refs: List[Dict]) -> List[Dict]:
+        """Loads the notes referenced by {"id", "subject"} dicts, in the given order."""
+        notes = []
+        for ref in refs:
+            note = self._read(ref["subject"], ref["id"])
+            if note is not None:
+                notes.append(note)
+        return notes
+
+    def update_note(self, note_id: str, patch: Dict) -> Optional[Dict]:
+        """
+        Merges `patch` into a note and rewrites only that file (atomically).
+        A changed "subject" moves the note. Returns the updated note, or None.
+        """
+        subject = self._locate(note_id)
+        if subject is None:
+            return None
+        note = self._read(subject, note_id)
+        if note is None:
+            return None
+        note.update({k: v for k, v in patch.items() if k != "id"})
+        new_subject = note.get("subject") or subject
+
+        new_dir = os.path.join(self.base_dir, new_subject)
+        if not os.path.exists(new_dir):
+            os.makedirs(new_dir)
+        self._write_atomic(os.path.join(new_dir, f"{note_id}.json"), note)
+
+        if new_subject != subject:
+            os.remove(os.path.join(self.base_dir, subject, f"{note_id}.json"))
+        self._index_removed(subject, note_id)
+        self._index_added(new_subject, note_id, note)
+        return note
+
+    def clear_all_notes(self):
+        """Deletes all notes by removing the entire notes directory."""
+        if os.path.exists(self.base_dir):
+            shutil.rmtree(self.base_dir)
+            os.makedirs(self.base_dir)
+        with self._index_lock:
+            self._timestamp_index.clear()
+            self._locations.clear()
+        self._search_index = None
+
+    def count_notes(self) -> int:
+        """Counts note files from the directory listings, without parsing them."""
+        return sum(len(self._note_index(subject)) for subject in self.get_subjects())
+
+    def change_token(self, subject: str):
+        """
+        The subject directory's mtime, plus the count and newest mtime of its
+        note files: the directory changes when files are added, renamed or
+        removed, the files when one is edited in place.
+        """
+        subject_dir = os.path.join(self.base_dir, subject)
+        try:
+            st = os.stat(subject_dir)
+            count = newest = 0
+            with os.scandir(subject_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        newest = max(newest, entry.stat().st_mtime_ns)
+                    except FileNotFoundError:
+                        continue  # Removed while listing; the directory mtime covers it
+                    count += 1
+        except FileNotFoundError:
+            return "missing"
+        return (st.st_mtime_ns, count, newest)
+
+    def watch_paths(self, subject: Optional[str] = None) -> List[str]:
+        paths = [self.base_dir]
+        if subject is not None and os.path.isdir(os.path.join(self.base_dir, subject)):
+            paths.append(os.path.join(self.base_dir, subject))
+        return paths
+
+    def search(self, query: str, subject: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        Ranked full-text search (BM25) over summaries, key points and
+        flashcards. The in-memory index is built from disk on first use.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        if self._search_index is None:
+            index = InvertedIndex()
+            for name in self.get_subjects():
+                for note in self.get_notes_for_subject(name):
+                    index.add(f"{name}/{note['id']}", name, note_search_fields(note))
+            self._search_index = index
+
+        results = []
+        for key, score in self._search_index.search(terms, subject=subject, limit=limit):
+            note_subject, note_id = key.rsplit("/", 1)
+            note = self._read(note_subject, note_id)
+            if note is None:
+                continue
+            results.append({
+                "id": note_id,
+                "subject": note_subject,
+                "score": score,
+                "hits": find_hits(note_search_fields(note), terms),
+            })
+        return results
+
+
+class SqliteEngine(StorageEngine):
+    """
+    Notes in a single SQLite database (WAL mode) with indexed tables for
+    subjects, notes, key points and flashcards.
+
+    Each thread gets its own connection; WAL lets readers run while a
+    writer commits.
+    """
+
+    DB_FILENAME = "notes.sqlite3"
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.db_path = os.path.join(base_dir, self.DB_FILENAME)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # Read-only connection used just for PRAGMA data_version, which changes
+        # whenever any other connection (or process) commits
+        self._watch_conn: Optional[sqlite3.Connection] = None
+        self._watch_lock = threading.Lock()
+
+        self._migrate()
+        self._import_json_tree()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _migrate(self):
+        """Brings the database schema up to SCHEMA_VERSION."""
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        with conn:
+            if version < 1:
+                conn.executescript(SCHEMA)
+            if version < 2:
+                conn.executescript(SEARCH_SCHEMA)
+                self._backfill_search_index(conn)
+            if version < 3:
+                # Public ULID ids; row ids stay as the compact internal key
+                conn.execute("ALTER TABLE notes ADD COLUMN uid TEXT")
+                for (row_id,) in conn.execute("SELECT id FROM notes ORDER BY id").fetchall():
+                    conn.execute("UPDATE notes SET uid = ? WHERE id = ?", (new_note_id(), row_id))
+                conn.execute("CREATE UNIQUE INDEX idx_notes_uid ON notes(uid)")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _backfill_search_index(self, conn: sqlite3.Connection):
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, summary FROM notes WHERE id > ? ORDER BY id LIMIT 500", (last_id,)
+            ).fetchall()
+            if not rows:
+                return
+            notes = {row["id"]: {"summary": row["summary"], "keyPoints": [], "flashcards": []} for row in rows}
+            self._attach_children(conn, notes)
+            for row_id, note in notes.items():
+                self._index_note(conn, row_id, note)
+            last_id = rows[-1]["id"]
+
+    def _index_note(self, conn: sqlite3.Connection, row_id: int, note_data: Dict):
+        fields = note_search_fields(note_data)
+        conn.execute(
+            "INSERT INTO notes_fts (rowid, summary, key_points, flashcards) VALUES (?, ?, ?, ?)",
+            (row_id, fields["summary"], fields["keyPoints"], fields["flashcards"]),
+        )
+
+    def _import_json_tree(self):
+        """One-time import of notes written by the JSON engine into the database."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return
+
+        legacy = JsonEngine(self.base_dir)
+        with conn:
+            for subject in legacy.get_subjects():
+                # Oldest first so ids follow creation order
+                for note in reversed(legacy.get_notes_for_subject(subject)):
+                    note["id"] = new_note_id()
+                    note.setdefault("subject", subject)
+                    note.setdefault("timestamp", "")
+                    self._insert_note(conn, note)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', '1')")
+
+    def _subject_id(self, conn: sqlite3.Connection, subject: str) -> int:
+        conn.execute("INSERT OR IGNORE INTO subjects (name) VALUES (?)", (subject,))
+        return conn.execute("SELECT id FROM subjects WHERE name = ?", (subject,)).fetchone()[0]
+
+    def _note_values(self, conn: sqlite3.Connection, note_data: Dict) -> tuple:
+        """Column values (subject_id, timestamp, action, reason, summary, extra) for a note."""
+        extra = {k: v for k, v in note_data.items() if k not in CORE_FIELDS}
+        return (
+            self._subject_id(conn, note_data.get("subject", "Uncategorized")),
+            note_data.get("timestamp", ""),
+            note_data.get("action"),
+            note_data.get("reason"),
+            note_data.get("summary"),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    def _write_key_points(self, conn: sqlite3.Connection, row_id: int, key_points: List):
+        conn.execute("DELETE FROM key_points WHERE note_id = ?", (row_id,))
+        conn.executemany(
+            "INSERT INTO key_points (note_id, position, text) VALUES (?, ?, ?)",
+            [(row_id, i, str(point)) for i, point in enumerate(key_points or [])],
+        )
+
+    def _write_flashcards(self, conn: sqlite3.Connection, row_id: int, flashcards: List):
+        conn.execute("DELETE FROM flashcards WHERE note_id = ?", (row_id,))
+        conn.executemany(
+            "INSERT INTO flashcards (note_id, position, question, answer) VALUES (?, ?, ?, ?)",
+            [
+                (row_id, i, card.get("q"), card.get("a"))
+                for i, card in enumerate(flashcards or [])
+                if isinstance(card, dict)
+            ],
+        )
+
+    def _insert_note(self, conn: sqlite3.Connection, note_data: Dict) -> int:
+        """Inserts a note, or replaces the one stored under the same id (as the JSON engine does)."""
+        existing = conn.execute("SELECT id FROM notes WHERE uid = ?", (note_data["id"],)).fetchone()
+        if existing is None:
+            cursor = conn.execute(
+                "INSERT INTO notes (uid, subject_id, timestamp, action, reason, summary, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (note_data["id"],) + self._note_values(conn, note_data),
+            )
+            row_id = cursor.lastrowid
+        else:
+            row_id = existing[0]
+            conn.execute(
+                "UPDATE notes SET subject_id = ?, timestamp = ?, action = ?, reason = ?, "
+                "summary = ?, extra = ? WHERE id = ?",
+                self._note_values(conn, note_data) + (row_id,),
+            )
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (row_id,))
+        self._write_key_points(conn, row_id, note_data.get("keyPoints"))
+        self._write_flashcards(conn, row_id, note_data.get("flashcards"))
+        self._index_note(conn, row_id, note_data)
+        return row_id
+
+    def _attach_children(self, conn: sqlite3.Connection, notes: Dict[int, Dict]):
+        """Fills keyPoints/flashcards of notes keyed by row id, in batched queries."""
+        ids = list(notes)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row_id, text in conn.execute(
+                f"SELECT note_id, text FROM key_points WHERE note_id IN ({placeholders}) "
+                "ORDER BY note_id, position",
+                chunk,
+            ):
+                notes[row_id]["keyPoints"].append(text)
+            for row_id, question, answer in conn.execute(
+                f"SELECT note_id, question, answer FROM flashcards WHERE note_id IN ({placeholders}) "
+                "ORDER BY note_id, position",
+                chunk,
+            ):
+                notes[row_id]["flashcards"].append({"q": question, "a": answer})
+
+    def _load_notes(self, conn: sqlite3.Connection, rows: List[sqlite3.Row]) -> List[Dict]:
+        """Builds note dicts for rows selected with NOTE_SELECT."""
+        notes = {}
+        for row in rows:
+            note = json.loads(row["extra"]) if row["extra"] else {}
+            note.update({
+                "id": row["uid"],
+                "subject": row["subject"],
+                "timestamp": row["timestamp"],
+                "summary": row["summary"],
+                "keyPoints": [],
+                "flashcards": [],
+            })
+            # Optional fields are left out when unset, as in the JSON files
+            for field in ("action", "reason"):
+                if row[field] is not None:
+                    note[field] = row[field]
+            notes[row["id"]] = note
+        self._attach_children(conn, notes)
+        return [notes[row["id"]] for row in rows]
+
+    def save_note(self, note_data: Dict) -> str:
+        """Inserts a note and returns its id."""
+        return self.save_notes([note_data])[0]
+
+    def save_notes(self, notes: List[Dict]) -> List[str]:
+        """Inserts (or replaces, by id) a batch of notes in a single transaction (one commit)."""
+        conn = self._conn()
+        with conn:
+            for note in notes:
+                self._insert_note(conn, note)
+        return [note["id"] for note in notes]
+
+    def get_subjects(self) -> List[str]:
+        """Returns all subject names, alphabetically."""
+        rows = self._conn().execute("SELECT name FROM subjects ORDER BY name COLLATE NOCASE")
+        return [row[0] for row in rows]
+
+    def get_notes_for_subject(self, subject: str, limit: Optional[int] = None,
+                              after: Optional[str] = None) -> List[Dict]:
+        """
+        Returns notes for a subject, newest first. Pages are read with a
+        keyset query on the (subject, timestamp, id) index, so the cost of a
+        page does not depend on how many notes the subject holds.
+        """
+        conn = self._conn()
+        query = f"{NOTE_SELECT} WHERE s.name = ?"
+        params: list = [subject]
+        if after is not None:
+            cursor = conn.execute("SELECT timestamp, id FROM notes WHERE uid = ?", (after,)).fetchone()
+            if cursor is None:
+                return []
+            query += " AND (n.timestamp, n.id) < (?, ?)"
+            params.extend(cursor)
+        query += " ORDER BY n.timestamp DESC, n.id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        rows = conn.execute(query, params).fetchall()
+        return self._load_notes(conn, rows)
+
+    def get_note(self, note_id: str) -> Optional[Dict]:
+        """Returns a single note by id (unique index lookup), or None."""
+        conn = self._conn()
+        rows = conn.execute(f"{NOTE_SELECT} WHERE n.uid = ?", (note_id,)).fetchall()
+        return self._load_notes(conn, rows)[0] if rows else None
+
+    def get_notes(self, refs: List[Dict]) -> List[Dict]:
+        """Loads the notes referenced by {"id", ...} dicts, in the given order."""
+        if not refs:
+            return []
+        conn = self._conn()
+        ids = [ref["id"] for ref in refs]
+        rows = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows.extend(conn.execute(
+                f"{NOTE_SELECT} WHERE n.uid IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        by_id = {note["id"]: note for note in self._load_notes(conn, rows)}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def update_note(self, note_id: str, patch: Dict) -> Optional[Dict]:
+        """
+        Merges `patch` into a note in one transaction, rewriting only that
+        note's rows. Returns the updated note, or None if it doesn't exist.
+        """
+        conn = self._conn()
+        with conn:
+            rows = conn.execute(f"{NOTE_SELECT} WHERE n.uid = ?", (note_id,)).fetchall()
+            if not rows:
+                return None
+            row_id = rows[0]["id"]
+            note = self._load_notes(conn, rows)[0]
+            note.update({k: v for k, v in patch.items() if k != "id"})
+
+            conn.execute(
+                "UPDATE notes SET subject_id = ?, timestamp = ?, action = ?, reason = ?, "
+                "summary = ?, extra = ? WHERE id = ?",
+                self._note_values(conn, note) + (row_id,),
+            )
+            if "keyPoints" in patch:
+                self._write_key_points(conn, row_id, note.get("keyPoints"))
+            if "flashcards" in patch:
+                self._write_flashcards(conn, row_id, note.get("flashcards"))
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (row_id,))
+            self._index_note(conn, row_id, note)
+        return note
+
+    def clear_all_notes(self):
+        """Deletes every note and subject, plus any leftover JSON engine folders."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM notes_fts")
+            conn.execute("DELETE FROM flashcards")
+            conn.execute("DELETE FROM key_points")
+            conn.execute("DELETE FROM notes")
+            conn.execute("DELETE FROM subjects")
+        for entry in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def search(self, query: str, subject: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        Ranked full-text search using the FTS5 index and its built-in BM25.
+        The last query term matches as a prefix so partial words find results.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        match = " ".join(f'"{t}"' for t in terms[:-1])
+        match = f'{match} "{terms[-1]}"*'.strip()
+
+        sql = (
+            "SELECT n.uid, s.name AS subject, bm25(notes_fts) AS rank, "
+            "f.summary, f.key_points, f.flashcards "
+            "FROM notes_fts f JOIN notes n ON n.id = f.rowid JOIN subjects s ON s.id = n.subject_id "
+            "WHERE notes_fts MATCH ?"
+        )
+        params: list = [match]
+        if subject is not None:
+            sql += " AND s.name = ?"
+            params.append(subject)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        results = []
+        for row in self._conn().execute(sql, params):
+            fields = {"summary": row["summary"], "keyPoints": row["key_points"], "flashcards": row["flashcards"]}
+            results.append({
+                "id": row["uid"],
+                "subject": row["subject"],
+                # bm25() is lower-is-better; flip it so higher scores rank first
+                "score": -row["rank"],
+                "hits": find_hits(fields, terms),
+            })
+        return results
+
+    def count_notes(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def iter_flashcards(self, subjects: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Streams all flashcards from a single query over the flashcards table."""
+        sql = (
+            "SELECT n.uid, f.position, s.name, f.question, f.answer "
+            "FROM flashcards f JOIN notes n ON n.id = f.note_id JOIN subjects s ON s.id = n.subject_id"
+        )
+        params: list = []
+        if subjects is not None:
+            sql += f" WHERE s.name IN ({','.join('?' * len(subjects))})"
+            params.extend(subjects)
+        sql += " ORDER BY s.name, n.id, f.position"
+        # A dedicated connection keeps the long-running read off the thread's shared one
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            for uid, position, subject, question, answer in conn.execute(sql, params):
+                yield {"note_id": uid, "position": position, "subject": subject, "q": question, "a": answer}
+        finally:
+            conn.close()
+
+    def change_token(self, subject: str):
+        """The database's data_version; any commit from another connection bumps it."""
+        with self._watch_lock:
+            if self._watch_conn is None:
+                self._watch_conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def watch_paths(self, subject: Optional[str] = None) -> List[str]:
+        # Commits land in the -wal file first, then get checkpointed into the main file
+        return [p for p in (self.db_path, f"{self.db_path}-wal") if os.path.exists(p)]
+
+    def release_thread(self):
+        """Closes the calling thread's connection, so short-lived worker threads don't leak one each."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+        with self._watch_lock:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+                self._watch_conn = None
+
+
+ENGINES = {
+    "json": JsonEngine,
+    "sqlite": SqliteEngine,
+}
+
+
+def create_engine(name: str, base_dir: str) -> StorageEngine:
+    """Instantiates the storage engine registered under `name`."""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown storage engine '{name}'. Available: {', '.join(ENGINES)}")
+    return ENGINES[name](base_dir)
@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+_DONE = object()
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def render_note_markdown(note: Dict) -> str:
+    """Markdown for one note, in the layout of the FlowNotes export."""
+    parts = [
+        f"### Note - {note.get('timestamp')}\n",
+        f"**Summary:**\n{note.get('summary')}\n\n",
+        "**Key Points:**\n",
+    ]
+    for point in note.get('keyPoints', []):
+        parts.append(f"- {point}\n")
+    parts.append("\n**Flashcards:**\n")
+    for card in note.get('flashcards', []):
+        parts.append(f"- Q: {card.get('q')}\n  A: {card.get('a')}\n")
+    parts.append("\n---\n\n")
+    return "".join(parts)
+
+
+class MarkdownExporter:
+    """
+    Streams every note into one Markdown file.
+
+    Subjects are read and rendered on a thread pool, a page of notes at a
+    time. Each subject hands its rendered pages to the writer through a small
+    bounded queue, so memory stays bounded by workers x queue_pages x
+    page_size notes no matter how large the library is, while the writer
+    consumes subjects strictly in order to keep the output deterministic.
+    """
+
+    def __init__(self, storage, workers: int = 4, page_size: int = 200, queue_pages: int = 4):
+        self.storage = storage
+        self.workers = workers
+        self.page_size = page_size
+        self.queue_pages = queue_pages
+
+    def export(self, output_file: str, progress: Optional[Callable[[int, int], None]] = None,
+               cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Writes the export to `output_file` (via a temporary file, renamed on
+        success). Calls progress(done, total) as notes are written and raises
+        ExportCancelled if `cancel_event` gets set. Returns the note count.
+        """
+        cancel_event = cancel_event or threading.Event()
+        self.storage.flush()
+        subjects = self.storage.get_subjects()
+        total = self.storage.count_notes()
+        written = 0
+
+        tmp_path = f"{output_file}.part"
+        try:
+            with open(tmp_path, "w", encoding="utf-8", buffering=1024 * 1024) as f:
+                for chunk, count in self._chunks(subjects, cancel_event):
+                    f.write(chunk)
+                    if count:
+                        written += count
+                        if progress:
+                            progress(written, total)
+            os.replace(tmp_path, output_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written
+
+    def _chunks(self, subjects: List[str], cancel_event: threading.Event) -> Iterator[tuple]:
+        """Yields (markdown, note count) in subject order while workers render ahead."""
+        yield "# FlowNotes\n\n", 0
+        if not subjects:
+            return
+
+        queues = [queue.Queue(maxsize=self.queue_pages) for _ in subjects]
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export") as pool:
+            # The pool starts subjects in order, so the one being consumed
+            # always has a worker; later ones block once their queue fills.
+            for subject, out in zip(subjects, queues):
+                pool.submit(self._render_subject, subject, out, stop)
+            try:
+                for out in queues:
+                    while True:
+                        if cancel_event.is_set():
+                            raise ExportCancelled()
+                        try:
+                            item = out.get(timeout=0.1)
+                        except queue.Empty:
+                            continue
+                        if item is _DONE:
+                            break
+                        if isinstance(item, BaseException):
+                            raise item
+                        yield item
+            finally:
+                # Stops workers that are still rendering or blocked on a full queue
+                stop.set()
+
+    def _render_subject(self, subject: str, out: "queue.Queue", stop: threading.Event):
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            if not put((f"## {subject}\n\n", 0)):
+                return
+            for notes in self.storage.iter_notes(subject, page_size=self.page_size):
+                if not put(("".join(render_note_markdown(n) for n in notes), len(notes))):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(e)
+        finally:
+            # Pool threads are discarded after the export; their connections go with them
+            self.storage.release_thread()
@@ -0,0 +1,265 @@
+import csv
+import hashlib
+import html
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.notes.export import ExportCancelled
+
+# Fixed so every export uses the same note type and Anki updates, rather
+# than duplicates, cards it has already imported
+ANKI_MODEL_ID = 1718204917311
+ANKI_DECK_PREFIX = "FlowNotes"
+
+ANKI_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null,
+    conf text not null, models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null,
+    csum integer not null, flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null,
+    due integer not null, ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null, odid integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null, ivl integer not null,
+    lastIvl integer not null, factor integer not null, time integer not null, type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+
+def stable_card_id(card: Dict) -> str:
+    """Id of a flashcard that stays the same across exports: its note id and position."""
+    return f"{card['note_id']}-{card['position']}"
+
+
+def _stable_int(*parts) -> int:
+    """Positive 48-bit integer derived from `parts` (fits Anki's millisecond-style ids)."""
+    digest = hashlib.sha1(":".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return int(digest[:12], 16)
+
+
+def _checked(cards: Iterator[Dict], cancel_event: Optional[threading.Event],
+             progress: Optional[Callable[[int, int], None]]) -> Iterator[Dict]:
+    count = 0
+    for card in cards:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ExportCancelled()
+        yield card
+        count += 1
+        if progress and count % 500 == 0:
+            progress(count, 0)
+
+
+def export_flashcards_csv(storage, output_file: str, subjects: Optional[List[str]] = None,
+                          delimiter: str = ",", progress: Optional[Callable[[int, int], None]] = None,
+                          cancel_event: Optional[threading.Event] = None) -> int:
+    """
+    Streams flashcards to CSV (or TSV with delimiter="\\t") with columns
+    id, subject, question, answer. Returns the number of cards written.
+    """
+    tmp_path = f"{output_file}.part"
+    count = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="", buffering=1024 * 1024) as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            writer.writerow(["id", "subject", "question", "answer"])
+            for card in _checked(storage.iter_flashcards(subjects), cancel_event, progress):
+                writer.writerow([stable_card_id(card), card["subject"], card["q"] or "", card["a"] or ""])
+                count += 1
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def _anki_model(now: int) -> Dict:
+    field = {"sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+    return {
+        "id": ANKI_MODEL_ID,
+        "name": "FlowNotes Basic",
+        "type": 0,
+        "mod": now,
+        "usn": -1,
+        "sortf": 0,
+        "did": 1,
+        "tmpls": [{
+            "name": "Card 1",
+            "ord": 0,
+            "qfmt": "{{Question}}",
+            "afmt": "{{FrontSide}}\n\n<hr id=answer>\n\n{{Answer}}",
+            "did": None,
+            "bqfmt": "",
+            "bafmt": "",
+        }],
+        "flds": [dict(field, name="Question", ord=0), dict(field, name="Answer", ord=1)],
+        "css": ".card { font-family: arial; font-size: 20px; text-align: center; color: black; background-color: white; }",
+        "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage[utf8]{inputenc}\n"
+                    "\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n",
+        "latexPost": "\\end{document}",
+        "tags": [],
+        "vers": [],
+        "req": [[0, "all", [0]]],
+    }
+
+
+def _anki_deck(deck_id: int, name: str, now: int) -> Dict:
+    return {
+        "id": deck_id,
+        "name": name,
+        "desc": "",
+        "mod": now,
+        "usn": -1,
+        "collapsed": False,
+        "browserCollapsed": False,
+        "newToday": [0, 0],
+        "revToday": [0, 0],
+        "lrnToday": [0, 0],
+        "timeToday": [0, 0],
+        "dyn": 0,
+        "conf": 1,
+        "extendNew": 10,
+        "extendRev": 50,
+    }
+
+
+ANKI_DCONF = {
+    "1": {
+        "id": 1, "name": "Default", "replayq": True, "timer": 0, "maxTaken": 60, "usn": 0,
+        "mod": 0, "autoplay": True, "dyn": False,
+        "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0},
+        "rev": {"perDay": 100, "ease4": 1.3, "fuzz": 0.05, "minSpace": 1, "ivlFct": 1, "maxIvl": 36500, "bury": True},
+        "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "separate": True,
+                "order": 1, "perDay": 20, "bury": True},
+    }
+}
+
+ANKI_CONF = {
+    "activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200, "timeLim": 0,
+    "estTimes": True, "dueCounts": True, "curModel": None, "nextPos": 1,
+    "sortType": "noteFld", "sortBackwards": False, "addToCur": True,
+}
+
+
+def export_flashcards_apkg(storage, output_file: str, subjects: Optional[List[str]] = None,
+                           progress: Optional[Callable[[int, int], None]] = None,
+                           cancel_event: Optional[threading.Event] = None) -> int:
+    """
+    Writes flashcards to an Anki package (.apkg), one deck per subject under
+    "FlowNotes::". Cards are streamed into the package's SQLite collection,
+    so memory use does not grow with the number of cards.
+
+    Note guids and card/deck ids are derived from FlowNotes ids and subject
+    names, so importing a newer export updates the existing cards.
+    Returns the number of cards written.
+    """
+    now = int(time.time())
+    decks = {1: {**_anki_deck(1, "Default", now), "conf": 1}}
+    count = 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection_path = os.path.join(tmp_dir, "collection.anki2")
+        conn = sqlite3.connect(collection_path)
+        try:
+            conn.executescript(ANKI_SCHEMA)
+
+            def rows():
+                nonlocal count
+                for card in _checked(storage.iter_flashcards(subjects), cancel_event, progress):
+                    deck_name = f"{ANKI_DECK_PREFIX}::{card['subject']}"
+                    deck_id = _stable_int("deck", deck_name)
+                    if deck_id not in decks:
+                        decks[deck_id] = _anki_deck(deck_id, deck_name, now)
+                    key = stable_card_id(card)
+                    question = html.escape(card["q"] or "")
+                    answer = html.escape(card["a"] or "")
+                    csum = int(hashlib.sha1(question.encode("utf-8")).hexdigest()[:8], 16)
+                    count += 1
+                    yield (
+                        _stable_int("note", key), f"flownotes-{key}", ANKI_MODEL_ID, now, -1, " FlowNotes ",
+                        f"{question}\x1f{answer}", question, csum,
+                        _stable_int("card", key), deck_id, count,
+                    )
+
+            conn.execute("BEGIN")
+            batch = []
+            for row in rows():
+                batch.append(row)
+                if len(batch) >= 1000:
+                    _insert_anki_rows(conn, batch, now)
+                    batch = []
+            _insert_anki_rows(conn, batch, now)
+
+            conn.execute(
+                "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+                (
+                    now, now * 1000, now * 1000,
+                    json.dumps(ANKI_CONF),
+                    json.dumps({str(ANKI_MODEL_ID): _anki_model(now)}),
+                    json.dumps({str(k): v for k, v in decks.items()}),
+                    json.dumps(ANKI_DCONF),
+                ),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        tmp_package = f"{output_file}.part"
+        try:
+            with zipfile.ZipFile(tmp_package, "w", zipfile.ZIP_DEFLATED) as package:
+                package.write(collection_path, "collection.anki2")
+                package.writestr("media", "{}")
+            os.replace(tmp_package, output_file)
+        except BaseException:
+            if os.path.exists(tmp_package):
+                os.remove(tmp_package)
+            raise
+    return count
+
+
+def _insert_anki_rows(conn: sqlite3.Connection, batch: List[tuple], now: int):
+    conn.executemany(
+        "INSERT OR REPLACE INTO notes (id, guid, mid, mod, usn, tags, flds, sfld, csum, flags, data) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, '')",
+        [row[:9] for row in batch],
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO cards (id, nid, did, ord, mod, usn, type, queue, due, ivl, factor, "
+        "reps, lapses, left, odue, odid, flags, data) VALUES (?, ?, ?, 0, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')",
+        [(row[9], row[0], row[10], now, row[11]) for row in batch],
+    )
+
+
+def export_flashcards(storage, output_file: str, subjects: Optional[List[str]] = None,
+                      progress: Optional[Callable[[int, int], None]] = None,
+                      cancel_event: Optional[threading.Event] = None) -> int:
+    """Picks the format from the file extension: .apkg, .tsv, or CSV otherwise."""
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension == ".apkg":
+        return export_flashcards_apkg(storage, output_file, subjects, progress, cancel_event)
+    delimiter = "\t" if extension == ".tsv" else ","
+    return export_flashcards_csv(storage, output_file, subjects, delimiter, progress, cancel_event)
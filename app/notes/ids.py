@@ -0,0 +1,42 @@
+import os
+import threading
+import time
+
+# Crockford base32, as used by ULIDs
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_RANDOM_BITS = 80
+_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+def encode_ulid(timestamp_ms: int, randomness: int) -> str:
+    """Encodes a 48-bit millisecond timestamp and 80 random bits as 26 base32 chars."""
+    value = (timestamp_ms << _RANDOM_BITS) | randomness
+    chars = []
+    for _ in range(26):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_note_id() -> str:
+    """
+    Returns a new ULID-style note id. Ids sort lexicographically in creation
+    order and stay unique and increasing even when many notes are created
+    within the same millisecond.
+    """
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = int(time.time() * 1000)
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _last_random = int.from_bytes(os.urandom(10), "big")
+        else:
+            # Same millisecond (or clock went backwards): keep counting up
+            _last_random += 1
+            if _last_random >> _RANDOM_BITS:
+                _last_ms += 1
+                _last_random = 0
+        return encode_ulid(_last_ms, _last_random)
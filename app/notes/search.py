@@ -0,0 +1,173 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Letters and digits; underscores and punctuation separate tokens. This matches
+# SQLite's unicode61 tokenizer so offsets line up with what FTS5 matched.
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Note fields that are searchable, in the order they are indexed
+SEARCH_FIELDS = ("summary", "keyPoints", "flashcards")
+
+
+def normalize_token(token: str) -> str:
+    """Lower-cases a token and strips diacritics ("Café" -> "cafe")."""
+    decomposed = unicodedata.normalize("NFKD", token.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Splits text into (normalized token, start, end) triples."""
+    return [(normalize_token(m.group()), m.start(), m.end()) for m in TOKEN_RE.finditer(text or "")]
+
+
+def query_terms(query: str) -> List[str]:
+    """Normalized terms of a user query, in order, without duplicates."""
+    terms = []
+    for term, _, _ in tokenize(query):
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def note_search_fields(note: Dict) -> Dict[str, str]:
+    """
+    Flattens the searchable parts of a note into one string per field.
+    Key points and flashcard questions/answers are joined with newlines.
+    """
+    cards = []
+    for card in note.get("flashcards") or []:
+        if isinstance(card, dict):
+            cards.append(str(card.get("q") or ""))
+            cards.append(str(card.get("a") or ""))
+    return {
+        "summary": str(note.get("summary") or ""),
+        "keyPoints": "\n".join(str(p) for p in note.get("keyPoints") or []),
+        "flashcards": "\n".join(cards),
+    }
+
+
+def find_hits(fields: Dict[str, str], terms: List[str], prefix_last: bool = True) -> List[Dict]:
+    """
+    Locates query terms in the flattened note fields.
+    Returns [{"field", "start", "end"}] with offsets into the field text.
+    """
+    exact = set(terms[:-1]) if prefix_last else set(terms)
+    prefix = terms[-1] if prefix_last and terms else None
+    hits = []
+    for field in SEARCH_FIELDS:
+        for token, start, end in tokenize(fields.get(field, "")):
+            if token in exact or (prefix is not None and token.startswith(prefix)):
+                hits.append({"field": field, "start": start, "end": end})
+    return hits
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index with BM25 ranking, used by engines that have
+    no full-text index of their own. Documents are added incrementally.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {doc key: term frequency}
+        self.terms: List[str] = []  # sorted, for prefix lookups
+        self.doc_terms: Dict[str, set] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_subjects: Dict[str, str] = {}
+        self.total_length = 0
+        self.lock = threading.Lock()
+
+    def add(self, key: str, subject: str, fields: Dict[str, str]):
+        """Indexes (or re-indexes) one document."""
+        with self.lock:
+            if key in self.doc_lengths:
+                self._remove(key)
+            tokens = [t for f in SEARCH_FIELDS for t, _, _ in tokenize(fields.get(f, ""))]
+            for term in tokens:
+                docs = self.postings.get(term)
+                if docs is None:
+                    docs = self.postings[term] = {}
+                    insort(self.terms, term)
+                docs[key] = docs.get(key, 0) + 1
+            self.doc_terms[key] = set(tokens)
+            self.doc_lengths[key] = len(tokens)
+            self.doc_subjects[key] = subject
+            self.total_length += len(tokens)
+
+    def remove(self, key: str):
+        with self.lock:
+            if key in self.doc_lengths:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        for term in self.doc_terms.pop(key):
+            docs = self.postings[term]
+            del docs[key]
+            if not docs:
+                # Last document with this term: drop it so the index shrinks again
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+        self.total_length -= self.doc_lengths.pop(key)
+        self.doc_subjects.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.postings.clear()
+            self.terms.clear()
+            self.doc_terms.clear()
+            self.doc_lengths.clear()
+            self.doc_subjects.clear()
+            self.total_length = 0
+
+    def _expand_prefix(self, prefix: str) -> Iterable[str]:
+        i = bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            yield self.terms[i]
+            i += 1
+
+    def search(self, terms: List[str], subject: Optional[str] = None,
+               limit: int = 20) -> List[Tuple[str, float]]:
+        """
+        Ranks documents containing every term (the last one as a prefix).
+        Returns [(doc key, score)] best first.
+        """
+        if not terms:
+            return []
+        with self.lock:
+            n_docs = len(self.doc_lengths)
+            if not n_docs:
+                return []
+            avg_length = self.total_length / n_docs
+
+            # Each query term may expand to several index terms (prefix match)
+            groups = [[terms[i]] for i in range(len(terms) - 1)]
+            groups.append(list(self._expand_prefix(terms[-1])))
+
+            scores: Optional[Dict[str, float]] = None
+            for group in groups:
+                group_scores: Dict[str, float] = {}
+                for term in group:
+                    docs = self.postings.get(term)
+                    if not docs:
+                        continue
+                    idf = math.log((n_docs - len(docs) + 0.5) / (len(docs) + 0.5) + 1)
+                    for key, tf in docs.items():
+                        if subject is not None and self.doc_subjects.get(key) != subject:
+                            continue
+                        norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[key] / avg_length)
+                        group_scores[key] = group_scores.get(key, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {k: v + group_scores[k] for k, v in scores.items() if k in group_scores}
+                if not scores:
+                    return []
+
+        return heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
@@ -1,89 +1,218 @@
-import json
+import copy
 import os
-import shutil
+import threading
 from datetime import datetime
-from typing import Dict, List
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.notes.cache import NoteCache
+from app.notes.engines import StorageEngine, create_engine
+from app.notes.export import MarkdownExporter
+from app.notes.flashcard_export import export_flashcards
+from app.notes.ids import new_note_id
+from app.notes.writer import NoteWriter
 
 class NoteStorage:
-    def __init__(self, base_dir: str = "notes_data"):
+    def __init__(self, base_dir: str = "notes_data", engine: str = "sqlite", write_behind: bool = False,
+                 cache_bytes: int = 32 * 1024 * 1024):
         self.base_dir = base_dir
         if not os.path.exists(self.base_dir):
             os.makedirs(self.base_dir)
+        # "sqlite" (default) or "json" for the original file-per-note layout
+        self.engine: StorageEngine = create_engine(engine, self.base_dir)
+        # With write_behind, save_note returns at once and a background thread
+        # persists notes in batches; reads still see notes not yet written.
+        self.writer: Optional[NoteWriter] = NoteWriter(self.engine) if write_behind else None
+        # Parsed pages of notes, revalidated against the engine's change token
+        self.cache = NoteCache(cache_bytes)
 
-    def save_note(self, note_data: Dict) -> str:
+    def save_note(self, note_data: Dict, on_commit: Optional[Callable[[str], None]] = None) -> str:
         """
-        Saves a note to a JSON file organized by subject.
-        Returns the path to the saved file.
+        Saves a note under its subject.
+        Assigns a unique, time-ordered id (ULID) unless the note already has
+        one, and returns it. `on_commit(note_id)` is called once the note is
+        on disk: right away without write-behind, otherwise from the writer
+        thread when its batch commits.
         """
-        subject = note_data.get("subject", "Uncategorized")
-        subject_dir = os.path.join(self.base_dir, subject)
-        
-        if not os.path.exists(subject_dir):
-            os.makedirs(subject_dir)
-
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"note_{timestamp}.json"
-        filepath = os.path.join(subject_dir, filename)
+        if not note_data.get("id"):
+            note_data["id"] = new_note_id()
 
         # Add timestamp to note data if not present
         if "timestamp" not in note_data:
             note_data["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M")
 
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(note_data, f, indent=4, ensure_ascii=False)
+        if self.writer is not None:
+            self.writer.submit(copy.deepcopy(note_data), on_commit)
+            return note_data["id"]
+        note_id = self.engine.save_note(note_data)
+        self.cache.invalidate(note_data.get("subject", "Uncategorized"))
+        if on_commit is not None:
+            on_commit(note_id)
+        return note_id
 
-        return filepath
+    def flush(self):
+        """
+        Blocks until all notes saved so far are on disk, or failed to write:
+        those stay pending while the writer retries them (see NoteWriter).
+        """
+        if self.writer is not None:
+            self.writer.flush()
 
-    def get_subjects(self) -> List[str]:
-        """Returns a list of all subjects (directories)."""
-        if not os.path.exists(self.base_dir):
+    def _pending(self, subject: Optional[str] = None) -> List[Dict]:
+        if self.writer is None:
             return []
-        return [d for d in os.listdir(self.base_dir) if os.path.isdir(os.path.join(self.base_dir, d))]
+        return [copy.deepcopy(n) for n in self.writer.pending_notes(subject)]
 
-    def get_notes_for_subject(self, subject: str) -> List[Dict]:
-        """Returns all notes for a given subject."""
-        subject_dir = os.path.join(self.base_dir, subject)
-        if not os.path.exists(subject_dir):
-            return []
+    def get_subjects(self) -> List[str]:
+        """Returns a list of all subjects."""
+        pending = self._pending()
+        subjects = self.engine.get_subjects()
+        for note in pending:
+            subject = note.get("subject", "Uncategorized")
+            if subject not in subjects:
+                subjects.append(subject)
+        return subjects
+
+    def get_notes_for_subject(self, subject: str, limit: Optional[int] = None,
+                              after: Optional[str] = None) -> List[Dict]:
+        """
+        Returns notes for a given subject, newest first.
+        With `limit`, returns at most that many notes; pass the "id" of the
+        last note of a page as `after` to fetch the next (older) page.
+        """
+        if self.writer is None:
+            return self._cached_notes(subject, limit, after)
+        if after is not None and self.writer.get_pending(after) is not None:
+            self.flush()
+
+        # Unwritten notes are the newest, so they only ever lead the first page.
+        # Snapshot them before querying so a note committed in between is
+        # reported once (from the engine) rather than twice.
+        pending = self._pending(subject) if after is None else []
+        pending_ids = {n["id"] for n in pending}
+        notes = self._cached_notes(subject, limit, after)
+        notes = pending + [n for n in notes if n.get("id") not in pending_ids]
+        return notes if limit is None else notes[:limit]
+
+    def _cached_notes(self, subject: str, limit: Optional[int], after: Optional[str]) -> List[Dict]:
+        """
+        Engine page lookup served from the cache when the subject is unchanged.
+        Callers get copies, so changing a returned note never alters the
+        cache; go through update_note to change one.
+        """
+        # Token first: a commit racing with the query then only causes a later miss
+        token = self.engine.change_token(subject)
+        if token is None:
+            return self.engine.get_notes_for_subject(subject, limit=limit, after=after)
+        key = (subject, limit, after)
+        notes = self.cache.get(key, token)
+        if notes is None:
+            notes = self.engine.get_notes_for_subject(subject, limit=limit, after=after)
+            self.cache.put(key, subject, token, notes)
+        return [copy.deepcopy(n) for n in notes]
+
+    def iter_notes(self, subject: str, page_size: int = 200) -> Iterator[List[Dict]]:
+        """
+        Yields all of a subject's notes, newest first, one page at a time.
+        Reads the engine directly so bulk jobs don't churn the page cache.
+        """
+        self.flush()
+        after = None
+        while True:
+            notes = self.engine.get_notes_for_subject(subject, limit=page_size, after=after)
+            if not notes:
+                return
+            yield notes
+            if len(notes) < page_size:
+                return
+            after = notes[-1]["id"]
+
+    def iter_flashcards(self, subjects: Optional[List[str]] = None) -> Iterator[Dict]:
+        """
+        Streams flashcards of all notes (or only of `subjects`) as
+        {"note_id", "position", "subject", "q", "a"} dicts.
+        """
+        self.flush()
+        return self.engine.iter_flashcards(subjects)
+
+    def count_notes(self) -> int:
+        """Total number of notes across all subjects."""
+        self.flush()
+        return self.engine.count_notes()
+
+    def watch_paths(self, subject: Optional[str] = None) -> List[str]:
+        """Paths to watch (e.g. with QFileSystemWatcher) for changes made outside this process."""
+        return self.engine.watch_paths(subject)
+
+    def get_note(self, note_id: str) -> Optional[Dict]:
+        """Returns a single note by id, or None if it doesn't exist."""
+        if self.writer is not None:
+            pending = self.writer.get_pending(note_id)
+            if pending is not None:
+                return copy.deepcopy(pending)
+        return self.engine.get_note(note_id)
+
+    def get_notes(self, refs: List[Dict]) -> List[Dict]:
+        """
+        Loads full notes for references such as search results (dicts with
+        "id" and "subject"), preserving their order. Missing notes are skipped.
+        """
+        if self.writer is not None:
+            self.flush()
+        return self.engine.get_notes(refs)
 
-        notes = []
-        for filename in os.listdir(subject_dir):
-            if filename.endswith(".json"):
-                filepath = os.path.join(subject_dir, filename)
-                try:
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        note = json.load(f)
-                        notes.append(note)
-                except Exception as e:
-                    print(f"Error loading note {filepath}: {e}")
-        
-        # Sort by timestamp descending (newest first)
-        # Assuming timestamp format is consistent, otherwise might need parsing
-        notes.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        return notes
+    def update_note(self, note_id: str, patch: Dict) -> Optional[Dict]:
+        """
+        Applies `patch` (a dict of top-level fields to replace) to a stored
+        note and rewrites only that note. Changing "subject" moves the note.
+        Returns the updated note, or None if no note has that id.
+        """
+        if self.writer is not None and self.writer.get_pending(note_id) is not None:
+            self.flush()
+        note = self.engine.update_note(note_id, patch)
+        # The token covers disk state; drop our own copies right away too
+        self.cache.invalidate()
+        return note
 
     def clear_all_notes(self):
-        """Deletes all notes by removing the entire notes directory."""
-        if os.path.exists(self.base_dir):
-            shutil.rmtree(self.base_dir)
-            os.makedirs(self.base_dir)
+        """Deletes all notes and subjects."""
+        self.flush()
+        self.engine.clear_all_notes()
+        self.cache.invalidate()
 
-    def export_all_to_markdown(self, output_file: str):
-        """Exports all notes to a single Markdown file."""
-        subjects = self.get_subjects()
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write("# FlowNotes\n\n")
-            
-            for subject in subjects:
-                f.write(f"## {subject}\n\n")
-                notes = self.get_notes_for_subject(subject)
-                for note in notes:
-                    f.write(f"### Note - {note.get('timestamp')}\n")
-                    f.write(f"**Summary:**\n{note.get('summary')}\n\n")
-                    f.write("**Key Points:**\n")
-                    for point in note.get('keyPoints', []):
-                        f.write(f"- {point}\n")
-                    f.write("\n**Flashcards:**\n")
-                    for card in note.get('flashcards', []):
-                        f.write(f"- Q: {card.get('q')}\n  A: {card.get('a')}\n")
-                    f.write("\n---\n\n")
+    def search(self, query: str, subject: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        Full-text search over summaries, key points and flashcard Q/A, ranked
+        by BM25. Returns up to `limit` results, best first, as
+        {"id", "subject", "score", "hits"} where each hit is
+        {"field", "start", "end"} — character offsets into that field's text
+        (key points and flashcard questions/answers are joined by newlines).
+        """
+        return self.engine.search(query, subject=subject, limit=limit)
+
+    def release_thread(self):
+        """Call at the end of a worker thread that read or wrote notes (see StorageEngine.release_thread)."""
+        self.engine.release_thread()
+
+    def close(self):
+        """Writes any queued notes, then releases engine resources."""
+        if self.writer is not None:
+            self.writer.close()
+        self.engine.close()
+
+    def export_all_to_markdown(self, output_file: str, progress: Optional[Callable[[int, int], None]] = None,
+                               cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Exports all notes to a single Markdown file with bounded memory.
+        See MarkdownExporter for progress and cancellation. Returns the number
+        of notes written.
+        """
+        return MarkdownExporter(self).export(output_file, progress=progress, cancel_event=cancel_event)
+
+    def export_flashcards(self, output_file: str, subjects: Optional[List[str]] = None,
+                          progress: Optional[Callable[[int, int], None]] = None,
+                          cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Exports flashcards (all, or only those of `subjects`) to CSV, TSV or an
+        Anki .apkg package, chosen by the file extension. Returns the card count.
+        """
+        return export_flashcards(self, output_file, subjects, progress=progress, cancel_event=cancel_event)
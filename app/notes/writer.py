@@ -0,0 +1,225 @@
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+_STOP = object()
+
+
+def is_transient_write_error(error: BaseException) -> bool:
+    """Errors worth retrying: a locked or busy database, a full or unreachable disk."""
+    return isinstance(error, (sqlite3.OperationalError, OSError))
+
+
+class NoteWriter:
+    """
+    Write-behind queue for notes. Callers hand notes over with submit() and
+    return immediately; a dedicated thread persists them in group commits
+    (everything queued within `max_delay` seconds, up to `max_batch` notes,
+    goes to the engine as one batch).
+
+    Notes stay visible through pending_notes() until they commit. If a
+    batch fails, its notes are written one at a time, so one bad note can't
+    hold back the rest. A note that fails with a transient error (see
+    is_transient_write_error) stays pending and is retried in the
+    background, with backoff; after `max_attempts` tries, or straight away
+    for any other error, it is parked: logged, removed from the pending
+    notes and kept in parked_notes(). Its on_commit callback never runs, so
+    a journaled clip behind it is processed again on the next start.
+    """
+    RETRY_BASE = 0.5
+    RETRY_CAP = 30.0
+
+    def __init__(self, engine, max_batch: int = 64, max_delay: float = 0.05, max_attempts: int = 10,
+                 close_retries: int = 3):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.close_retries = close_retries
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending: Dict[str, Dict] = {}
+        self._callbacks: Dict[str, Callable[[str], None]] = {}
+        self._parked: Dict[str, Dict] = {}
+        self._pending_lock = threading.Lock()
+        self._closed = False
+        # Writer thread only: notes to try again, their failed attempts, and when
+        self._retry: List[Dict] = []
+        self._attempts: Dict[str, int] = {}
+        self._retry_round = 0
+        self._retry_at: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name="NoteWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, note_data: Dict, on_commit: Optional[Callable[[str], None]] = None):
+        """
+        Queues a note (which must already have an "id") for persistence.
+        `on_commit(note_id)` is called on the writer thread once it is on disk.
+        """
+        if self._closed:
+            raise RuntimeError("NoteWriter is closed")
+        with self._pending_lock:
+            self._pending[note_data["id"]] = note_data
+            self._parked.pop(note_data["id"], None)
+            if on_commit is not None:
+                self._callbacks[note_data["id"]] = on_commit
+        self._queue.put(note_data)
+
+    def pending_notes(self, subject: Optional[str] = None) -> List[Dict]:
+        """Notes not yet committed, newest first, optionally for one subject."""
+        with self._pending_lock:
+            notes = [n for n in self._pending.values() if subject is None or n.get("subject") == subject]
+        notes.sort(key=lambda n: n["id"], reverse=True)
+        return notes
+
+    def get_pending(self, note_id: str) -> Optional[Dict]:
+        with self._pending_lock:
+            return self._pending.get(note_id)
+
+    def parked_notes(self) -> List[Dict]:
+        """Notes given up on, oldest id first."""
+        with self._pending_lock:
+            return sorted(self._parked.values(), key=lambda n: n["id"])
+
+    def flush(self):
+        """
+        Blocks until every note submitted so far has been written or has
+        failed once. Notes that failed transiently stay pending and are
+        retried in the background, so this never waits out a retry.
+        """
+        self._queue.join()
+
+    def close(self):
+        """Writes everything still queued, retrying failed notes briefly, then stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _next_batch(self, timeout: Optional[float] = None) -> List:
+        """The next batch, or [] if nothing arrives within `timeout` seconds."""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        if batch[0] is _STOP:
+            return batch
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is _STOP:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            timeout = None if self._retry_at is None else max(0.0, self._retry_at - time.monotonic())
+            batch = self._next_batch(timeout)
+            stop = bool(batch) and batch[-1] is _STOP
+            notes = [n for n in batch if n is not _STOP]
+            if notes:
+                self._write(notes)
+            # Released after the first attempt; failed notes are retried outside the queue
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                self._retry_at_close()
+                return
+            if self._retry and (self._retry_at is None or time.monotonic() >= self._retry_at):
+                if self._retry_at is not None:
+                    self._retry_round += 1
+                    self._write(self._take_retry())
+                self._schedule_retry()
+
+    def _schedule_retry(self):
+        if not self._retry:
+            self._retry_round = 0
+            self._retry_at = None
+            return
+        delay = min(self.RETRY_CAP, self.RETRY_BASE * 2 ** self._retry_round)
+        print(f"Keeping {len(self._retry)} unwritten note(s) pending; retrying in {delay:.1f}s")
+        self._retry_at = time.monotonic() + delay
+
+    def _take_retry(self) -> List[Dict]:
+        """The notes to try again, minus any resubmitted (and so queued again) since they failed."""
+        notes, self._retry = self._retry, []
+        current = []
+        with self._pending_lock:
+            for note in notes:
+                if self._pending.get(note["id"]) is note:
+                    current.append(note)
+                else:
+                    self._attempts.pop(note["id"], None)
+        return current
+
+    def _retry_at_close(self):
+        for attempt in range(self.close_retries):
+            if not self._retry:
+                return
+            time.sleep(min(self.RETRY_CAP, self.RETRY_BASE * 2 ** attempt))
+            self._write(self._take_retry())
+        for note in self._take_retry():
+            self._park(note, "still failing at close")
+
+    def _write(self, notes: List[Dict]):
+        """Commits notes as one batch, or one at a time if the batch fails."""
+        try:
+            self.engine.save_notes(notes)
+        except Exception as e:
+            if len(notes) == 1:
+                self._failed(notes[0], e)
+                return
+            print(f"Error writing {len(notes)} notes ({e}); writing them one at a time")
+        else:
+            self._committed(notes)
+            return
+        for note in notes:
+            try:
+                self.engine.save_notes([note])
+            except Exception as e:
+                self._failed(note, e)
+            else:
+                self._committed([note])
+
+    def _failed(self, note: Dict, error: Exception):
+        attempts = self._attempts.get(note["id"], 0) + 1
+        if is_transient_write_error(error) and attempts < self.max_attempts:
+            print(f"Error writing note {note['id']} (attempt {attempts}/{self.max_attempts}): {error}")
+            self._attempts[note["id"]] = attempts
+            self._retry.append(note)
+            return
+        self._park(note, error)
+
+    def _park(self, note: Dict, reason):
+        self._attempts.pop(note["id"], None)
+        print(f"Giving up on writing note {note['id']}: {reason}")
+        with self._pending_lock:
+            if self._pending.get(note["id"]) is not note:
+                return  # Resubmitted meanwhile; the newer version is queued
+            del self._pending[note["id"]]
+            self._callbacks.pop(note["id"], None)
+            self._parked[note["id"]] = note
+
+    def _committed(self, notes: List[Dict]):
+        callbacks = []
+        with self._pending_lock:
+            for note in notes:
+                self._attempts.pop(note["id"], None)
+                if self._pending.get(note["id"]) is note:
+                    del self._pending[note["id"]]
+                    callbacks.append((note["id"], self._callbacks.pop(note["id"], None)))
+        for note_id, callback in callbacks:
+            if callback is not None:
+                try:
+                    callback(note_id)
+                except Exception as e:
+                    print(f"Error in commit callback for note {note_id}: {e}")
@@ -1,12 +1,18 @@
 from PySide6.QtWidgets import (QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, 
                                QListWidget, QTextEdit, QLabel, QPushButton, QSplitter, 
                                QMessageBox, QScrollArea, QFrame, QGraphicsDropShadowEffect,
-                               QListWidgetItem, QSizePolicy, QLineEdit, QCheckBox)
-from PySide6.QtCore import Qt, Signal, QTimer, QPropertyAnimation, QRect, QEasingCurve, Property, QPoint
+                               QListWidgetItem, QSizePolicy, QLineEdit, QCheckBox,
+                               QFileDialog, QProgressDialog)
+from PySide6.QtCore import (Qt, Signal, QTimer, QPropertyAnimation, QRect, QEasingCurve, Property, QPoint,
+                            QObject, QRunnable, QThreadPool, QFileSystemWatcher, QThread)
 from PySide6.QtGui import QFont, QColor, QPainter, QPixmap
 from app.ui.settings import SettingsDialog
+from app.ai.bridge import LLMBridge
 from app.notes.storage import NoteStorage
+from app.notes.export import ExportCancelled
 import hashlib
+import os
+import threading
 
 class ToggleSwitch(QCheckBox):
     """Custom toggle switch widget"""
@@ -196,7 +202,75 @@ class LoadingOverlay(QWidget):
         
         self.index = (self.index + 1) % len(self.emojis)
 
+class SearchSignals(QObject):
+    finished = Signal(int, list)  # generation, notes
+
+
+class SearchTask(QRunnable):
+    """Runs one storage search on a pool thread; drops its result if a newer query started"""
+    def __init__(self, storage, query, subject, generation, current_generation):
+        super().__init__()
+        self.storage = storage
+        self.query = query
+        self.subject = subject
+        self.generation = generation
+        self.current_generation = current_generation
+        self.signals = SearchSignals()
+
+    def run(self):
+        if self.generation != self.current_generation():
+            return  # Superseded while waiting in the pool
+        try:
+            results = self.storage.search(self.query, subject=self.subject, limit=MainWindow.SEARCH_LIMIT)
+            if self.generation != self.current_generation():
+                return
+            notes = self.storage.get_notes(results)
+        except Exception as e:
+            print(f"Error searching notes: {e}")
+            notes = []
+        finally:
+            # Pool threads expire when idle; don't leave their connections behind
+            self.storage.release_thread()
+        self.signals.finished.emit(self.generation, notes)
+
+
+class ExportWorker(QThread):
+    """Runs an export (Markdown notes by default) off the UI thread"""
+    progress = Signal(int, int)  # items written, total (0 if unknown)
+    done = Signal(int, str)  # items written, error message ("" on success)
+    cancelled = Signal()
+
+    def __init__(self, storage, output_file, export=None):
+        super().__init__()
+        self.storage = storage
+        self.output_file = output_file
+        # Called as export(output_file, progress=..., cancel_event=...)
+        self.export = export or storage.export_all_to_markdown
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            count = self.export(
+                self.output_file,
+                progress=lambda written, total: self.progress.emit(written, total),
+                cancel_event=self.cancel_event,
+            )
+            self.done.emit(count, "")
+        except ExportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.done.emit(0, str(e))
+        finally:
+            self.storage.release_thread()
+
+
 class MainWindow(QMainWindow):
+    notes_cleared = Signal()  # All notes were deleted from Settings
+    api_key_changed = Signal()  # A new API key was saved from Settings
+
     # Subject color palette
     SUBJECT_COLORS = [
         "#6C5CE7",  # Electric Indigo
@@ -224,16 +298,53 @@ class MainWindow(QMainWindow):
         "music": "🎵",
         "default": "📝"
     }
+
+    # Notes fetched per page; older pages load as the user scrolls down
+    PAGE_SIZE = 20
+
+    # Search runs this long after the last keystroke
+    SEARCH_DEBOUNCE_MS = 250
+    SEARCH_LIMIT = 50
     
-    def __init__(self, storage: NoteStorage, llm_service, persistent_bar=None):
+    def __init__(self, storage: NoteStorage, llm_service, persistent_bar=None, llm_bridge=None):
         super().__init__()
         self.storage = storage
         self.llm_service = llm_service
+        # Runs LLM requests on the shared event loop (see app.ai.bridge)
+        self.llm_bridge = llm_bridge or LLMBridge(llm_service)
+        self.llm_bridge.flashcards_generated.connect(self._on_flashcards_generated)
+        self._flashcard_requests = {}  # request id -> (note, flashcards layout)
+        self._partial_widgets = {}  # request id -> card for a note still being generated
         self.persistent_bar = persistent_bar  # Reference to persistent overlay bar
         self.setWindowTitle("FlowNotes")
         self.resize(1100, 750)
         self.current_subject = None
         self.subject_colors = {}  # Cache for subject colors
+        self._last_note_id = None  # Cursor for the next page of notes
+        self._has_more_notes = False
+
+        # Search state: results are keyed by (subject, note id) so a new query
+        # only adds/removes the cards that changed
+        self._search_generation = 0
+        self._search_widgets = {}
+        self._search_task = None
+        self.search_pool = QThreadPool(self)
+        self.search_pool.setMaxThreadCount(1)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self._start_search)
+
+        # Watch the note store so edits from another instance or a sync tool
+        # show up; events are coalesced since one save can touch several files
+        self._first_page_ids = []
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.fileChanged.connect(self._on_storage_changed)
+        self.fs_watcher.directoryChanged.connect(self._on_storage_changed)
+        self.fs_refresh_timer = QTimer(self)
+        self.fs_refresh_timer.setSingleShot(True)
+        self.fs_refresh_timer.setInterval(300)
+        self.fs_refresh_timer.timeout.connect(self._refresh_from_disk)
         
         # Apply Deep Space theme
         self.setStyleSheet("""
@@ -359,6 +470,11 @@ class MainWindow(QMainWindow):
         self.export_button.setCursor(Qt.PointingHandCursor)
         self.export_button.setStyleSheet(btn_style)
         self.export_button.clicked.connect(self.export_notes)
+
+        self.export_flashcards_button = QPushButton("🃏  Export Flashcards")
+        self.export_flashcards_button.setCursor(Qt.PointingHandCursor)
+        self.export_flashcards_button.setStyleSheet(btn_style)
+        self.export_flashcards_button.clicked.connect(self.export_flashcards)
         
         # Clipboard monitoring toggle with switch
         monitoring_container = QWidget()
@@ -423,6 +539,7 @@ class MainWindow(QMainWindow):
         self.sidebar_layout.addWidget(self.subject_list)
         self.sidebar_layout.addStretch() # Push buttons to bottom
         self.sidebar_layout.addWidget(self.export_button)
+        self.sidebar_layout.addWidget(self.export_flashcards_button)
         self.sidebar_layout.addWidget(monitoring_container)
         self.sidebar_layout.addWidget(self.show_overlay_button)
         self.sidebar_layout.addWidget(self.settings_button)
@@ -478,11 +595,43 @@ class MainWindow(QMainWindow):
         self.notes_layout.setContentsMargins(30, 30, 30, 30)
         self.notes_layout.setSpacing(20)
         self.notes_area.setWidget(self.notes_container)
+        self.notes_area.verticalScrollBar().valueChanged.connect(self._on_notes_scrolled)
+        self.notes_area.verticalScrollBar().rangeChanged.connect(self._fill_notes_viewport)
+
+        # Search bar above the notes
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("🔍  Search notes...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.setStyleSheet("""
+            QLineEdit {
+                background-color: #1F2330;
+                color: #DFE6E9;
+                border: 1px solid #2D3436;
+                border-radius: 10px;
+                padding: 10px 15px;
+                font-size: 13px;
+            }
+            QLineEdit:focus {
+                border: 1px solid #6C5CE7;
+                background-color: #252A3A;
+            }
+        """)
+        self.search_input.textChanged.connect(self._on_search_text_changed)
+
+        notes_panel = QWidget()
+        notes_panel_layout = QVBoxLayout(notes_panel)
+        notes_panel_layout.setContentsMargins(0, 20, 0, 0)
+        notes_panel_layout.setSpacing(0)
+        search_row = QHBoxLayout()
+        search_row.setContentsMargins(30, 0, 30, 0)
+        search_row.addWidget(self.search_input)
+        notes_panel_layout.addLayout(search_row)
+        notes_panel_layout.addWidget(self.notes_area)
 
         # Splitter
         splitter = QSplitter(Qt.Horizontal)
         splitter.addWidget(sidebar_widget)
-        splitter.addWidget(self.notes_area)
+        splitter.addWidget(notes_panel)
         splitter.setStretchFactor(1, 1)
         splitter.setStyleSheet("""
             QSplitter::handle {
@@ -499,7 +648,13 @@ class MainWindow(QMainWindow):
         self.loading_overlay.setGeometry(central_widget.rect())
 
         self.refresh_subjects()
+        self._watch_storage()
         
+    def showEvent(self, event):
+        """Pages loaded while hidden may not fill the view"""
+        super().showEvent(event)
+        QTimer.singleShot(0, self._fill_notes_viewport)
+
     def resizeEvent(self, event):
         """Resize loading overlay with window"""
         super().resizeEvent(event)
@@ -543,11 +698,18 @@ class MainWindow(QMainWindow):
     def load_notes_for_subject(self, item):
         subject = item.data(Qt.UserRole)
         self.current_subject = subject
-        self._display_notes_for_subject(subject)
+        self._watch_storage()
+        if self._is_searching():
+            # Keep the query and re-scope it to the newly selected subject
+            self._start_search()
+        else:
+            self._display_notes_for_subject(subject)
 
     def auto_refresh_subject(self, subject):
         """Auto-refresh notes for a specific subject when new content is added"""
-        if self.current_subject == subject:
+        if self._is_searching():
+            self._start_search()
+        elif self.current_subject == subject:
             self._display_notes_for_subject(subject)
         
         # Update subject list
@@ -558,14 +720,113 @@ class MainWindow(QMainWindow):
                 self.current_subject = subject
                 self._display_notes_for_subject(subject)
 
+    def show_subject(self, subject):
+        """Brings the window up on `subject`'s notes."""
+        self.show()
+        self.raise_()
+        items = self.subject_list.findItems(f"*{subject}", Qt.MatchWildcard)
+        if items:
+            self.subject_list.setCurrentItem(items[0])
+            self.load_notes_for_subject(items[0])
+
     def _display_notes_for_subject(self, subject):
-        """Internal method to display notes for a subject"""
-        notes = self.storage.get_notes_for_subject(subject)
+        """Internal method to display the newest page of notes for a subject"""
+        notes = self.storage.get_notes_for_subject(subject, limit=self.PAGE_SIZE)
+        self._first_page_ids = [note.get("id") for note in notes]
         
-        # Clear existing notes
+        self._clear_notes()
+        self._append_notes(subject, notes)
+        # Notes still being generated stay on top
+        for widget in self._partial_widgets.values():
+            self.notes_layout.insertWidget(0, widget)
+            widget.show()
+
+    def _watch_storage(self):
+        """(Re)watch the storage paths for the current subject"""
+        watched = self.fs_watcher.files() + self.fs_watcher.directories()
+        if watched:
+            self.fs_watcher.removePaths(watched)
+        paths = self.storage.watch_paths(self.current_subject)
+        if paths:
+            self.fs_watcher.addPaths(paths)
+
+    def _on_storage_changed(self, path):
+        self.fs_refresh_timer.start()
+
+    def _refresh_from_disk(self):
+        """Re-render the open subject if its newest notes changed on disk"""
+        # Replaced files drop out of the watch list, so add them back
+        self._watch_storage()
+        if self._is_searching():
+            self._start_search()
+            return
+        if not self.current_subject:
+            return
+        notes = self.storage.get_notes_for_subject(self.current_subject, limit=self.PAGE_SIZE)
+        if [note.get("id") for note in notes] != self._first_page_ids:
+            self._display_notes_for_subject(self.current_subject)
+
+    def _clear_notes(self):
         for i in reversed(range(self.notes_layout.count())): 
             self.notes_layout.itemAt(i).widget().setParent(None)
+        self._search_widgets = {}
+
+    def _is_searching(self):
+        return bool(self.search_input.text().strip())
+
+    def _on_search_text_changed(self, text):
+        """Restart the debounce timer; an empty query goes back to the subject view"""
+        if text.strip():
+            self.search_timer.start()
+            return
+        self.search_timer.stop()
+        self._search_generation += 1  # Drop any query still in flight
+        self.search_pool.clear()
+        if self.current_subject:
+            self._display_notes_for_subject(self.current_subject)
+        else:
+            self._clear_notes()
+
+    def _start_search(self):
+        """Run the current query on the search pool, cancelling stale ones"""
+        query = self.search_input.text().strip()
+        if not query:
+            return
+        self._search_generation += 1
+        self.search_pool.clear()  # Queued queries that never started
+        task = SearchTask(self.storage, query, self.current_subject, self._search_generation,
+                          lambda: self._search_generation)
+        task.signals.finished.connect(self._on_search_finished)
+        self._search_task = task  # Keep signals alive until delivery
+        self.search_pool.start(task)
 
+    def _on_search_finished(self, generation, notes):
+        """Render only the difference between the previous and new result set"""
+        if generation != self._search_generation or not self._is_searching():
+            return
+
+        if not self._search_widgets:
+            # Leaving the subject view: drop its cards first
+            self._clear_notes()
+        self._has_more_notes = False
+
+        keys = [(note.get("subject"), note.get("id")) for note in notes]
+        wanted = set(keys)
+        for key in list(self._search_widgets):
+            if key not in wanted:
+                self._search_widgets.pop(key).setParent(None)
+
+        for index, (key, note) in enumerate(zip(keys, notes)):
+            widget = self._search_widgets.get(key)
+            if widget is None:
+                widget = self.create_note_widget(note, self.get_subject_color(note.get("subject", "")))
+                self._search_widgets[key] = widget
+            if self.notes_layout.indexOf(widget) != index:
+                self.notes_layout.removeWidget(widget)
+                self.notes_layout.insertWidget(index, widget)
+
+    def _append_notes(self, subject, notes):
+        """Add note cards below the ones already shown and remember the page cursor"""
         subject_color = self.get_subject_color(subject)
         
         for note in notes:
@@ -581,7 +842,59 @@ class MainWindow(QMainWindow):
             fade_in.setEasingCurve(QEasingCurve.OutCubic)
             fade_in.start()
 
-    def create_note_widget(self, note, subject_color):
+        if notes:
+            self._last_note_id = notes[-1].get("id")
+        self._has_more_notes = len(notes) == self.PAGE_SIZE
+        if self._has_more_notes:
+            # The range may not change (e.g. stays 0), so check once the cards are laid out
+            QTimer.singleShot(0, self._fill_notes_viewport)
+
+    def _on_notes_scrolled(self, value):
+        """Load the next (older) page when the user scrolls near the bottom"""
+        scroll_bar = self.notes_area.verticalScrollBar()
+        if value >= scroll_bar.maximum() - 200:
+            self._load_more_notes()
+
+    def _fill_notes_viewport(self, *_):
+        """Keep loading pages while the cards shown don't reach the bottom of the view"""
+        if self.notes_area.isVisible():
+            self._on_notes_scrolled(self.notes_area.verticalScrollBar().value())
+
+    def _load_more_notes(self):
+        if not self.current_subject or not self._has_more_notes:
+            return
+        # Cleared first so a burst of scroll events can't fetch the same page twice
+        self._has_more_notes = False
+        notes = self.storage.get_notes_for_subject(
+            self.current_subject, limit=self.PAGE_SIZE, after=self._last_note_id
+        )
+        self._append_notes(self.current_subject, notes)
+
+    def show_partial_note(self, request_id, partial):
+        """Render (or re-render) a note that is still being generated at the top of the list"""
+        old = self._partial_widgets.pop(request_id, None)
+        if old is not None:
+            old.setParent(None)
+        if self._is_searching():
+            return  # Search results own the list
+
+        subject = partial.get('subject') or "..."
+        note = {
+            'timestamp': f"✨ Writing note · {subject}",
+            'summary': partial.get('summary') or "...",
+            'keyPoints': partial.get('keyPoints') or [],
+            'flashcards': partial.get('flashcards') or [],
+        }
+        widget = self.create_note_widget(note, self.get_subject_color(subject), preview=True)
+        self.notes_layout.insertWidget(0, widget)
+        self._partial_widgets[request_id] = widget
+
+    def remove_partial_note(self, request_id):
+        widget = self._partial_widgets.pop(request_id, None)
+        if widget is not None:
+            widget.setParent(None)
+
+    def create_note_widget(self, note, subject_color, preview=False):
         widget = QFrame()
         widget.setFrameShape(QFrame.StyledPanel)
         # Use a slightly lighter background for the card
@@ -645,8 +958,9 @@ class MainWindow(QMainWindow):
                 flashcards_layout.addWidget(flip_card)
             
             layout.addWidget(flashcards_container)
-            
-            # Generate More Flashcards button
+
+        if note.get('flashcards') and not preview:
+            # Generate More Flashcards button (not for a note still being written)
             more_fc_button = QPushButton("✨  Generate More Flashcards")
             more_fc_button.setCursor(Qt.PointingHandCursor)
             more_fc_button.setStyleSheet("""
@@ -688,49 +1002,33 @@ class MainWindow(QMainWindow):
         self.show_loading()
         
         # Generate flashcards in background
-        from PySide6.QtCore import QThread, Signal
-        
-        class FlashcardWorker(QThread):
-            finished = Signal(list)
-            
-            def __init__(self, llm_service, summary, key_points):
-                super().__init__()
-                self.llm_service = llm_service
-                self.summary = summary
-                self.key_points = key_points
-            
-            def run(self):
-                flashcards = self.llm_service.generate_more_flashcards(
-                    self.summary, self.key_points, count=4
-                )
-                self.finished.emit(flashcards)
-        
-        def on_flashcards_generated(flashcards):
-            self.hide_loading()
-            if flashcards:
-                # Add new flashcards to the layout with fade-in animation
-                for fc in flashcards:
-                    flip_card = FlipCard(fc.get('q'), fc.get('a'))
-                    flashcards_layout.addWidget(flip_card)
-                    
-                    # Fade-in animation
-                    flip_card.setWindowOpacity(0.0)
-                    fade_in = QPropertyAnimation(flip_card, b"windowOpacity")
-                    fade_in.setDuration(400)
-                    fade_in.setStartValue(0.0)
-                    fade_in.setEndValue(1.0)
-                    fade_in.setEasingCurve(QEasingCurve.OutCubic)
-                    fade_in.start()
+        request_id = self.llm_bridge.generate_more_flashcards(summary, key_points, count=4)
+        self._flashcard_requests[request_id] = (note, flashcards_layout)
+
+    def _on_flashcards_generated(self, request_id, flashcards):
+        note, flashcards_layout = self._flashcard_requests.pop(request_id, (None, None))
+        if note is None:
+            return
+        self.hide_loading()
+        if flashcards:
+            # Add new flashcards to the layout with fade-in animation
+            for fc in flashcards:
+                flip_card = FlipCard(fc.get('q'), fc.get('a'))
+                flashcards_layout.addWidget(flip_card)
                 
-                # Update the note data
-                if 'flashcards' not in note:
-                    note['flashcards'] = []
-                note['flashcards'].extend(flashcards)
-        
-        worker = FlashcardWorker(self.llm_service, summary, key_points)
-        worker.finished.connect(on_flashcards_generated)
-        worker.start()
-        self.flashcard_worker = worker  # Keep reference to prevent garbage collection
+                # Fade-in animation
+                flip_card.setWindowOpacity(0.0)
+                fade_in = QPropertyAnimation(flip_card, b"windowOpacity")
+                fade_in.setDuration(400)
+                fade_in.setStartValue(0.0)
+                fade_in.setEndValue(1.0)
+                fade_in.setEasingCurve(QEasingCurve.OutCubic)
+                fade_in.start()
+            
+            # Update the note data and persist it so the cards survive a reload
+            note['flashcards'] = note.get('flashcards', []) + flashcards
+            if note.get('id'):
+                self.storage.update_note(note['id'], {'flashcards': note['flashcards']})
 
     def open_settings(self):
         current_key = self.llm_service.api_key or ""
@@ -739,25 +1037,96 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             new_key = dialog.get_api_key()
             self.llm_service.set_api_key(new_key)
-            # Save key to config file (simplified for now)
+            # Save key to config file, keeping any provider settings
+            import json
+            config = {}
+            if os.path.exists("config.json"):
+                try:
+                    with open("config.json", "r") as f:
+                        config = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Error reading config: {e}")
+            config["api_key"] = new_key
             with open("config.json", "w") as f:
-                import json
-                json.dump({"api_key": new_key}, f)
+                json.dump(config, f)
+            self.api_key_changed.emit()
     
     def on_notes_cleared(self):
         """Refresh UI after notes are cleared"""
         self.current_subject = None
+        self._last_note_id = None
+        self._has_more_notes = False
         self.refresh_subjects()
         # Clear the notes display area
-        for i in reversed(range(self.notes_layout.count())): 
-            self.notes_layout.itemAt(i).widget().setParent(None)
+        self._clear_notes()
+        self.notes_cleared.emit()
 
     def export_notes(self):
-        try:
-            self.storage.export_all_to_markdown("all_notes.md")
-            QMessageBox.information(self, "Export Successful", "Notes exported to all_notes.md")
-        except Exception as e:
-            QMessageBox.critical(self, "Export Failed", str(e))
+        default_path = os.path.join(os.path.expanduser("~"), "all_notes.md")
+        output_file, _ = QFileDialog.getSaveFileName(self, "Export Notes", default_path, "Markdown (*.md)")
+        if not output_file:
+            return
+
+        self.export_progress = QProgressDialog("Exporting notes...", "Cancel", 0, 100, self)
+        self.export_progress.setWindowTitle("Export")
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(300)
+        self.export_progress.setValue(0)
+
+        worker = ExportWorker(self.storage, output_file)
+        worker.progress.connect(self._on_export_progress)
+        worker.done.connect(lambda count, error: self._on_export_done(output_file, count, error))
+        worker.cancelled.connect(self.export_progress.close)
+        self.export_progress.canceled.connect(worker.cancel)
+        worker.start()
+        self.export_worker = worker  # Keep reference to prevent garbage collection
+
+    def _on_export_progress(self, written, total):
+        if total:
+            self.export_progress.setValue(min(100, written * 100 // total))
+
+    def _on_export_done(self, output_file, count, error, what="notes"):
+        self.export_progress.close()
+        if error:
+            QMessageBox.critical(self, "Export Failed", error)
+        else:
+            QMessageBox.information(self, "Export Successful", f"Exported {count} {what} to {output_file}")
+
+    def export_flashcards(self):
+        subjects = None
+        if self.current_subject:
+            reply = QMessageBox.question(
+                self, "Export Flashcards",
+                f"Export only the flashcards from \"{self.current_subject}\"?\n"
+                "Choose No to export flashcards from all subjects.",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+            )
+            if reply == QMessageBox.Cancel:
+                return
+            if reply == QMessageBox.Yes:
+                subjects = [self.current_subject]
+
+        default_path = os.path.join(os.path.expanduser("~"), "flashcards.apkg")
+        output_file, _ = QFileDialog.getSaveFileName(
+            self, "Export Flashcards", default_path,
+            "Anki Deck (*.apkg);;CSV (*.csv);;TSV (*.tsv)",
+        )
+        if not output_file:
+            return
+
+        # The card count isn't known up front, so show a busy indicator
+        self.export_progress = QProgressDialog("Exporting flashcards...", "Cancel", 0, 0, self)
+        self.export_progress.setWindowTitle("Export")
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(300)
+
+        export = lambda path, **kwargs: self.storage.export_flashcards(path, subjects, **kwargs)
+        worker = ExportWorker(self.storage, output_file, export)
+        worker.done.connect(lambda count, error: self._on_export_done(output_file, count, error, "flashcards"))
+        worker.cancelled.connect(self.export_progress.close)
+        self.export_progress.canceled.connect(worker.cancel)
+        worker.start()
+        self.export_worker = worker  # Keep reference to prevent garbage collection
     
     
     def show_overlay_bar(self):
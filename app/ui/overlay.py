@@ -1,5 +1,5 @@
 from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QApplication
-from PySide6.QtCore import Qt, QTimer, QPropertyAnimation, QRect, Signal, QEasingCurve, QPoint
+from PySide6.QtCore import Qt, QTimer, QPropertyAnimation, QAbstractAnimation, QRect, Signal, QEasingCurve, QPoint
 from PySide6.QtGui import QColor, QPalette, QCursor, QMouseEvent
 
 class PersistentOverlayBar(QWidget):
@@ -136,6 +136,11 @@ class PersistentOverlayBar(QWidget):
         # Install event filter on container to prevent click propagation
         self.container.installEventFilter(self)
         
+        # Clips in progress and Gemini availability, shown in the status label
+        self.queue_depth = 0
+        self.api_state = "ok"
+        self.api_detail = ""
+        
         # Minimized state
         self.is_minimized = False
         self.full_width = 280
@@ -182,6 +187,38 @@ class PersistentOverlayBar(QWidget):
             font-weight: 500;
         """)
     
+    def set_queue_depth(self, depth):
+        """Show how many copied clips are waiting or being processed"""
+        self.queue_depth = depth
+        if self.api_state != "ok":
+            self.set_api_state(self.api_state, self.api_detail)
+            return
+        if depth <= 0:
+            self.set_ready()
+            return
+        self.set_processing()
+        if depth > 1:
+            self.status_label.setText(f"Processing {depth} clips...")
+
+    def set_api_state(self, state, detail=""):
+        """Show when Gemini calls are being retried ("retrying") or held back ("down")"""
+        self.api_state = state
+        self.api_detail = detail
+        if state == "ok":
+            self.set_queue_depth(self.queue_depth)
+            return
+        color = "#FDCB6E" if state == "retrying" else "#FF7675"
+        text = "Retrying..." if state == "retrying" else "API down"
+        if state == "down" and self.queue_depth > 0:
+            text += f" · {self.queue_depth} queued"
+        self.status_label.setText(text)
+        self.status_label.setToolTip(detail)
+        self.status_label.setStyleSheet(f"""
+            font-size: 11px;
+            color: {color};
+            font-weight: 600;
+        """)
+
     def on_open_clicked(self):
         print("Open button clicked")
         self.show_main_window.emit()
@@ -403,6 +440,7 @@ class OverlayWindow(QWidget):
 class DecisionOverlay(QWidget):
     """Overlay for user decisions (Move/Create subject)"""
     decision_made = Signal(str)  # "yes", "no", "create"
+    PREVIEW_CHARS = 160
 
     def __init__(self):
         super().__init__()
@@ -463,6 +501,19 @@ class DecisionOverlay(QWidget):
             font-family: 'Inter', 'Segoe UI', sans-serif;
         """)
 
+        # Preview of the note, filled in while it is still being generated
+        self.preview_label = QLabel("", self.container)
+        self.preview_label.setWordWrap(True)
+        self.preview_label.setStyleSheet("""
+            font-size: 12px;
+            color: #DFE6E9;
+            background-color: #161925;
+            border-radius: 8px;
+            padding: 8px 10px;
+            font-family: 'Inter', 'Segoe UI', sans-serif;
+        """)
+        self.preview_label.hide()
+
         # Buttons
         button_layout = QHBoxLayout()
         button_layout.setSpacing(10)
@@ -530,6 +581,7 @@ class DecisionOverlay(QWidget):
         self.container_layout.addWidget(self.title_label)
         self.container_layout.addWidget(self.question_label)
         self.container_layout.addWidget(self.reason_label)
+        self.container_layout.addWidget(self.preview_label)
         self.container_layout.addLayout(button_layout)
         self.layout.addWidget(self.container)
 
@@ -541,6 +593,7 @@ class DecisionOverlay(QWidget):
     def show_decision(self, question, reason):
         self.question_label.setText(question)
         self.reason_label.setText(reason)
+        self.preview_label.hide()
 
         # Disconnect any previous finished signal to prevent accidental hiding
         try:
@@ -567,6 +620,28 @@ class DecisionOverlay(QWidget):
         self.animation.setEndValue(QRect(x, y_end, self.width(), self.height()))
         self.animation.start()
 
+    def set_preview(self, note):
+        """Show the start of the summary and how much of the note is ready"""
+        summary = note.get("summary") or ""
+        if len(summary) > self.PREVIEW_CHARS:
+            summary = summary[:self.PREVIEW_CHARS].rstrip() + "..."
+        counts = []
+        if note.get("keyPoints"):
+            counts.append(f"{len(note['keyPoints'])} key points")
+        if note.get("flashcards"):
+            counts.append(f"{len(note['flashcards'])} flashcards")
+        text = summary or "Writing summary..."
+        if counts:
+            text += f"\n{' · '.join(counts)}"
+        self.preview_label.setText(text)
+        self.preview_label.show()
+
+        # Grow upwards so the overlay stays anchored to the bottom of the screen
+        if self.isVisible() and self.animation.state() != QAbstractAnimation.Running:
+            bottom = self.geometry().bottom()
+            self.adjustSize()
+            self.move(self.x(), bottom - self.height() + 1)
+
     def make_decision(self, decision):
         self.decision_made.emit(decision)
         self.hide_overlay()
@@ -1,28 +1,164 @@
-from PySide6.QtWidgets import QApplication
-from PySide6.QtGui import QClipboard
+import hashlib
+import sys
+from typing import Optional, Tuple
+
+from PySide6.QtGui import QClipboard, QGuiApplication
 from PySide6.QtCore import QObject, Signal, QTimer
 
+from app.utils.content_filter import CODE, DROP, ContentFilter
+
+try:
+    from AppKit import NSPasteboard  # pyobjc; lets macOS polling skip reading the clipboard
+except ImportError:
+    NSPasteboard = None
+
+# Texts are hashed in slices this long, so a huge clip is never encoded in one go
+HASH_SLICE_CHARS = 1 << 16
+
+
+def fingerprint(text: str) -> Tuple[int, bytes]:
+    """Length plus a streaming BLAKE2b digest of `text`; equal fingerprints mean equal text."""
+    digest = hashlib.blake2b(digest_size=16)
+    for start in range(0, len(text), HASH_SLICE_CHARS):
+        digest.update(text[start:start + HASH_SLICE_CHARS].encode("utf-8", "surrogatepass"))
+    return len(text), digest.digest()
+
+
 class ClipboardMonitor(QObject):
+    """
+    Emits text_copied for each new, substantial text copy, or code_copied
+    if it looks like source code. Copies first pass through `content_filter`,
+    which drops junk (lone tokens, URLs, stack traces, shell commands) and
+    masks secrets, so neither reaches the LLM.
+
+    Qt's dataChanged notification is used wherever it fires. Polling covers
+    for it where it doesn't (macOS only notifies while the app is active):
+    the interval starts at MIN_INTERVAL_MS after activity and backs off to
+    MAX_INTERVAL_MS while the clipboard is idle. On other platforms, once
+    dataChanged has proved to work, polling drops to a rare SAFETY_INTERVAL_MS
+    check, and goes back to normal if that ever catches a change the
+    notification missed. Nothing runs while paused.
+
+    Clips are compared by fingerprint (length + hash) rather than kept and
+    compared as strings; on macOS with pyobjc the pasteboard change count is
+    checked first, so an idle poll doesn't read the clipboard at all.
+    """
     text_copied = Signal(str)
+    code_copied = Signal(str)
 
-    def __init__(self):
+    MIN_INTERVAL_MS = 250
+    MAX_INTERVAL_MS = 4000
+    SAFETY_INTERVAL_MS = 30000
+    BACKOFF = 1.5
+    # Shorter copies are ignored
+    MIN_CHARS = 10
+
+    def __init__(self, content_filter: Optional[ContentFilter] = None):
         super().__init__()
-        self.clipboard = QApplication.clipboard()
-        self.last_text = ""
-        
-        # We can use dataChanged signal, but sometimes it fires multiple times or for non-text
+        self.clipboard = QGuiApplication.clipboard()
+        self.content_filter = content_filter or ContentFilter()
+        self.enabled = True
+        self.checks = 0  # Clipboard reads, for diagnostics
+        self._last_fingerprint: Optional[Tuple[int, bytes]] = None
+        self._last_change_count = None
+        # Whether dataChanged is known to arrive for every copy on this platform
+        self._native_reliable = False
+        self._native_trusted = sys.platform != "darwin"
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setSingleShot(True)
+        self._poll_timer.timeout.connect(self._poll)
+        self._interval = self.MIN_INTERVAL_MS
+
+        # dataChanged can fire several times per copy, or for non-text; the fingerprint filters both
         self.clipboard.dataChanged.connect(self.on_clipboard_change)
+        self._take_baseline()
+        self._schedule_poll()
+
+    def set_enabled(self, enabled: bool):
+        """Pausing stops polling and ignores notifications; resuming skips whatever was copied meanwhile."""
+        self.enabled = enabled
+        if not enabled:
+            self._poll_timer.stop()
+            return
+        self._take_baseline()
+        self._interval = self.MIN_INTERVAL_MS
+        self._schedule_poll()
 
     def on_clipboard_change(self):
-        mime_data = self.clipboard.mimeData()
-        if mime_data.hasText():
-            text = mime_data.text().strip()
-            # Only process text that's substantial (more than 10 characters)
-            if text and text != self.last_text and len(text) > 10:
-                self.last_text = text
-                print(f"Clipboard detected: {text[:50]}...")  # Debug output
-                self.text_copied.emit(text)
+        if not self.enabled:
+            return
+        if self._check() and self._native_trusted:
+            # The notification got there first: polling is only a safety net here
+            self._native_reliable = True
+            self._schedule_poll()
 
     def manual_check(self):
         # Fallback if signal doesn't work reliably in some environments
-        self.on_clipboard_change()
+        if self.enabled:
+            self._check()
+
+    def _change_count(self):
+        if NSPasteboard is None:
+            return None
+        return NSPasteboard.generalPasteboard().changeCount()
+
+    def _read(self) -> Optional[str]:
+        self.checks += 1
+        mime_data = self.clipboard.mimeData()
+        if mime_data is None or not mime_data.hasText():
+            return None
+        return mime_data.text()
+
+    def _take_baseline(self):
+        self._last_change_count = self._change_count()
+        text = self._read()
+        self._last_fingerprint = fingerprint(text) if text is not None else None
+
+    def _check(self) -> bool:
+        """Reads the clipboard and emits text_copied if it holds new text. True if it changed."""
+        change_count = self._change_count()
+        if change_count is not None:
+            if change_count == self._last_change_count:
+                return False
+            self._last_change_count = change_count
+        text = self._read()
+        if text is None:
+            return False
+        current = fingerprint(text)
+        if current == self._last_fingerprint:
+            return False
+        self._last_fingerprint = current
+        text = text.strip()
+        # Only process text that's substantial (more than 10 characters)
+        if len(text) > self.MIN_CHARS:
+            self._emit(text)
+        # Activity: poll eagerly for a while in case more copies follow
+        self._interval = self.MIN_INTERVAL_MS
+        return True
+
+    def _emit(self, text: str):
+        result = self.content_filter.check(text)
+        if result.verdict == DROP:
+            print(f"Clipboard skipped ({', '.join(result.rules)})")
+            return
+        print(f"Clipboard detected: {result.text[:50]}...")  # Debug output
+        if result.verdict == CODE:
+            self.code_copied.emit(result.text)
+        else:
+            self.text_copied.emit(result.text)
+
+    def _schedule_poll(self):
+        if self.enabled:
+            self._poll_timer.start(int(self.SAFETY_INTERVAL_MS if self._native_reliable else self._interval))
+
+    def _poll(self):
+        if not self.enabled:
+            return
+        if self._check():
+            if self._native_reliable:
+                # A poll caught what the notification missed; keep polling from now on
+                self._native_reliable = False
+        else:
+            self._interval = min(self.MAX_INTERVAL_MS, self._interval * self.BACKOFF)
+        self._schedule_poll()
@@ -0,0 +1,287 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Verdicts, strongest first: a dropped clip never reaches the LLM, a redacted one
+# goes with its secrets masked, and code is sent with a code-specific prompt
+DROP = "drop"
+REDACT = "redact"
+CODE = "code"
+PASS = "pass"
+
+
+class FilterResult:
+    def __init__(self, verdict: str, text: str, rules: List[str]):
+        self.verdict = verdict
+        self.text = text  # Redacted if any secrets were found
+        self.rules = rules  # Names of the rules that fired
+
+    def __repr__(self):
+        return f"FilterResult({self.verdict!r}, rules={self.rules!r})"
+
+
+class Rule:
+    """
+    One detector. check() returns the spans to redact (for REDACT rules) or
+    a non-empty list to say the rule fired; an empty list means no match.
+    """
+
+    def __init__(self, name: str, verdict: str):
+        self.name = name
+        self.verdict = verdict
+
+    def check(self, text: str) -> List[Tuple[int, int]]:
+        raise NotImplementedError
+
+
+class RegexRule(Rule):
+    def __init__(self, name: str, verdict: str, pattern: str, flags: int = 0, group: int = 0):
+        super().__init__(name, verdict)
+        self.pattern = re.compile(pattern, flags)
+        # For REDACT rules, the group holding the secret (e.g. the value after "password=")
+        self.group = group
+
+    def check(self, text: str) -> List[Tuple[int, int]]:
+        return [m.span(self.group) for m in self.pattern.finditer(text)]
+
+
+def shannon_entropy(token: str) -> float:
+    """Bits per character."""
+    counts = Counter(token)
+    length = len(token)
+    return -sum(c / length * math.log2(c / length) for c in counts.values())
+
+
+class EntropyRule(Rule):
+    """Long, random-looking tokens (keys, tokens, passwords) that no fixed pattern knows."""
+    TOKEN_RE = re.compile(r"[A-Za-z0-9+/=_\-.~]{20,}")
+
+    def __init__(self, name: str = "high_entropy_token", verdict: str = REDACT, threshold: float = 4.0):
+        super().__init__(name, verdict)
+        self.threshold = threshold
+
+    def check(self, text: str) -> List[Tuple[int, int]]:
+        spans = []
+        for match in self.TOKEN_RE.finditer(text):
+            token = match.group()
+            # Long words, numbers and paths aren't secrets; random tokens mix letters and digits
+            if token.count("/") > 1 or not (any(c.isdigit() for c in token) and any(c.isalpha() for c in token)):
+                continue
+            if shannon_entropy(token) >= self.threshold:
+                spans.append(match.span())
+        return spans
+
+
+# Common English words: prose is full of them, code and data are not
+_PROSE_WORDS = frozenset("""
+the a an and or of to in is are was were be been it this that these those for on with as by at from
+not but which who what when where how why can will would should could may might has have had do does
+""".split())
+_WORD_RE = re.compile(r"[A-Za-z']+")
+_CODE_LINE_RE = re.compile(
+    r"""^\s*(?:
+        (?:def|class|import|from\s+\S+\s+import|return|elif|except|try:|finally:|lambda|async\s+def|await)\b
+      | (?:function|const|let|var|export|public|private|protected|static|void|int|fn|func|package|using|namespace)\b
+      | \#include\b | \#!/ | @\w+
+      | (?:if|for|while|switch)\s*\(
+      | [}\])]+[;,]?\s*$
+    )
+    | (?:{|=>|->|\):)\s*$
+    | [(){}\[\]=].*;\s*$  # A ";" only ends a statement on a line with code punctuation, not a list item
+    """,
+    re.VERBOSE,
+)
+
+
+class LuhnRule(RegexRule):
+    """Card-number-shaped digit runs that also pass the Luhn checksum."""
+
+    def check(self, text: str) -> List[Tuple[int, int]]:
+        return [(s, e) for s, e in super().check(text) if _luhn_valid(re.sub(r"\D", "", text[s:e]))]
+
+
+def _luhn_valid(digits: str) -> bool:
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        n = int(d)
+        if i % 2:
+            n = n * 2 - 9 if n > 4 else n * 2
+        total += n
+    return total % 10 == 0
+
+
+class CodeRule(Rule):
+    """Source code: many lines that look like statements, few everyday words."""
+
+    def __init__(self, name: str = "source_code", verdict: str = CODE, min_lines: int = 3,
+                 line_ratio: float = 0.4, max_prose_ratio: float = 0.2):
+        super().__init__(name, verdict)
+        self.min_lines = min_lines
+        self.line_ratio = line_ratio
+        self.max_prose_ratio = max_prose_ratio
+
+    def check(self, text: str) -> List[Tuple[int, int]]:
+        lines = [line for line in text.splitlines() if line.strip()]
+        if len(lines) < self.min_lines:
+            return []
+        code_lines = sum(1 for line in lines if _CODE_LINE_RE.search(line))
+        if code_lines / len(lines) < self.line_ratio:
+            return []
+        words = _WORD_RE.findall(text.lower())
+        if words and sum(1 for w in words if w in _PROSE_WORDS) / len(words) > self.max_prose_ratio:
+            return []
+        return [(0, len(text))]
+
+
+class NoiseRule(Rule):
+    """
+    Clips that are mostly symbols, or hex dumps. Tables of numbers are data
+    worth a note, so digits count as content here.
+    """
+    HEX_TOKEN_RE = re.compile(r"(?:0x)?[0-9A-Fa-f]{2,}:?")
+
+    def __init__(self, name: str = "mostly_symbols", verdict: str = DROP, min_alnum_ratio: float = 0.5,
+                 min_hex_tokens: int = 16):
+        super().__init__(name, verdict)
+        self.min_alnum_ratio = min_alnum_ratio
+        self.min_hex_tokens = min_hex_tokens
+
+    def check(self, text: str) -> List[Tuple[int, int]]:
+        visible = [c for c in text if not c.isspace()]
+        if not visible:
+            return []
+        alnum = sum(1 for c in visible if c.isalnum())
+        if alnum / len(visible) < self.min_alnum_ratio:
+            return [(0, len(text))]
+        # Hex dumps: nearly every token is hex, and many use the letters a-f (plain numbers don't)
+        tokens = text.split()
+        hex_tokens = [t for t in tokens if self.HEX_TOKEN_RE.fullmatch(t)]
+        if (len(tokens) >= self.min_hex_tokens and len(hex_tokens) >= 0.9 * len(tokens)
+                and sum(1 for t in hex_tokens if re.search(r"[A-Fa-f]", t.lstrip("0x"))) >= 0.3 * len(hex_tokens)):
+            return [(0, len(text))]
+        return []
+
+
+class ShellCommandRule(Rule):
+    """
+    A clip of one to three lines that are each a shell command: after a
+    prompt ("$ ", "> ", "PS C:\\>"), or a known command with shell syntax
+    (flags, paths, pipes, redirects, &&). Lines that read like sentences
+    never count, so prose that starts with "python", "git" or "make" is kept.
+    """
+    PROMPT_RE = re.compile(r"^\s*(?:\$ |> |PS [A-Z]:\\[^>]*> )\S")
+    COMMAND_RE = re.compile(
+        r"^\s*(?:sudo\s+)?(?:git|cd|ls|pip3?|npm|npx|yarn|docker|kubectl|curl|wget|ssh|scp|chmod|chown|brew|"
+        r"apt(?:-get)?|python3?|node|make|export|rm|mv|cp|cat|grep)\s")
+    SYNTAX_RE = re.compile(r"\s--?[A-Za-z]|(?:^|\s)(?:~|\.{1,2})?/|\w/[\w.]|\\\w|\||&&|[<>]|\w=\S")
+    QUOTED_RE = re.compile(r"'[^']*'|\"[^\"]*\"")
+    SENTENCE_END_RE = re.compile(r"\w[.!?][\"')\]]*\s*$")
+
+    def __init__(self, name: str = "shell_command", verdict: str = DROP, max_lines: int = 3):
+        super().__init__(name, verdict)
+        self.max_lines = max_lines
+
+    def is_command(self, line: str) -> bool:
+        bare = self.QUOTED_RE.sub("''", line)  # Commit messages and echo text aren't evidence of prose
+        if self.SENTENCE_END_RE.search(bare) or ", " in bare:
+            return False
+        if sum(1 for w in _WORD_RE.findall(bare.lower()) if w in _PROSE_WORDS) >= 2:
+            return False
+        if self.PROMPT_RE.match(line):
+            return True
+        return bool(self.COMMAND_RE.match(line) and self.SYNTAX_RE.search(bare))
+
+    def check(self, text: str) -> List[Tuple[int, int]]:
+        lines = [line for line in text.splitlines() if line.strip()]
+        if not lines or len(lines) > self.max_lines:
+            return []
+        return [(0, len(text))] if all(self.is_command(line) for line in lines) else []
+
+
+def default_rules() -> List[Rule]:
+    return [
+        # Nothing to study: a lone token (password, URL, path, identifier), traces, commands
+        RegexRule("single_token", DROP, r"\A\s*\S{1,300}\s*\Z"),
+        RegexRule("urls_only", DROP, r"\A\s*(?:(?:https?|ftp|file)://\S+\s*)+\Z", re.IGNORECASE),
+        RegexRule("stack_trace", DROP,
+                  r"Traceback \(most recent call last\):|^Exception in thread \"|(?:^\s+at \S+ ?\(.*\)\s*$\n?){3,}",
+                  re.MULTILINE),
+        ShellCommandRule(),
+        NoiseRule(),
+        # Secrets are masked, the rest of the clip still goes through
+        RegexRule("private_key", REDACT,
+                  r"-----BEGIN [A-Z ]*PRIVATE KEY-----.*?(?:-----END [A-Z ]*PRIVATE KEY-----|\Z)", re.DOTALL),
+        RegexRule("aws_access_key", REDACT, r"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b"),
+        RegexRule("google_api_key", REDACT, r"\bAIza[0-9A-Za-z_\-]{35}\b"),
+        RegexRule("github_token", REDACT, r"\b(?:gh[pousr]_[A-Za-z0-9]{36,}|github_pat_[A-Za-z0-9_]{22,})\b"),
+        RegexRule("openai_key", REDACT, r"\bsk-(?:proj-)?[A-Za-z0-9_\-]{20,}"),
+        RegexRule("slack_token", REDACT, r"\bxox[abposr]-[A-Za-z0-9\-]{10,}"),
+        RegexRule("jwt", REDACT, r"\beyJ[A-Za-z0-9_\-]{8,}\.eyJ[A-Za-z0-9_\-]{8,}\.[A-Za-z0-9_\-]{8,}"),
+        RegexRule("credential_assignment", REDACT,
+                  r"(?i:\b(?:password|passwd|pwd|secret|token|api[_\-]?key|access[_\-]?key)\b)\s*[:=]\s*"
+                  r"[\"']?([^\s\"']{4,})", group=1),
+        LuhnRule("credit_card", REDACT, r"\b(?:\d[ \-]?){12,15}\d\b"),
+        EntropyRule(),
+        # Left for last: only clips that survived everything above can be code
+        CodeRule(),
+    ]
+
+
+class ContentFilter:
+    """
+    Screens copied text before it is sent to the LLM. Rules are checked in
+    order; the first DROP rule that fires ends the check, every REDACT rule's
+    matches are masked, and a CODE rule marks the clip as source code (its
+    text is still redacted). All patterns are compiled once, up front.
+    `hits` counts how often each rule fired.
+    """
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        self.rules = list(rules) if rules is not None else default_rules()
+        self.hits: Dict[str, int] = {rule.name: 0 for rule in self.rules}
+        self.checked = 0
+
+    def add_rule(self, rule: Rule, index: Optional[int] = None):
+        self.rules.insert(len(self.rules) if index is None else index, rule)
+        self.hits.setdefault(rule.name, 0)
+
+    def check(self, text: str) -> FilterResult:
+        self.checked += 1
+        fired: List[str] = []
+        spans: List[Tuple[int, int, str]] = []
+        verdict = PASS
+        for rule in self.rules:
+            matches = rule.check(text)
+            if not matches:
+                continue
+            fired.append(rule.name)
+            self.hits[rule.name] = self.hits.get(rule.name, 0) + 1
+            if rule.verdict == DROP:
+                return FilterResult(DROP, text, fired)
+            if rule.verdict == REDACT:
+                spans.extend((start, end, rule.name) for start, end in matches)
+                verdict = REDACT if verdict == PASS else verdict
+            elif rule.verdict == CODE:
+                verdict = CODE
+        if spans:
+            text = self._redact(text, spans)
+        return FilterResult(verdict, text, fired)
+
+    @staticmethod
+    def _redact(text: str, spans: List[Tuple[int, int, str]]) -> str:
+        # Merge overlapping matches, then rebuild the text once
+        spans.sort()
+        merged: List[List] = []
+        for start, end, name in spans:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end, name])
+        parts, last = [], 0
+        for start, end, name in merged:
+            parts.append(text[last:start])
+            parts.append(f"[REDACTED {name}]")
+            last = end
+        parts.append(text[last:])
+        return "".join(parts)
@@ -0,0 +1,225 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Pure Python signatures are slower on long clips, but work the same
+    np = None
+
+# Signature layout: NUM_PERM minimum hashes, 16 bits each (b-bit MinHash), banded for LSH.
+# 16 bands of 4 rows make a pair with Jaccard similarity 0.8 a candidate >99.9% of the time.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+_PRIME = (1 << 31) - 1
+_WORD_RE = re.compile(r"\w+")
+
+Signature = Tuple[int, ...]
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> List[str]:
+    """Overlapping runs of `size` lower-cased words (the whole text if it is shorter)."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return list({" ".join(words[i:i + size]) for i in range(len(words) - size + 1)})
+
+
+class MinHasher:
+    """MinHash signatures over word shingles, with NUM_PERM seeded universal hash functions."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self.b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+        if np is not None:
+            self._a = np.array(self.a, dtype=np.uint64)[:, None]
+            self._b = np.array(self.b, dtype=np.uint64)[:, None]
+
+    def signature(self, text: str) -> Optional[Signature]:
+        """None for text without words."""
+        grams = shingles(text)
+        if not grams:
+            return None
+        base = [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little") % _PRIME
+                for g in grams]
+        if np is not None:
+            values = (self._a * np.array(base, dtype=np.uint64)[None, :] + self._b) % _PRIME
+            return tuple(int(v) & 0xFFFF for v in values.min(axis=1))
+        return tuple(min((a * x + b) % _PRIME for x in base) & 0xFFFF for a, b in zip(self.a, self.b))
+
+
+def signature_to_hex(signature: Signature) -> str:
+    return "".join(f"{v:04x}" for v in signature)
+
+
+def signature_from_hex(value: str) -> Optional[Signature]:
+    if not value or len(value) != NUM_PERM * 4:
+        return None
+    try:
+        return tuple(int(value[i:i + 4], 16) for i in range(0, len(value), 4))
+    except ValueError:
+        return None
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of the two texts' shingle sets."""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+_hasher: Optional[MinHasher] = None
+
+
+def source_signature(text: str) -> Optional[str]:
+    """Hex MinHash signature of a clip, as stored with the note made from it."""
+    global _hasher
+    if _hasher is None:
+        _hasher = MinHasher()
+    signature = _hasher.signature(text)
+    return signature_to_hex(signature) if signature is not None else None
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of MinHash signatures for recently copied clips and for the
+    sources of stored notes. query() looks up the bands of a signature and
+    verifies candidates, so a lookup touches only a handful of entries no
+    matter how many notes there are.
+
+    Recent clips are forgotten after `recent_ttl` seconds or once more than
+    `recent_size` have been added; notes stay until removed.
+    """
+
+    def __init__(self, threshold: float = 0.8, recent_size: int = 200, recent_ttl: float = 600):
+        self.threshold = threshold
+        self.recent_size = recent_size
+        self.recent_ttl = recent_ttl
+        self.hasher = MinHasher()
+        self.hits = 0
+        self._entries: Dict[str, Tuple[Signature, Dict]] = {}
+        self._bands: List[Dict[Tuple[int, ...], set]] = [{} for _ in range(BANDS)]
+        self._recent: "OrderedDict[str, float]" = OrderedDict()  # key -> time added
+        self._clip_ids = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def signature(self, text: str) -> Optional[Signature]:
+        return self.hasher.signature(text)
+
+    @staticmethod
+    def _band_keys(signature: Signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS]
+
+    def _add(self, key: str, signature: Signature, payload: Dict):
+        self._remove(key)
+        self._entries[key] = (signature, payload)
+        for band, band_key in self._band_keys(signature):
+            self._bands[band].setdefault(band_key, set()).add(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._recent.pop(key, None)
+        for band, band_key in self._band_keys(entry[0]):
+            bucket = self._bands[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._bands[band][band_key]
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.recent_ttl
+        while self._recent:
+            key, added = next(iter(self._recent.items()))
+            if added >= cutoff and len(self._recent) <= self.recent_size:
+                break
+            self._remove(key)
+
+    def add_clip(self, signature: Signature, length: int = 0) -> str:
+        """Remembers a clip (of `length` characters) that is being turned into a note; returns its key."""
+        with self._lock:
+            self._clip_ids += 1
+            key = f"clip:{self._clip_ids}"
+            self._add(key, signature, {"kind": "clip", "length": length})
+            self._recent[key] = time.monotonic()
+            self._expire()
+            return key
+
+    def forget_clip(self, signature: Optional[Signature]):
+        """Drops recent clips matching `signature` (e.g. after processing failed, so a retry goes through)."""
+        if signature is None:
+            return
+        with self._lock:
+            for key in [k for k in self._recent if self._entries[k][0] == signature]:
+                self._remove(key)
+
+    def forget_text(self, text: str):
+        """forget_clip() for a clip's text, e.g. once it was cancelled or superseded without a note."""
+        self.forget_clip(self.signature(text))
+
+    def add_note(self, note: Dict):
+        signature = signature_from_hex(note.get("source_minhash", ""))
+        if signature is None or not note.get("id"):
+            return
+        payload = {"kind": "note", "id": note["id"], "subject": note.get("subject", "Other"),
+                   "summary": note.get("summary", "")}
+        with self._lock:
+            self._add(f"note:{note['id']}", signature, payload)
+
+    def load_notes(self, storage):
+        """Indexes every stored note that has a source signature, a page at a time."""
+        for subject in storage.get_subjects():
+            for notes in storage.iter_notes(subject):
+                for note in notes:
+                    self.add_note(note)
+
+    def clear_notes(self):
+        with self._lock:
+            for key in [k for k, (_, payload) in self._entries.items() if payload["kind"] == "note"]:
+                self._remove(key)
+
+    def check_clip(self, text: str) -> Optional[Tuple[float, Dict]]:
+        """
+        The (similarity, entry) a newly copied `text` duplicates, or None, in
+        which case it is remembered as a recent clip. Matching a stored note
+        always counts; matching a recent clip only if `text` isn't longer,
+        since a longer copy is a widened selection that should replace it.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        match = self.query(signature)
+        if match is not None and (match[1]["kind"] == "note" or len(text) <= match[1]["length"]):
+            return match
+        self.add_clip(signature, len(text))
+        return None
+
+    def query(self, signature: Signature) -> Optional[Tuple[float, Dict]]:
+        """The most similar indexed clip or note at or above the threshold, as (similarity, payload)."""
+        with self._lock:
+            self._expire()
+            candidates = set()
+            for band, band_key in self._band_keys(signature):
+                candidates |= self._bands[band].get(band_key, set())
+            best = None
+            for key in candidates:
+                score = similarity(signature, self._entries[key][0])
+                # Prefer a note over a recent clip at equal similarity; notes can be linked to
+                rank = (score, self._entries[key][1]["kind"] == "note")
+                if score >= self.threshold and (best is None or rank > best[0]):
+                    best = (rank, self._entries[key][1])
+            if best is None:
+                return None
+            self.hits += 1
+            return best[0][0], dict(best[1])
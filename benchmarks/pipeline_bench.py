@@ -0,0 +1,182 @@
+"""
+Pipeline benchmark: pushes synthetic clipboard clips through LLMService and
+NoteStorage against a mock model, with no network needed.
+
+    python -m benchmarks.pipeline_bench                                   # in-process mock
+    python -m benchmarks.pipeline_bench --clips 500 --failure-rate 0.05 --stream
+    python -m benchmarks.pipeline_bench --serve                           # through the HTTP mock server
+    python -m benchmarks.pipeline_bench --provider openai --base-url http://127.0.0.1:8080/v1
+
+Clips arrive --interval-ms apart, the way copies would; each one is routed,
+written up and saved. Reports end-to-end latency (copy to saved note),
+time to the first streamed field, throughput, and how many calls were
+retried or failed. Results are written as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks.storage_bench import _sentence, _summarize
+
+
+def make_clip(rng: random.Random, min_words: int, max_words: int) -> str:
+    """Copied text: a few paragraphs of filler sentences."""
+    target = rng.randint(min_words, max_words)
+    sentences, words = [], 0
+    while words < target:
+        length = rng.randint(6, 18)
+        sentences.append(_sentence(rng, length))
+        words += length
+    paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+    return "\n\n".join(paragraphs)
+
+
+def build_provider(args):
+    """(provider to benchmark, mock server or None, MockProvider or None)"""
+    from app.ai.providers import MockProvider, OpenAICompatibleProvider
+
+    if args.provider == "openai":
+        return OpenAICompatibleProvider(args.base_url, args.model or "local-model"), None, None
+    mock = MockProvider(latency=args.latency, jitter=args.jitter, chars_per_second=args.chars_per_second,
+                        failure_rate=args.failure_rate, rate_limit_rate=args.rate_limit_rate,
+                        retry_after=args.retry_after, seed=args.seed)
+    if not args.serve:
+        return mock, None, mock
+    from app.ai.mock_server import make_server
+
+    server = make_server(mock, port=0)
+    threading.Thread(target=server.serve_forever, name="MockServer", daemon=True).start()
+    host, port = server.server_address[:2]
+    url = f"http://{host}:{port}/v1"
+    return OpenAICompatibleProvider(url, mock.model_name, mock.routing_model_name), server, mock
+
+
+async def run_pipeline(args, provider, mock=None) -> Dict:
+    from app.ai.llm_service import LLMService
+    from app.ai.resilience import ApiGuard
+    from app.notes.storage import NoteStorage
+
+    rng = random.Random(args.seed)
+    clips = [make_clip(rng, args.min_words, args.max_words) for _ in range(args.clips)]
+    subjects = [f"Subject {i:02d}" for i in range(args.subjects)]
+    guard = ApiGuard(requests_per_minute=args.rpm, burst=max(1, args.concurrency * 2),
+                     backoff_base=args.backoff_base, backoff_cap=max(args.backoff_base * 8, args.retry_after))
+    service = LLMService(provider=provider, guard=guard, max_concurrency=args.concurrency)
+
+    base_dir = tempfile.mkdtemp(prefix="flownotes-pipeline-")
+    storage = NoteStorage(os.path.join(base_dir, "notes"), engine=args.engine, write_behind=True)
+    latencies: List[float] = []
+    first_fields: List[float] = []
+    errors = 0
+
+    async def one(index: int, text: str):
+        nonlocal errors
+        await asyncio.sleep(index * args.interval_ms / 1000)
+        start = time.perf_counter()
+        seen = []
+
+        def on_partial(partial: Dict):
+            if not seen:
+                seen.append(time.perf_counter() - start)
+
+        current = subjects[index % len(subjects)] if subjects else None
+        result = await service.process_text(text, current, subjects, on_partial if args.stream else None)
+        if result.get("action") == "error":
+            errors += 1
+            return
+        storage.save_note({**result, "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")})
+        latencies.append(time.perf_counter() - start)
+        first_fields.extend(seen)
+
+    try:
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(i, clip) for i, clip in enumerate(clips)))
+        await asyncio.to_thread(storage.flush)
+        wall = time.perf_counter() - wall_start
+        storage.close()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+    result = {
+        "clips": args.clips,
+        "notes_saved": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "notes_per_s": round(len(latencies) / wall, 2) if wall else None,
+        "retries": guard.retries,
+        "reasks": service.reasks,
+        "breaker_state": guard.breaker.state,
+    }
+    if latencies:
+        result["end_to_end"] = _summarize(latencies)
+    if first_fields:
+        result["first_field"] = _summarize(first_fields)
+    if mock is not None:
+        result["provider_calls"] = mock.calls
+        result["injected_failures"] = mock.failures
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the clipboard-to-note pipeline against a mock model.")
+    parser.add_argument("--provider", choices=["mock", "openai"], default="mock")
+    parser.add_argument("--serve", action="store_true", help="run the mock behind the local HTTP server")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8765/v1", help="for --provider openai")
+    parser.add_argument("--model", help="for --provider openai")
+    parser.add_argument("--clips", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=20, help="time between copies")
+    parser.add_argument("--min-words", type=int, default=60)
+    parser.add_argument("--max-words", type=int, default=400)
+    parser.add_argument("--subjects", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=6000, help="request limiter rate")
+    parser.add_argument("--stream", action="store_true", help="stream note generation")
+    parser.add_argument("--engine", choices=["sqlite", "json"], default="sqlite")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--chars-per-second", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--backoff-base", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", default="pipeline_bench.json")
+    args = parser.parse_args(argv)
+
+    provider, server, mock = build_provider(args)
+    try:
+        result = asyncio.run(run_pipeline(args, provider, mock))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    for key, value in result.items():
+        if isinstance(value, dict):
+            print(f"  {key:<18} p50 {value['p50_ms']:.1f} ms   p95 {value['p95_ms']:.1f} ms   max {value['max_ms']:.1f} ms")
+        else:
+            print(f"  {key:<18} {value}")
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "result": result,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Storage benchmark: builds synthetic note libraries and times NoteStorage.
+
+    python -m benchmarks.storage_bench                       # 1k / 10k / 100k notes, both engines
+    python -m benchmarks.storage_bench --sizes 1000 --engines sqlite -o before.json
+    python -m benchmarks.storage_bench --sizes 1000 --engines sqlite --baseline before.json
+
+Every (engine, size) run happens in its own subprocess, so peak RSS is that
+run's alone. Results are written as JSON; with --baseline, each timing is also
+printed next to the matching one from an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+WORDS = (
+    "cell membrane protein enzyme energy molecule reaction equation force mass velocity "
+    "theorem proof integral derivative matrix vector history empire treaty revolution economy "
+    "market demand supply language grammar syntax algorithm memory network signal theory "
+    "evidence experiment variable function structure process system pattern model analysis"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_note(rng: random.Random, subject: str, timestamp: datetime) -> Dict:
+    """A note shaped like the ones LLMService produces, with random filler text."""
+    return {
+        "subject": subject,
+        "timestamp": timestamp.strftime("%Y-%m-%d %H:%M"),
+        "action": "keep",
+        "reason": "Matches current topic",
+        "summary": " ".join(_sentence(rng, rng.randint(8, 16)) for _ in range(rng.randint(2, 5))),
+        "keyPoints": [_sentence(rng, rng.randint(5, 12)) for _ in range(rng.randint(3, 6))],
+        "flashcards": [
+            {"q": _sentence(rng, rng.randint(5, 10))[:-1] + "?", "a": _sentence(rng, rng.randint(3, 12))}
+            for _ in range(rng.randint(2, 8))
+        ],
+    }
+
+
+def _summarize(samples: List[float]) -> Dict:
+    """Totals and percentiles (in milliseconds) for per-call timings in seconds."""
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        "calls": len(samples),
+        "total_s": round(sum(samples), 4),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "p50_ms": round(pct(0.50), 4),
+        "p95_ms": round(pct(0.95), 4),
+        "p99_ms": round(pct(0.99), 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def _timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_benchmark(engine: str, size: int, subjects: int, seed: int, page_size: int,
+                  reads: int, write_behind: bool) -> Dict:
+    """Builds a library of `size` notes in a temporary directory and times each operation on it."""
+    rng = random.Random(seed)
+    subject_names = [f"Subject {i:03d}" for i in range(subjects)]
+    base_dir = tempfile.mkdtemp(prefix="flownotes-bench-")
+    result = {"engine": engine, "notes": size, "subjects": subjects, "write_behind": write_behind}
+    try:
+        from app.notes.storage import NoteStorage
+
+        storage = NoteStorage(os.path.join(base_dir, "notes"), engine=engine, write_behind=write_behind)
+        start_time = datetime(2024, 1, 1)
+        notes = (make_note(rng, rng.choice(subject_names), start_time + timedelta(minutes=i)) for i in range(size))
+
+        save_samples = []
+        wall_start = time.perf_counter()
+        for note in notes:
+            save_samples.append(_timed(storage.save_note, note))
+        flush_time = _timed(storage.flush)
+        result["save_note"] = _summarize(save_samples)
+        result["save_note"]["wall_s"] = round(time.perf_counter() - wall_start, 4)
+        result["save_note"]["flush_s"] = round(flush_time, 4)
+        result["save_note"]["notes_per_s"] = round(size / (time.perf_counter() - wall_start), 1)
+
+        result["get_subjects"] = _summarize([_timed(storage.get_subjects) for _ in range(reads)])
+
+        # Cold reads use a fresh subject each time; warm ones repeat one (the page cache applies)
+        picks = [rng.choice(subject_names) for _ in range(reads)]
+        storage.cache.invalidate()
+        result["get_notes_for_subject_page"] = _summarize(
+            [_timed(storage.get_notes_for_subject, s, limit=page_size) for s in picks]
+        )
+        result["get_notes_for_subject_page_warm"] = _summarize(
+            [_timed(storage.get_notes_for_subject, picks[0], limit=page_size) for _ in range(reads)]
+        )
+        storage.cache.invalidate()
+        result["get_notes_for_subject_all"] = _summarize(
+            [_timed(storage.get_notes_for_subject, s) for s in picks[:max(1, reads // 10)]]
+        )
+
+        export_path = os.path.join(base_dir, "export.md")
+        result["export_all_to_markdown"] = {"total_s": round(_timed(storage.export_all_to_markdown, export_path), 4),
+                                            "bytes": os.path.getsize(export_path)}
+        result["clear_all_notes"] = {"total_s": round(_timed(storage.clear_all_notes), 4)}
+        storage.close()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    result["peak_rss_bytes"] = _peak_rss_bytes()
+    return result
+
+
+def _run_child(args, engine: str, size: int) -> Dict:
+    """Runs one benchmark in a fresh interpreter so its peak RSS isn't shared with other runs."""
+    cmd = [
+        sys.executable, "-m", "benchmarks.storage_bench", "--child",
+        "--engines", engine, "--sizes", str(size), "--subjects", str(args.subjects),
+        "--seed", str(args.seed), "--page-size", str(args.page_size), "--reads", str(args.reads),
+    ]
+    if args.write_behind:
+        cmd.append("--write-behind")
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(cmd, cwd=repo_root, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(out)
+
+
+def _print_result(result: Dict, baseline: Optional[Dict]):
+    label = f"{result['engine']:>6} {result['notes']:>7} notes"
+    for op, stats in result.items():
+        if not isinstance(stats, dict):
+            continue
+        line = f"{label}  {op:<34} {stats['total_s']:>9.3f}s"
+        if "p95_ms" in stats:
+            line += f"  p95 {stats['p95_ms']:>8.3f}ms"
+        previous = (baseline or {}).get(op)
+        if previous and previous.get("total_s"):
+            line += f"  ({stats['total_s'] / previous['total_s']:.2f}x baseline)"
+        print(line)
+    if result.get("peak_rss_bytes"):
+        print(f"{label}  {'peak RSS':<34} {result['peak_rss_bytes'] / 2 ** 20:>8.1f}MB")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark NoteStorage on synthetic note libraries.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--engines", nargs="+", default=["sqlite", "json"])
+    parser.add_argument("--subjects", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=200, help="calls per read benchmark")
+    parser.add_argument("--write-behind", action="store_true", help="save through the background writer")
+    parser.add_argument("-o", "--output", default="storage_bench.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        result = run_benchmark(args.engines[0], args.sizes[0], args.subjects, args.seed,
+                               args.page_size, args.reads, args.write_behind)
+        print(json.dumps(result))
+        return
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            for r in json.load(f)["results"]:
+                baseline[(r["engine"], r["notes"], r.get("write_behind", False))] = r
+
+    results = []
+    for engine in args.engines:
+        for size in args.sizes:
+            result = _run_child(args, engine, size)
+            results.append(result)
+            _print_result(result, baseline.get((engine, size, args.write_behind)))
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "config": {k: v for k, v in vars(args).items() if k not in ("child", "output", "baseline")},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
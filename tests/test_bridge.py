@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+
+from app.ai.bridge import LLMBridge  # noqa: E402
+from app.ai.resilience import ApiGuard  # noqa: E402
+
+
+class BrokenService:
+    """Raises where LLMService would have returned a result."""
+
+    def __init__(self):
+        self.guard = ApiGuard()
+
+    async def process_text(self, text, current_subject, existing_subjects, on_partial=None, kind="text"):
+        raise RuntimeError("bug")
+
+    async def generate_more_flashcards(self, summary, key_points, count):
+        raise RuntimeError("bug")
+
+
+@pytest.fixture
+def bridge():
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])  # noqa: F841
+    bridge = LLMBridge(BrokenService())
+    yield bridge
+    bridge.close()
+
+
+def wait_for(received, timeout=5):
+    """Delivers queued signals (results hop threads) until something arrives."""
+    deadline = time.monotonic() + timeout
+    while not received and time.monotonic() < deadline:
+        QtCore.QCoreApplication.processEvents()
+        time.sleep(0.01)
+
+
+def test_an_unexpected_exception_still_answers_with_an_error_result(bridge):
+    received = []
+    bridge.text_processed.connect(lambda request_id, result: received.append((request_id, result)))
+    request_id = bridge.process_text("mitosis")
+    wait_for(received)
+    assert received[0][0] == request_id
+    assert received[0][1]["action"] == "error" and received[0][1]["subject"] == "Error"
+    assert bridge.pending == 0
+
+
+def test_failed_flashcard_requests_answer_with_no_cards(bridge):
+    received = []
+    bridge.flashcards_generated.connect(lambda request_id, cards: received.append(cards))
+    bridge.generate_more_flashcards("summary", [])
+    wait_for(received)
+    assert received == [[]]
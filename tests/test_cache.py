@@ -0,0 +1,87 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from app.notes.cache import NoteCache
+from app.notes.engines import JsonEngine
+from app.notes.storage import NoteStorage
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    storage = NoteStorage(str(tmp_path / "notes"), engine=request.param)
+    yield storage
+    storage.close()
+
+
+def save(storage, summary="Cells divide"):
+    return storage.save_note({"subject": "Biology", "summary": summary, "keyPoints": ["mitosis"],
+                              "flashcards": [{"q": "What divides?", "a": "Cells"}]})
+
+
+def test_repeated_reads_are_served_from_the_cache(storage):
+    save(storage)
+    storage.get_notes_for_subject("Biology", limit=10)
+    hits = storage.cache.hits
+    storage.get_notes_for_subject("Biology", limit=10)
+    assert storage.cache.hits == hits + 1
+
+
+def test_update_note_invalidates(storage):
+    note_id = save(storage)
+    storage.get_notes_for_subject("Biology", limit=10)
+    storage.update_note(note_id, {"summary": "Cells split"})
+    assert storage.get_notes_for_subject("Biology", limit=10)[0]["summary"] == "Cells split"
+
+
+def test_changes_made_outside_the_process_invalidate(storage):
+    note_id = save(storage)
+    assert storage.get_notes_for_subject("Biology", limit=10)[0]["summary"] == "Cells divide"
+
+    if isinstance(storage.engine, JsonEngine):
+        # Edited in place: the directory listing doesn't change, only the file
+        path = os.path.join(storage.base_dir, "Biology", f"{note_id}.json")
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        data["summary"] = "Edited elsewhere"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    else:
+        conn = sqlite3.connect(storage.engine.db_path)
+        with conn:
+            conn.execute("UPDATE notes SET summary = 'Edited elsewhere' WHERE uid = ?", (note_id,))
+        conn.close()
+
+    assert storage.get_notes_for_subject("Biology", limit=10)[0]["summary"] == "Edited elsewhere"
+
+
+def test_callers_get_copies_of_cached_notes(storage):
+    save(storage)
+    first = storage.get_notes_for_subject("Biology", limit=10)
+    first[0]["summary"] = "changed"
+    first[0]["flashcards"].append({"q": "extra", "a": "card"})
+    first.clear()
+
+    again = storage.get_notes_for_subject("Biology", limit=10)
+    assert again[0]["summary"] == "Cells divide"
+    assert again[0]["flashcards"] == [{"q": "What divides?", "a": "Cells"}]
+
+
+def test_cache_entries_miss_on_a_new_token_and_respect_the_size_limit():
+    cache = NoteCache(max_bytes=2000)
+    note = {"summary": "x" * 500}
+    cache.put("a", "Bio", 1, [note])
+    assert cache.get("a", 1) == [note]
+    assert cache.get("a", 2) is None
+    assert cache.get("a", 1) is None  # Dropped on the stale lookup
+    cache.put("a", "Bio", 1, [note])
+    cache.put("b", "Bio", 1, [note])
+    cache.put("c", "Chem", 1, [note])
+    assert cache.get("a", 1) is None and cache.get("c", 1) is not None
+    assert cache.size <= cache.max_bytes
+    cache.invalidate("Chem")
+    assert cache.get("c", 1) is None
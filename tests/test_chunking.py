@@ -0,0 +1,27 @@
+from app.ai.chunking import split_text
+
+
+def test_short_text_is_one_chunk():
+    assert split_text("One paragraph.\n\nAnother one.") == ["One paragraph.\n\nAnother one."]
+
+
+def test_paragraphs_are_packed_up_to_the_limit():
+    text = "\n\n".join(["word " * 5] * 5)
+    chunks = split_text(text, max_words=10)
+    assert [len(c.split()) for c in chunks] == [10, 10, 5]
+
+
+def test_closing_quotes_and_brackets_stay_with_their_sentence():
+    text = ('He said "stop." Then he left. (It rained.) She asked “why?” '
+            'Nobody knew [see note 3.] The end!')
+    chunks = split_text(text, max_words=4)
+    assert " ".join(chunks) == text
+    assert chunks[0] == 'He said "stop."'
+    assert '(It rained.)' in chunks
+
+
+def test_long_sentences_are_split_into_word_runs():
+    text = " ".join(f"w{i}" for i in range(25)) + "."
+    chunks = split_text(text, max_words=10)
+    assert [len(c.split()) for c in chunks] == [10, 10, 5]
+    assert " ".join(chunks) == text
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta
+
+from app.ai.journal import DONE, FAILED, PROCESSING, QUEUED, IngestionJournal
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_replay_restores_unfinished_clips(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = IngestionJournal(path)
+    queued = journal.add("first clip")
+    processing = journal.add("second clip", kind="code")
+    done = journal.add("third clip")
+    journal.mark(processing, PROCESSING)
+    journal.mark(done, PROCESSING)
+    journal.mark(done, DONE, outcome="saved", note_id="01X")
+    # Simulate a crash: the file is not closed (and so not compacted)
+    journal._file.flush()
+
+    reopened = IngestionJournal(path)
+    pending = reopened.pending()
+    assert [e["id"] for e in pending] == [queued, processing]
+    # Left "processing" by the crash, so back to queued
+    assert [e["state"] for e in pending] == [QUEUED, QUEUED]
+    assert pending[1]["kind"] == "code" and pending[1]["text"] == "second clip"
+    reopened.close()
+
+
+def test_replay_skips_a_line_cut_short(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = IngestionJournal(str(path))
+    entry = journal.add("clip")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "' + entry + '", "sta')
+    reopened = IngestionJournal(str(path))
+    assert [e["id"] for e in reopened.pending()] == [entry]
+    reopened.close()
+
+
+def test_compaction_drops_finished_entries(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = IngestionJournal(path)
+    keep = journal.add("keep")
+    for i in range(3):
+        entry = journal.add(f"done {i}")
+        journal.mark(entry, DONE, outcome="saved")
+    journal.close()
+    assert [(r["id"], r["state"]) for r in read_lines(path)] == [(keep, QUEUED)]
+
+
+def test_failed_entries_retry_until_out_of_attempts(tmp_path):
+    journal = IngestionJournal(str(tmp_path / "journal.jsonl"), max_attempts=2)
+    entry = journal.add("clip")
+    journal.mark(entry, FAILED, error="timeout")
+    assert journal.can_retry(entry) and len(journal.pending()) == 1
+    journal.mark(entry, FAILED, error="timeout")
+    assert not journal.can_retry(entry)
+    assert journal.pending() == []
+    assert journal.counts()[FAILED] == 1
+    journal.close()
+
+
+def test_prune_keeps_only_recent_exhausted_failures(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = IngestionJournal(path, max_attempts=1)
+    ids = []
+    for i in range(4):
+        ids.append(journal.add(f"clip {i}"))
+        journal.mark(ids[-1], FAILED, error="bad")
+    queued = journal.add("still queued")
+    journal.close()
+
+    # Age the first failure past the TTL
+    records = read_lines(path)
+    old = (datetime.now() - timedelta(days=40)).isoformat(timespec="seconds")
+    for record in records:
+        if record["id"] == ids[0]:
+            record["failed_at"] = old
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(r) + "\n" for r in records)
+
+    # Past the TTL
+    reopened = IngestionJournal(path, max_attempts=1, keep_failed=10, failed_ttl_days=30)
+    assert reopened.counts() == {QUEUED: 1, PROCESSING: 0, FAILED: 3}
+    assert reopened.get(ids[0]) is None
+    reopened.close()
+
+    # Beyond the count
+    reopened = IngestionJournal(path, max_attempts=1, keep_failed=2, failed_ttl_days=30)
+    assert reopened.counts() == {QUEUED: 1, PROCESSING: 0, FAILED: 2}
+    assert reopened.get(queued) is not None
+    reopened.close()
+
+
+def test_legacy_journal_is_moved(tmp_path):
+    legacy = str(tmp_path / "notes" / "ingest_journal.jsonl")
+    old = IngestionJournal(legacy)
+    entry = old.add("clip")
+    old.close()
+
+    journal = IngestionJournal(str(tmp_path / "cache" / "ingest_journal.jsonl"), legacy_path=legacy)
+    assert [e["id"] for e in journal.pending()] == [entry]
+    assert not (tmp_path / "notes" / "ingest_journal.jsonl").exists()
+    journal.close()
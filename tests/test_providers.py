@@ -0,0 +1,39 @@
+import asyncio
+
+from app.ai.providers import GeminiProvider
+
+
+class Chunk:
+    def __init__(self, text=None):
+        self._text = text
+
+    @property
+    def text(self):
+        # As in google-generativeai: no text parts (safety-blocked or final chunk) raises
+        if self._text is None:
+            raise ValueError("The `response.text` quick accessor only works when the response contains a "
+                             "valid `Part`")
+        return self._text
+
+
+class FakeModel:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        async def chunks():
+            for chunk in self.chunks:
+                yield chunk
+        return chunks()
+
+
+def collect(provider):
+    async def run():
+        return [text async for text in provider.stream("prompt")]
+    return asyncio.run(run())
+
+
+def test_gemini_stream_skips_chunks_without_text():
+    provider = GeminiProvider()
+    provider.model = FakeModel([Chunk('{"summary": '), Chunk(None), Chunk(""), Chunk('"x"}'), Chunk(None)])
+    assert collect(provider) == ['{"summary": ', '"x"}']
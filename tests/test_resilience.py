@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.ai.resilience import STATE_DOWN, STATE_OK, STATE_RETRYING, ApiGuard
+
+
+class Flaky:
+    """Fails with `errors` in turn, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+
+    async def __call__(self):
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def make_guard(max_attempts=3):
+    guard = ApiGuard(requests_per_minute=6000, burst=100, max_attempts=max_attempts, backoff_base=0.001,
+                     backoff_cap=0.001, failure_threshold=10)
+    states = []
+    guard.on_state_change = lambda state, detail: states.append(state)
+    return guard, states
+
+
+def test_retry_then_success_reports_ok():
+    guard, states = make_guard()
+    assert asyncio.run(guard.call(Flaky(ConnectionError()), timeout=1)) == "ok"
+    assert states == [STATE_RETRYING, STATE_OK]
+
+
+def test_running_out_of_attempts_reports_down():
+    guard, states = make_guard(max_attempts=2)
+    with pytest.raises(ConnectionError):
+        asyncio.run(guard.call(Flaky(ConnectionError(), ConnectionError()), timeout=1))
+    assert states == [STATE_RETRYING, STATE_DOWN]
+
+
+def test_vetoed_retry_does_not_stay_retrying():
+    guard, states = make_guard()
+    allowed = iter([True, False])
+    with pytest.raises(ConnectionError):
+        asyncio.run(guard.call(Flaky(ConnectionError(), ConnectionError()), timeout=1,
+                               can_retry=lambda: next(allowed)))
+    assert states == [STATE_RETRYING, STATE_OK]
+
+
+def test_non_transient_error_after_retrying_reports_ok():
+    guard, states = make_guard()
+    with pytest.raises(ValueError):
+        asyncio.run(guard.call(Flaky(ConnectionError(), ValueError("bad request")), timeout=1))
+    assert states == [STATE_RETRYING, STATE_OK]
@@ -0,0 +1,199 @@
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+
+from app.ai.journal import FAILED, QUEUED, IngestionJournal  # noqa: E402
+from app.ai.resilience import STATE_OK  # noqa: E402
+from app.ai.scheduler import IngestionScheduler  # noqa: E402
+
+ERROR = {"subject": "Error", "action": "error", "summary": "timed out"}
+
+
+class FakeService:
+    configured = True
+
+
+class FakeBridge(QtCore.QObject):
+    """Records requests instead of calling a model; tests answer them with finish()."""
+    text_processed = QtCore.Signal(int, dict)
+    text_partial = QtCore.Signal(int, dict)
+    api_state_changed = QtCore.Signal(str, str)
+
+    def __init__(self):
+        super().__init__()
+        self.llm_service = FakeService()
+        self.sent = {}  # request id -> text
+        self.cancelled = []
+        self._next_id = 0
+
+    def process_text(self, text, current_subject, existing_subjects, stream=False, kind="text"):
+        self._next_id += 1
+        self.sent[self._next_id] = text
+        return self._next_id
+
+    def cancel(self, request_id):
+        self.cancelled.append(request_id)
+
+    def finish(self, request_id, result=None):
+        self.text_processed.emit(request_id, result or {"subject": "Bio", "action": "keep", "summary": "ok"})
+
+
+class Clock:
+    """
+    Stands in for the passage of time: the scheduler's single-shot timers
+    are never left to run, the test expires them.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def debounce(self):
+        assert self.scheduler._timer.isActive()
+        self.scheduler._timer.stop()
+        self.scheduler._dispatch()
+
+    def retry_delay(self):
+        timer = self.scheduler._retry_timer
+        return timer.interval() if timer.isActive() else None
+
+    def retry(self):
+        assert self.scheduler._retry_timer.isActive()
+        self.scheduler._retry_timer.stop()
+        self.scheduler.retry_now()
+
+
+@pytest.fixture(scope="module")
+def qt_app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def bridge(qt_app):
+    return FakeBridge()
+
+
+def make_scheduler(bridge, **kwargs):
+    scheduler = IngestionScheduler(bridge, lambda: ("Bio", ["Bio"]), **kwargs)
+    events = {"results": [], "dropped": [], "discarded": []}
+    scheduler.result_ready.connect(lambda request_id, result: events["results"].append(request_id))
+    scheduler.request_dropped.connect(events["dropped"].append)
+    scheduler.clip_discarded.connect(events["discarded"].append)
+    return scheduler, Clock(scheduler), events
+
+
+def test_clips_wait_out_the_debounce(bridge):
+    scheduler, clock, events = make_scheduler(bridge)
+    scheduler.submit("mitosis is cell division")
+    assert bridge.sent == {} and scheduler.depth == 1
+    clock.debounce()
+    assert list(bridge.sent.values()) == ["mitosis is cell division"]
+    bridge.finish(1)
+    assert events["results"] == [1] and scheduler.depth == 0
+
+
+def test_a_growing_selection_replaces_the_waiting_clip(bridge):
+    scheduler, clock, events = make_scheduler(bridge)
+    scheduler.submit("mitosis is")
+    scheduler.submit("mitosis is   cell division")  # Contains the first, once whitespace is collapsed
+    scheduler.submit("photosynthesis")  # Unrelated: kept
+    clock.debounce()
+    assert list(bridge.sent.values()) == ["mitosis is   cell division", "photosynthesis"]
+    assert scheduler.coalesced == 1
+    assert events["discarded"] == ["mitosis is"]
+
+
+def test_an_overlapping_copy_cancels_the_request_in_flight(bridge):
+    scheduler, clock, events = make_scheduler(bridge)
+    scheduler.submit("mitosis is cell division")
+    clock.debounce()
+    scheduler.submit("mitosis is cell division in eukaryotes")
+    assert bridge.cancelled == [1] and events["dropped"] == [1] and scheduler.cancelled == 1
+    bridge.finish(1)  # A late answer for the cancelled request is ignored
+    assert events["results"] == []
+    clock.debounce()
+    assert bridge.sent[2] == "mitosis is cell division in eukaryotes"
+
+
+def test_at_most_max_in_flight_requests(bridge):
+    scheduler, clock, events = make_scheduler(bridge, max_in_flight=2)
+    for text in ("alpha", "beta", "gamma"):
+        scheduler.submit(text)
+    clock.debounce()
+    assert list(bridge.sent.values()) == ["alpha", "beta"]
+    bridge.finish(1)
+    assert bridge.sent[3] == "gamma"
+
+
+def test_nothing_is_sent_until_the_backend_is_configured(bridge):
+    bridge.llm_service.configured = False
+    scheduler, clock, events = make_scheduler(bridge)
+    scheduler.submit("mitosis")
+    clock.debounce()
+    assert bridge.sent == {} and scheduler.depth == 1
+    bridge.llm_service.configured = True
+    scheduler.resume()
+    assert list(bridge.sent.values()) == ["mitosis"]
+
+
+def test_failures_are_deferred_with_growing_backoff(bridge, tmp_path):
+    journal = IngestionJournal(str(tmp_path / "journal.jsonl"), max_attempts=3)
+    scheduler, clock, events = make_scheduler(bridge, journal=journal)
+    scheduler.submit("mitosis")
+    clock.debounce()
+    entry_id = scheduler._sent[1]
+
+    bridge.finish(1, ERROR)
+    assert events["results"] == [] and events["dropped"] == [1]
+    assert journal.get(entry_id)["state"] == FAILED and scheduler.depth == 1
+    assert clock.retry_delay() == IngestionScheduler.RETRY_BASE_MS
+
+    clock.retry()
+    assert bridge.sent[2] == "mitosis"
+    bridge.finish(2, ERROR)
+    assert clock.retry_delay() == 2 * IngestionScheduler.RETRY_BASE_MS
+
+    # Out of attempts: the error is passed on and the entry stays failed
+    clock.retry()
+    bridge.finish(3, ERROR)
+    assert events["results"] == [3] and clock.retry_delay() is None
+    assert journal.get(entry_id)["state"] == FAILED and journal.pending() == []
+    journal.close()
+
+
+def test_the_api_recovering_retries_at_once(bridge, tmp_path):
+    journal = IngestionJournal(str(tmp_path / "journal.jsonl"))
+    scheduler, clock, events = make_scheduler(bridge, journal=journal)
+    scheduler.submit("mitosis")
+    clock.debounce()
+    bridge.finish(1, ERROR)
+    bridge.api_state_changed.emit(STATE_OK, "")
+    assert bridge.sent[2] == "mitosis" and clock.retry_delay() is None
+    journal.close()
+
+
+def test_complete_finishes_the_journal_entry(bridge, tmp_path):
+    journal = IngestionJournal(str(tmp_path / "journal.jsonl"))
+    scheduler, clock, events = make_scheduler(bridge, journal=journal)
+    scheduler.submit("mitosis")
+    clock.debounce()
+    bridge.finish(1)
+    assert len(journal.pending()) == 1  # Not done until the note is saved
+    scheduler.complete(1, "01NOTE")
+    assert journal.pending() == []
+    journal.close()
+
+
+def test_pausing_keeps_journaled_clips_for_later(bridge, tmp_path):
+    journal = IngestionJournal(str(tmp_path / "journal.jsonl"))
+    scheduler, clock, events = make_scheduler(bridge, journal=journal)
+    scheduler.submit("mitosis")
+    clock.debounce()
+    scheduler.submit("photosynthesis")
+    scheduler.set_paused(True)
+    assert bridge.cancelled == [1] and scheduler.depth == 0
+    assert [e["state"] for e in journal.pending()] == [QUEUED, QUEUED]
+
+    scheduler.set_paused(False)
+    assert sorted(bridge.sent.values())[-2:] == ["mitosis", "photosynthesis"]
+    assert len(bridge.sent) == 3
+    journal.close()
@@ -0,0 +1,73 @@
+import pytest
+
+from app.notes.search import InvertedIndex, find_hits, note_search_fields, query_terms
+from app.notes.storage import NoteStorage
+
+
+def fields(summary, key_points=(), flashcards=()):
+    return note_search_fields({"summary": summary, "keyPoints": list(key_points), "flashcards": list(flashcards)})
+
+
+def test_removing_documents_drops_empty_postings_and_terms():
+    index = InvertedIndex()
+    index.add("a", "Bio", fields("mitosis splits cells"))
+    index.add("b", "Bio", fields("meiosis splits cells"))
+    index.add("a", "Bio", fields("photosynthesis"))  # Re-indexing removes the old terms
+    assert "mitosis" not in index.postings and "mitosis" not in index.terms
+    assert index.postings["splits"] == {"b": 1}
+
+    index.remove("a")
+    index.remove("b")
+    assert index.postings == {} and index.terms == []
+    assert index.total_length == 0
+
+
+def test_bm25_ranks_frequent_terms_in_short_documents_first():
+    index = InvertedIndex()
+    index.add("long", "Bio", fields("the cell " + "filler " * 30))
+    index.add("short", "Bio", fields("cell cell membrane"))
+    index.add("other", "Chem", fields("acids and bases"))
+    ranked = index.search(["cell"])
+    assert [key for key, _ in ranked] == ["short", "long"]
+    assert ranked[0][1] > ranked[1][1] > 0
+
+
+def test_all_terms_must_match_and_the_last_is_a_prefix():
+    index = InvertedIndex()
+    index.add("a", "Bio", fields("cell membrane"))
+    index.add("b", "Bio", fields("cell wall"))
+    index.add("c", "Chem", fields("cell membrane potential"))
+    assert sorted(k for k, _ in index.search(["cell", "mem"])) == ["a", "c"]
+    assert [k for k, _ in index.search(["cell", "mem"], subject="Chem")] == ["c"]
+    assert index.search(["cell", "nucleus"]) == []
+
+
+def test_hit_offsets_point_into_each_field():
+    note_fields = fields("Café culture", ["first point", "second café"], [{"q": "Where?", "a": "A cafe"}])
+    hits = find_hits(note_fields, query_terms("cafe"))
+    assert hits == [
+        {"field": "summary", "start": 0, "end": 4},
+        {"field": "keyPoints", "start": 19, "end": 23},
+        {"field": "flashcards", "start": 9, "end": 13},
+    ]
+    for hit in hits:
+        assert note_fields[hit["field"]][hit["start"]:hit["end"]].lower() in ("café", "cafe")
+
+
+@pytest.mark.parametrize("engine", ["json", "sqlite"])
+def test_storage_search_ranks_and_reports_hits(tmp_path, engine):
+    storage = NoteStorage(str(tmp_path / "notes"), engine=engine)
+    strong = storage.save_note({"subject": "Bio", "summary": "Mitosis: mitosis makes two cells",
+                                "keyPoints": ["mitosis phases"], "flashcards": []})
+    weak = storage.save_note({"subject": "Bio", "summary": "Cell division includes mitosis and many other things "
+                                                           "worth remembering for the exam",
+                              "keyPoints": [], "flashcards": []})
+    storage.save_note({"subject": "Chem", "summary": "Acids", "keyPoints": [], "flashcards": []})
+
+    results = storage.search("mitos")
+    assert [r["id"] for r in results] == [strong, weak]
+    assert results[0]["score"] > results[1]["score"]
+    assert results[0]["hits"][0] == {"field": "summary", "start": 0, "end": 7}
+    assert {"field": "keyPoints", "start": 0, "end": 7} in results[0]["hits"]
+    assert storage.search("mitosis", subject="Chem") == []
+    storage.close()
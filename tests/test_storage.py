@@ -0,0 +1,178 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.notes.engines import SCHEMA, SCHEMA_VERSION, SEARCH_SCHEMA, SqliteEngine
+from app.notes.storage import NoteStorage
+
+ENGINES = ["json", "sqlite"]
+
+
+def make_note(subject="Biology", summary="Cells divide", **fields):
+    note = {"subject": subject, "summary": summary, "keyPoints": ["mitosis"],
+            "flashcards": [{"q": "What divides?", "a": "Cells"}]}
+    note.update(fields)
+    return note
+
+
+@pytest.fixture(params=ENGINES)
+def storage(request, tmp_path):
+    storage = NoteStorage(str(tmp_path / "notes"), engine=request.param)
+    yield storage
+    storage.close()
+
+
+def test_saving_an_existing_id_replaces_the_note(storage):
+    note = make_note()
+    note_id = storage.save_note(note)
+    storage.save_note(dict(note, summary="Cells split", keyPoints=["meiosis"], flashcards=[]))
+
+    assert storage.count_notes() == 1
+    saved = storage.get_note(note_id)
+    assert saved["summary"] == "Cells split"
+    assert saved["keyPoints"] == ["meiosis"] and saved["flashcards"] == []
+    assert [r["id"] for r in storage.search("split")] == [note_id]
+    assert storage.search("divide") == []
+
+
+def test_resaving_under_another_subject_moves_the_note(storage):
+    note = make_note()
+    note_id = storage.save_note(note)
+    storage.save_note(dict(note, subject="Chemistry"))
+
+    assert storage.count_notes() == 1
+    assert storage.get_notes_for_subject("Biology") == []
+    assert [n["id"] for n in storage.get_notes_for_subject("Chemistry")] == [note_id]
+
+
+def test_save_and_read_back(storage):
+    bio = [storage.save_note(make_note(summary=f"bio {i}")) for i in range(3)]
+    chem = storage.save_note(make_note(subject="Chemistry", summary="acids", mood="curious"))
+
+    assert sorted(storage.get_subjects()) == ["Biology", "Chemistry"]
+    notes = storage.get_notes_for_subject("Biology")
+    assert [n["id"] for n in notes] == bio[::-1]
+    assert notes[0]["keyPoints"] == ["mitosis"]
+    assert notes[0]["flashcards"] == [{"q": "What divides?", "a": "Cells"}]
+    assert notes[0]["timestamp"]
+    # Fields the engine has no column for survive the round trip
+    assert storage.get_note(chem)["mood"] == "curious"
+    assert storage.count_notes() == 4
+
+
+def test_engines_agree(tmp_path):
+    results = []
+    for engine in ENGINES:
+        storage = NoteStorage(str(tmp_path / engine), engine=engine)
+        for i in range(4):
+            storage.save_note(make_note(subject=["Biology", "History"][i % 2], summary=f"note {i}",
+                                        id=f"01HZ0000000000000000000{i:03d}", timestamp=f"2024-01-0{i + 1} 10:00"))
+        pages = {s: storage.get_notes_for_subject(s) for s in storage.get_subjects()}
+        results.append(pages)
+        storage.close()
+    assert results[0] == results[1]
+
+
+def test_clear_all_notes(storage):
+    storage.save_note(make_note())
+    storage.save_note(make_note(subject="Chemistry"))
+    storage.clear_all_notes()
+
+    assert storage.get_subjects() == []
+    assert storage.count_notes() == 0
+    assert storage.search("cells") == []
+    storage.save_note(make_note())
+    assert storage.count_notes() == 1
+
+
+def test_sqlite_imports_a_json_tree_once(tmp_path):
+    base = str(tmp_path / "notes")
+    legacy = NoteStorage(base, engine="json")
+    for i in range(3):
+        legacy.save_note(make_note(summary=f"old {i}", timestamp=f"2023-05-0{i + 1} 09:00"))
+    legacy.close()
+
+    storage = NoteStorage(base, engine="sqlite")
+    assert [n["summary"] for n in storage.get_notes_for_subject("Biology")] == ["old 2", "old 1", "old 0"]
+    storage.close()
+
+    # Reopening doesn't import the folders again
+    storage = NoteStorage(base, engine="sqlite")
+    assert storage.count_notes() == 3
+    storage.close()
+
+
+def test_sqlite_migrates_a_version_2_database(tmp_path):
+    base = tmp_path / "notes"
+    base.mkdir()
+    conn = sqlite3.connect(str(base / SqliteEngine.DB_FILENAME))
+    conn.executescript(SCHEMA)
+    conn.executescript(SEARCH_SCHEMA)
+    conn.execute("INSERT INTO subjects (id, name) VALUES (1, 'Biology')")
+    for i in range(3):
+        conn.execute("INSERT INTO notes (subject_id, timestamp, summary) VALUES (1, ?, ?)",
+                     (f"2022-01-0{i + 1} 08:00", f"v2 note {i}"))
+    conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', '1')")
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+    conn.close()
+
+    storage = NoteStorage(str(base), engine="sqlite")
+    notes = storage.get_notes_for_subject("Biology")
+    assert [n["summary"] for n in notes] == ["v2 note 2", "v2 note 1", "v2 note 0"]
+    ids = [n["id"] for n in notes]
+    assert len(set(ids)) == 3 and all(len(i) == 26 for i in ids)
+    assert storage.get_note(ids[0])["summary"] == "v2 note 2"
+    version = storage.engine._conn().execute("PRAGMA user_version").fetchone()[0]
+    storage.close()
+    assert version == SCHEMA_VERSION
+
+
+def page_through(storage, subject, limit):
+    pages, after = [], None
+    while True:
+        page = storage.get_notes_for_subject(subject, limit=limit, after=after)
+        if not page:
+            return pages
+        pages.append([n["summary"] for n in page])
+        after = page[-1]["id"]
+
+
+def test_pages_follow_the_cursor_across_boundaries(storage):
+    for i in range(7):
+        storage.save_note(make_note(summary=f"n{i}", timestamp=f"2024-02-{i + 1:02d} 12:00"))
+    assert page_through(storage, "Biology", 3) == [["n6", "n5", "n4"], ["n3", "n2", "n1"], ["n0"]]
+    assert page_through(storage, "Biology", 7) == [[f"n{i}" for i in range(6, -1, -1)]]
+    assert storage.get_notes_for_subject("Biology", limit=3, after="01HZZZZZZZZZZZZZZZZZZZZZZZ") == []
+
+
+def test_pages_with_equal_timestamps_skip_and_repeat_nothing(storage):
+    for i in range(5):
+        storage.save_note(make_note(summary=f"n{i}", timestamp="2024-02-01 12:00"))
+    assert page_through(storage, "Biology", 2) == [["n4", "n3"], ["n2", "n1"], ["n0"]]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pending_notes_lead_the_first_page(tmp_path, engine):
+    storage = NoteStorage(str(tmp_path / "notes"), engine=engine, write_behind=True)
+    for i in range(3):
+        storage.save_note(make_note(summary=f"saved {i}"))
+    storage.flush()
+
+    # Hold the writer so the next notes stay pending
+    release = threading.Event()
+    save_notes = storage.engine.save_notes
+    storage.engine.save_notes = lambda notes: release.wait(5) and save_notes(notes)
+    for i in range(2):
+        storage.save_note(make_note(summary=f"pending {i}"))
+
+    first = storage.get_notes_for_subject("Biology", limit=3)
+    assert [n["summary"] for n in first] == ["pending 1", "pending 0", "saved 2"]
+    rest = storage.get_notes_for_subject("Biology", limit=3, after=first[-1]["id"])
+    assert [n["summary"] for n in rest] == ["saved 1", "saved 0"]
+
+    release.set()
+    storage.flush()
+    assert page_through(storage, "Biology", 2) == [["pending 1", "pending 0"], ["saved 2", "saved 1"], ["saved 0"]]
+    storage.close()
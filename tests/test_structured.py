@@ -0,0 +1,29 @@
+import pytest
+
+from app.ai.structured import StructuredOutputError, extract_json
+
+
+def test_object_in_prose_and_fences():
+    assert extract_json('Here you go:\n```json\n{"summary": "x", "keyPoints": [],}\n```') == {
+        "summary": "x", "keyPoints": []}
+
+
+def test_braces_in_prose_before_the_object_are_skipped():
+    assert extract_json('Use {curly} braces. {"summary": "x"}') == {"summary": "x"}
+    assert extract_json('Sets look like {1, 2 and {"summary": "x"}') == {"summary": "x"}
+
+
+def test_brackets_in_prose_before_the_array_are_skipped():
+    assert extract_json('See [note] and [ref: 2]: [{"q": "a", "a": "b"}]', expect="[") == [{"q": "a", "a": "b"}]
+
+
+def test_truncated_reply_is_repaired():
+    assert extract_json('{"summary": "cut off') == {"summary": "cut off"}
+    assert extract_json('{"summary": "x", "keyPoints": ["a", "b"') == {"summary": "x", "keyPoints": ["a", "b"]}
+
+
+def test_no_json_raises():
+    with pytest.raises(StructuredOutputError):
+        extract_json("no structure at all")
+    with pytest.raises(StructuredOutputError):
+        extract_json("only {curly} words {here}")
@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+
+from app.notes.engines import SqliteEngine
+from app.notes.writer import NoteWriter
+
+
+def note(note_id, summary="s"):
+    return {"id": note_id, "subject": "Bio", "summary": summary, "keyPoints": [], "flashcards": []}
+
+
+class FlakyEngine:
+    """Raises `error` for the first `failures` save_notes calls, then writes to `engine`."""
+
+    def __init__(self, engine, error, failures):
+        self.engine = engine
+        self.error = error
+        self.failures = failures
+
+    def save_notes(self, notes):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return self.engine.save_notes(notes)
+
+
+def flush_returns(writer, timeout=5):
+    thread = threading.Thread(target=writer.flush)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def test_bad_note_is_parked_without_holding_back_its_batch(tmp_path):
+    engine = SqliteEngine(str(tmp_path))
+    bad = FlakyEngine(engine, ValueError("not serializable"), failures=2)
+    writer = NoteWriter(bad, max_delay=0.2)
+    committed = []
+    writer.submit(note("01A"), committed.append)
+    writer.submit(note("01B"), committed.append)
+    assert flush_returns(writer)
+    # The batch and then the first note failed; the second was written on its own
+    assert committed == ["01B"]
+    assert [n["id"] for n in writer.parked_notes()] == ["01A"]
+    assert writer.pending_notes() == []
+    writer.close()
+    engine.close()
+
+
+def test_transient_failures_are_retried_in_the_background(tmp_path):
+    engine = SqliteEngine(str(tmp_path))
+    writer = NoteWriter(FlakyEngine(engine, sqlite3.OperationalError("database is locked"), failures=2))
+    writer.RETRY_BASE = 0.01
+    done = threading.Event()
+    writer.submit(note("01A"), lambda note_id: done.set())
+    assert flush_returns(writer)
+    assert done.wait(5)
+    assert writer.pending_notes() == [] and writer.parked_notes() == []
+    assert engine.count_notes() == 1
+    writer.close()
+    engine.close()
+
+
+def test_close_gives_up_on_notes_that_keep_failing(tmp_path):
+    engine = SqliteEngine(str(tmp_path))
+    writer = NoteWriter(FlakyEngine(engine, OSError("disk full"), failures=100), close_retries=2)
+    writer.RETRY_BASE = 0.01
+    writer.submit(note("01A"))
+    writer.close()
+    assert [n["id"] for n in writer.parked_notes()] == ["01A"]
+    engine.close()